@@ -0,0 +1,36 @@
+# __main__.py
+"""Command line batch runner: python -m bqm scenarios.yaml -o results.csv"""
+import argparse
+import os
+import sys
+
+# The bqm modules import each other by plain module name (as under `streamlit run main_app.py`)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batch import load_scenarios, run_scenarios, write_results
+from result_cache import ResultCache
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bqm", description="Run queue simulation scenarios without the web app.")
+    parser.add_argument("scenarios", help="JSON or YAML file with a list of scenario param dicts")
+    parser.add_argument("-o", "--output", default="results.csv", help="result table, .csv or .parquet (default: results.csv)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="worker processes (1 runs in this process)")
+    parser.add_argument("--cache-dir", default=None, help="reuse and store seeded results in this result cache directory")
+    parser.add_argument("--batched", action="store_true", help="run the replications of a configuration together as arrays "
+                                                                "(state-independent distributions only)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print errors")
+    args = parser.parse_args(argv)
+
+    def on_message(level, text):
+        if not args.quiet or level == "error":
+            print(f"[{level}] {text}", file=sys.stderr)
+
+    cache = ResultCache(args.cache_dir) if args.cache_dir else None
+    results = run_scenarios(load_scenarios(args.scenarios), max_workers=args.workers, cache=cache, on_message=on_message,
+                            batched=args.batched)
+    write_results(results, args.output)
+    on_message("success", f"Wrote {len(results)} rows to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# batch.py
+"""Headless batch runs: scenario files in, result tables out. Nothing here imports Streamlit."""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import json
+import os
+import numpy as np
+import pandas as pd
+from reporting import ReplicationPool, REPLICATION_METRICS
+from optimization import optimize_servers, replication_seeds, run_replications
+
+# Scenario keys that describe the run rather than being simulation params
+SCENARIO_KEYS = ("name", "replications", "optimize")
+
+def _ignore(*args):
+    """Default progress/message callback: report nothing."""
+
+def load_scenarios(path: str) -> list:
+    """Reads a JSON or YAML scenario file: a list of param dicts, or a mapping with a "scenarios" list.
+
+    A scenario is a params dict for run_simulation plus an optional "name" and "replications" (default 1).
+    A scenario with an "optimize" mapping (objective, min_servers, max_servers, replications, constraints
+    and any other optimize_servers keyword) runs the server optimization instead of a single configuration.
+    """
+    with open(path) as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            import yaml # Only needed for YAML scenario files
+            scenarios = yaml.safe_load(f)
+        else:
+            scenarios = json.load(f)
+    if isinstance(scenarios, dict):
+        scenarios = scenarios.get("scenarios")
+    if not isinstance(scenarios, list) or not all(isinstance(s, dict) for s in scenarios):
+        raise ValueError(f"{path}: expected a list of scenario mappings.")
+    return scenarios
+
+def _scenario_name(scenario: dict, index: int) -> str:
+    return str(scenario.get("name", f"scenario_{index + 1}"))
+
+def _sim_params(scenario: dict) -> dict:
+    return {key: value for key, value in scenario.items() if key not in SCENARIO_KEYS}
+
+def _simulation_jobs(scenario: dict, index: int) -> dict:
+    """{(scenario index, replication): params}, seeded like the optimizer's sweep so the result cache is shared."""
+    params = _sim_params(scenario)
+    entropy = np.random.SeedSequence(params.get("seed", None)).entropy
+    seeds = replication_seeds(entropy, params["num_servers"], int(scenario.get("replications", 1)))
+    return {(index, i): {**params, "seed": seed} for i, seed in enumerate(seeds)}
+
+def _simulation_row(scenario: dict, index: int, summaries: dict) -> dict:
+    """One output row: the scenario's params, then mean and std dev of each replication metric."""
+    pool = ReplicationPool()
+    for i in range(int(scenario.get("replications", 1))):
+        pool.add(summaries[(index, i)])
+    row = {"scenario": _scenario_name(scenario, index), **_sim_params(scenario), "replications": pool.count}
+    for key in REPLICATION_METRICS:
+        row[key] = pool.mean(key)
+        row[f"{key}_stdev"] = pool.stdev(key)
+    return row
+
+def _optimization_rows(scenario: dict, index: int, executor, cache, on_message, batched: bool) -> list:
+    """The optimizer's comparison rows for one scenario, with the recommended configuration flagged.
+
+    Each row starts with the scenario's params (but num_servers, which the rows vary), as simulation rows do.
+    """
+    options = {"batched": batched, **scenario["optimize"]}
+    objective = options.pop("objective", "Minimize Average Waiting Time")
+    constraints = options.pop("constraints", {})
+    min_servers = int(options.pop("min_servers", 1))
+    max_servers = int(options.pop("max_servers", 5))
+    replications = int(options.pop("replications", 5))
+    name = _scenario_name(scenario, index)
+    best, comparison = optimize_servers(_sim_params(scenario), objective, constraints, min_servers, max_servers,
+                                        replications, executor=executor, cache=cache,
+                                        on_message=lambda level, text: on_message(level, f"{name}: {text}"),
+                                        **options)
+    comparison["recommended"] = comparison["num_servers"] == (best["num_servers"] if best else None)
+    params = {key: value for key, value in _sim_params(scenario).items() if key != "num_servers"}
+    return [{"scenario": name, **params, **row} for row in comparison.to_dict("records")]
+
+def run_scenarios(scenarios: list, max_workers: int = None, cache=None, on_message=_ignore, on_progress=_ignore,
+                  batched: bool = False) -> pd.DataFrame:
+    """Runs every scenario on one shared process pool and returns a table with one row per result.
+
+    The replications of all plain scenarios are submitted together; optimization scenarios then reuse the
+    same pool. max_workers=1 runs everything in this process (None uses one worker per CPU).
+    batched=True runs replications in lockstep where possible (an "optimize" mapping can override it).
+    """
+    rows = {}
+    jobs = {}
+    uncached = set() # Scenarios without a seed: fresh entropy every time, so nothing would ever be looked up again
+    for index, scenario in enumerate(scenarios):
+        if "optimize" not in scenario:
+            jobs.update(_simulation_jobs(scenario, index))
+            if scenario.get("seed") is None:
+                uncached.add(index)
+
+    done = 0
+    def on_done():
+        nonlocal done
+        done += 1
+        on_progress(done / len(jobs))
+
+    use_pool = max_workers is None or max_workers > 1
+    with (ProcessPoolExecutor(max_workers=max_workers) if use_pool else nullcontext()) as executor:
+        if jobs:
+            on_message("write", f"Running {len(jobs)} replications of {len({key[0] for key in jobs})} scenarios...")
+            summaries = run_replications({key: params for key, params in jobs.items() if key[0] not in uncached},
+                                         executor, on_done, cache, batched=batched)
+            summaries.update(run_replications({key: params for key, params in jobs.items() if key[0] in uncached},
+                                              executor, on_done, None, batched=batched))
+        for index, scenario in enumerate(scenarios):
+            if "optimize" in scenario:
+                rows[index] = _optimization_rows(scenario, index, executor, cache, on_message, batched)
+            else:
+                rows[index] = [_simulation_row(scenario, index, summaries)]
+    # Keep the scenario file's order
+    return pd.DataFrame([row for index in range(len(scenarios)) for row in rows[index]])
+
+def write_results(results: pd.DataFrame, path: str):
+    """Writes the result table as Parquet (.parquet, .pq) or CSV (anything else)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.lower().endswith((".parquet", ".pq")):
+        results.to_parquet(path, index=False)
+    else:
+        results.to_csv(path, index=False)
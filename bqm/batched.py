@@ -0,0 +1,147 @@
+# batched.py
+"""Replicate-parallel FCFS simulation: R replications held as NumPy arrays and advanced in lockstep."""
+import numpy as np
+from simulation_core import can_vectorize, make_samplers
+from distributions import DEFAULT_BLOCK_SIZE
+from queueing_theory import mean_arrival_rate
+
+# Largest (replications x customers) array built at once; larger requests run in groups of replications
+MAX_BATCH_CELLS = 2 ** 22
+
+def can_batch(params: dict) -> bool:
+    """True when replications of params can run batched: state-independent FCFS draws and plain summaries."""
+    return can_vectorize(params) and params.get("warmup") != "mser" and not params.get("window_length")
+
+def _expected_customers(params: dict) -> float:
+    if params["stop_condition_type"] == "Number of Customers":
+        return float(params["stop_condition_value"])
+    try:
+        arrival_rate = mean_arrival_rate(params)
+    except (ValueError, KeyError, ZeroDivisionError):
+        return float(params["stop_condition_value"]) # No known rate (trace arrivals)
+    return arrival_rate * params["stop_condition_value"]
+
+def _draw(samplers: list, n: int) -> np.ndarray:
+    """The next n values of every replication's stream, one row per replication."""
+    return np.stack([sampler.sample(n) for sampler in samplers])
+
+class _LockstepSchedule:
+    """FCFS service starts for a (replications x customers) block, resumable across blocks.
+
+    c=1 uses the Lindley recursion in closed form along each row. c>1 keeps the Kiefer-Wolfowitz
+    workload vector of every replication as one (replications x servers) array and advances all
+    rows together, one customer per step, so the Python loop runs once per customer index.
+    Server ids are not kept: the pooled metrics do not depend on which server a customer got.
+    """
+    def __init__(self, num_replications: int, num_servers: int):
+        self.num_servers = num_servers
+        self.free = np.zeros((num_replications, num_servers))
+        self.rows = np.arange(num_replications)
+
+    def starts(self, arrivals: np.ndarray, services: np.ndarray) -> np.ndarray:
+        if self.num_servers == 1:
+            cum_service = np.cumsum(services, axis=1)
+            # The previous block's last departure enters as the k=0 term of max_k(A_k - cumS_{k-1})
+            ready = np.concatenate([self.free, arrivals - (cum_service - services)], axis=1)
+            departures = cum_service + np.maximum.accumulate(ready, axis=1)[:, 1:]
+            self.free = departures[:, -1:].copy()
+            return departures - services
+        starts = np.empty_like(arrivals)
+        free, rows = self.free, self.rows
+        for i in range(arrivals.shape[1]):
+            server = free.argmin(axis=1)
+            start = np.maximum(arrivals[:, i], free[rows, server])
+            free[rows, server] = start + services[:, i]
+            starts[:, i] = start
+        return starts
+
+def _summaries(arrivals, starts, services, admitted, end_times, num_servers, drained: bool) -> list:
+    """Per-replication summaries with the keys of optimization.run_replication_summary.
+
+    Customers start and are served before each row's end time, as in the vectorized engine; in a
+    drained run every admitted customer is served.
+    """
+    departures = starts + services
+    ends = end_times[:, None]
+    served = admitted if drained else admitted & (departures < ends)
+    started = admitted if drained else admitted & (starts < ends)
+    served_count = served.sum(axis=1)
+    admitted_count = np.maximum(admitted.sum(axis=1), 1)
+    interarrivals = np.diff(arrivals, axis=1, prepend=0.0)
+    mean_interarrival = np.where(admitted, interarrivals, 0.0).sum(axis=1) / admitted_count
+    mean_service = np.where(admitted, services, 0.0).sum(axis=1) / admitted_count
+    waits = np.where(served, starts - arrivals, 0.0).sum(axis=1)
+    queue_area = np.where(admitted, np.minimum(starts, ends) - arrivals, 0.0).sum(axis=1)
+    busy = np.where(started, np.minimum(departures, ends) - starts, 0.0).sum(axis=1)
+    positive = end_times > 1e-9
+    safe_ends = np.where(positive, end_times, 1.0)
+    return [{
+        "avg_wait_time": float(waits[r] / served_count[r]) if served_count[r] else 0.0,
+        "avg_queue_length": float(queue_area[r] / safe_ends[r]) if positive[r] else 0.0,
+        "avg_server_utilization": float(busy[r] / (safe_ends[r] * num_servers) * 100) if positive[r] else 0.0,
+        "total_served": int(served_count[r]),
+        "mean_interarrival": float(mean_interarrival[r]),
+        "mean_service": float(mean_service[r]),
+    } for r in range(len(end_times))]
+
+def _run_group(params: dict, seeds: list) -> list:
+    num_servers = params["num_servers"]
+    stop_type = params["stop_condition_type"]
+    stop_value = params["stop_condition_value"]
+    samplers = [make_samplers({**params, "seed": seed}) for seed in seeds]
+    arrival_samplers = [arrival for arrival, _ in samplers]
+    service_samplers = [service for _, service in samplers]
+    schedule = _LockstepSchedule(len(seeds), num_servers)
+
+    if stop_type == "Simulation Time":
+        # Every arrival strictly before the horizon is admitted, in every replication
+        interarrivals = _draw(arrival_samplers, DEFAULT_BLOCK_SIZE)
+        while interarrivals.sum(axis=1).min() < stop_value:
+            interarrivals = np.concatenate([interarrivals, _draw(arrival_samplers, interarrivals.shape[1])], axis=1)
+        arrivals = np.cumsum(interarrivals, axis=1)
+        num_customers = int((arrivals < stop_value).sum(axis=1).max())
+        arrivals = arrivals[:, :num_customers]
+        services = _draw(service_samplers, num_customers)
+        starts = schedule.starts(arrivals, services)
+        admitted = arrivals < stop_value
+        end_times = np.full(len(seeds), float(stop_value))
+    elif stop_type == "Number of Customers":
+        # Each replication stops after its first arrival that finds stop_value customers already served
+        arrivals = np.cumsum(_draw(arrival_samplers, DEFAULT_BLOCK_SIZE), axis=1)
+        services = _draw(service_samplers, arrivals.shape[1])
+        starts = schedule.starts(arrivals, services)
+        while True:
+            sorted_departures = np.sort(starts + services, axis=1)
+            served_before = np.stack([np.searchsorted(row, a, side="left") for row, a in zip(sorted_departures, arrivals)])
+            hit = served_before >= stop_value
+            if hit.any(axis=1).all():
+                break
+            more = arrivals.shape[1]
+            new_arrivals = arrivals[:, -1:] + np.cumsum(_draw(arrival_samplers, more), axis=1)
+            new_services = _draw(service_samplers, more)
+            starts = np.concatenate([starts, schedule.starts(new_arrivals, new_services)], axis=1)
+            arrivals = np.concatenate([arrivals, new_arrivals], axis=1)
+            services = np.concatenate([services, new_services], axis=1)
+        num_customers = hit.argmax(axis=1) + 1
+        admitted = np.arange(arrivals.shape[1]) < num_customers[:, None]
+        end_times = np.where(admitted, starts + services, 0.0).max(axis=1) # Each run drains its admitted customers
+    else:
+        raise ValueError("Invalid stop condition type")
+    return _summaries(arrivals, starts, services, admitted, end_times, num_servers, stop_type == "Number of Customers")
+
+def run_batched_replications(params: dict, seeds: list, max_cells: int = MAX_BATCH_CELLS) -> list:
+    """Replication summaries of params, one per seed, from a lockstep simulation of all replications.
+
+    Replication r draws from the same streams as run_simulation({**params, "seed": seeds[r]}), so its
+    summary matches the vectorized engine's up to floating-point rounding. Python work grows with the
+    number of customers, not customers x replications. Replications run in groups of at most
+    max_cells // (expected customers) rows to bound memory.
+    """
+    if not can_batch(params):
+        raise ValueError("Batched replications need state-independent arrival and service distributions, "
+                         "no warm-up truncation and no per-window metrics.")
+    group_size = max(1, int(max_cells // max(_expected_customers(params), 1.0)))
+    summaries = []
+    for begin in range(0, len(seeds), group_size):
+        summaries.extend(_run_group(params, seeds[begin:begin + group_size]))
+    return summaries
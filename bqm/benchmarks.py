@@ -0,0 +1,110 @@
+# benchmarks.py
+"""Performance benchmarks for the bqm simulation code. Run with: python benchmarks.py"""
+import time
+import tracemalloc
+import numpy as np
+from simulation_core import run_simulation, SimulationData
+from reporting import calculate_summary_stats
+from optimization import run_replication_summary, replication_seeds
+from batched import run_batched_replications
+
+BENCH_PARAMS = {
+    "arrival_distribution": "Exponential (Poisson Process)",
+    "arrival_rate": 9.0,
+    "service_distribution": "Exponential",
+    "service_rate": 1.0,
+    "num_servers": 10,
+    "stop_condition_type": "Number of Customers",
+    "stop_condition_value": 100000,
+    "seed": 42,
+}
+
+def _timed(func, *args):
+    """Returns (result, elapsed wall-clock seconds) for func(*args)."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def bench_engines(params: dict = BENCH_PARAMS):
+    """Compares the SimPy engine with the heap engine on the same seed (events = arrivals + departures)."""
+    print(f"Engines: {params['num_servers']} servers, {params['stop_condition_type']} = {params['stop_condition_value']}")
+    timings = {}
+    outputs = {}
+    for engine in ("simpy", "fast"):
+        data, elapsed = _timed(run_simulation, {**params, "engine": engine})
+        events = 2 * data.total_served_count
+        timings[engine] = elapsed
+        outputs[engine] = data
+        print(f"  {engine:>6}: {elapsed:8.3f} s  {events / elapsed:12,.0f} events/s")
+
+    ref, fast = outputs["simpy"], outputs["fast"]
+    identical = (ref.wait_times == fast.wait_times and ref.system_times == fast.system_times
+                 and np.array_equal(ref.queue_trajectory.intervals, fast.queue_trajectory.intervals)
+                 and np.array_equal(ref.queue_trajectory.lengths, fast.queue_trajectory.lengths)
+                 and dict(ref.server_busy_time) == dict(fast.server_busy_time))
+    print(f"  speedup: {timings['simpy'] / timings['fast']:.1f}x, identical results: {identical}")
+
+def bench_vectorized(num_customers: int = 1000000):
+    """Times the vectorized Lindley (c=1) and Kiefer-Wolfowitz (c>1) path against the heap engine."""
+    print(f"Vectorized path: {num_customers:,} customers")
+    for num_servers, arrival_rate in ((1, 0.9), (10, 9.0)):
+        params = {**BENCH_PARAMS, "num_servers": num_servers, "arrival_rate": arrival_rate,
+                  "stop_condition_value": num_customers}
+        _, fast_elapsed = _timed(run_simulation, {**params, "engine": "fast"})
+        _, vec_elapsed = _timed(run_simulation, {**params, "engine": "vectorized"})
+        print(f"  c={num_servers:<3} fast: {fast_elapsed:7.2f} s  vectorized: {vec_elapsed:7.2f} s  speedup: {fast_elapsed / vec_elapsed:.1f}x")
+
+def bench_streaming_memory(num_customers: int = 200000):
+    """Peak traced memory of full vs streaming statistics for the same run."""
+    print(f"Statistics memory: {num_customers:,} customers")
+    for statistics_mode in ("full", "streaming"):
+        tracemalloc.start()
+        run_simulation({**BENCH_PARAMS, "engine": "fast", "statistics": statistics_mode, "stop_condition_value": num_customers})
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {statistics_mode:>9}: peak {peak / 1e6:8.1f} MB")
+
+def bench_batched(num_replications: int = 1000, sample: int = 20):
+    """Times batched lockstep replications against one-by-one vectorized runs (timed on a sample)."""
+    params = {**BENCH_PARAMS, "stop_condition_type": "Simulation Time", "stop_condition_value": 1000}
+    seeds = replication_seeds(0, params["num_servers"], num_replications)
+    print(f"Batched replications: {num_replications:,} x {params['num_servers']} servers, time {params['stop_condition_value']}")
+    _, batched_elapsed = _timed(run_batched_replications, params, seeds)
+    _, single_elapsed = _timed(lambda: [run_replication_summary({**params, "engine": "vectorized", "seed": seed}) for seed in seeds[:sample]])
+    one_by_one = single_elapsed / sample * num_replications
+    print(f"  batched: {batched_elapsed:7.2f} s  one by one (est.): {one_by_one:7.2f} s  speedup: {one_by_one / batched_elapsed:.1f}x")
+
+def _list_queue_stats(pairs: list, sim_duration: float) -> tuple:
+    """The former pure-Python walks over a list of (interval, length) tuples, kept as the baseline."""
+    average = sum(interval * length for interval, length in pairs) / sim_duration
+    maximum = max(length for _, length in pairs)
+    plot_times, plot_lengths, current_time = [], [], 0
+    for interval, length in pairs:
+        plot_times.extend([current_time, current_time + interval])
+        plot_lengths.extend([length, length])
+        current_time += interval
+    return average, maximum, plot_times, plot_lengths
+
+def bench_queue_trajectory(num_events: int = 1000000):
+    """Times queue-length statistics on a synthetic trajectory: list walks vs NumPy buffers."""
+    rng = np.random.default_rng(0)
+    intervals = rng.exponential(0.1, num_events)
+    lengths = rng.integers(0, 50, num_events).astype(np.int32)
+    sim_duration = float(intervals.sum())
+    print(f"Queue trajectory: {num_events:,} events")
+
+    pairs = list(zip(intervals.tolist(), lengths.tolist()))
+    _, list_elapsed = _timed(_list_queue_stats, pairs, sim_duration)
+
+    data = SimulationData(num_servers=1)
+    _, append_elapsed = _timed(lambda: [data.queue_trajectory.append(i, l) for i, l in pairs])
+    _, array_elapsed = _timed(calculate_summary_stats, data, sim_duration, 1)
+    print(f"  list walks: {list_elapsed:6.2f} s  vectorized (incl. DataFrame): {array_elapsed:6.2f} s  "
+          f"speedup: {list_elapsed / array_elapsed:.1f}x  (buffer appends: {append_elapsed:.2f} s)")
+
+if __name__ == "__main__":
+    bench_engines()
+    bench_vectorized()
+    bench_batched()
+    bench_streaming_memory()
+    bench_queue_trajectory()
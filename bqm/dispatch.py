@@ -0,0 +1,95 @@
+# dispatch.py
+"""Server-selection (dispatch) policies: which free server a customer gets, in O(log c) or better."""
+from collections import deque
+from heapq import heappush, heappop
+import numpy as np
+import simpy
+
+# Policies accepted in params["dispatch_policy"]; "release order" (the default) is the simpy.Store behaviour:
+# the server free the longest goes first. Waits and other totals do not depend on the policy, only the
+# split of customers and busy time over the servers does.
+DISPATCH_POLICIES = ("release order", "lowest id", "round robin", "least busy", "random")
+DEFAULT_DISPATCH_POLICY = "release order"
+
+class FreeServers:
+    """The ids of the free servers, handed out by a dispatch policy.
+
+    "release order": deque, O(1). "lowest id": heap of ids. "round robin": the first free id at or after
+    the one following the last server handed out, wrapping around; two heaps split at that pointer.
+    "least busy": heap of (cumulative busy time, id), the busy time being given when the server is
+    released. "random": uniformly among the free servers, by swap-removal from an array, O(1).
+    Every policy starts with all num_servers servers free.
+    """
+    def __init__(self, policy: str, num_servers: int, rng: np.random.Generator = None):
+        if policy not in DISPATCH_POLICIES:
+            raise ValueError(f"Unknown dispatch policy: {policy}")
+        if policy == "random" and rng is None:
+            raise ValueError("The random dispatch policy needs a random generator.")
+        self.policy = policy
+        self.rng = rng
+        if policy == "release order":
+            self._free = deque(range(num_servers))
+        elif policy == "least busy":
+            self._free = [(0.0, server_id) for server_id in range(num_servers)] # Already a heap
+        else:
+            self._free = list(range(num_servers)) # A heap as well, for "lowest id" and "round robin"
+        self._behind = [] # Round robin: free ids below the pointer, served once those at or after it run out
+        self._pointer = 0
+
+    def __len__(self):
+        return len(self._free) + len(self._behind)
+
+    def pop(self) -> int:
+        """Takes a free server (there must be one)."""
+        policy = self.policy
+        if policy == "release order":
+            return self._free.popleft()
+        if policy == "least busy":
+            return heappop(self._free)[1]
+        if policy == "random":
+            index = int(self.rng.integers(len(self._free)))
+            server_id = self._free[index]
+            self._free[index] = self._free[-1]
+            self._free.pop()
+            return server_id
+        if policy == "round robin" and not self._free: # Wrap around
+            self._free, self._behind = self._behind, self._free
+        server_id = heappop(self._free)
+        if policy == "round robin":
+            self._pointer = server_id + 1 # Every id left in _free is above server_id
+        return server_id
+
+    def push(self, server_id: int, busy_time: float = 0.0):
+        """Returns a server; busy_time is its cumulative busy time so far (used by "least busy")."""
+        policy = self.policy
+        if policy == "release order":
+            self._free.append(server_id)
+        elif policy == "least busy":
+            heappush(self._free, (busy_time, server_id))
+        elif policy == "random":
+            self._free.append(server_id)
+        elif policy == "round robin" and server_id < self._pointer:
+            heappush(self._behind, server_id)
+        else:
+            heappush(self._free, server_id)
+
+class ServerStore(simpy.Store):
+    """simpy.Store of server ids that hands them out by a dispatch policy instead of first in, first out.
+
+    data is the run's SimulationData, read for the busy time of released servers.
+    """
+    def __init__(self, env: simpy.Environment, free_servers: FreeServers, data):
+        super().__init__(env, capacity=len(free_servers))
+        self.free_servers = free_servers
+        self.data = data
+
+    def _do_put(self, event):
+        if len(self.free_servers) < self._capacity:
+            self.free_servers.push(event.item, self.data.server_busy_time.get(event.item, 0.0))
+            event.succeed()
+        return None
+
+    def _do_get(self, event):
+        if len(self.free_servers):
+            event.succeed(self.free_servers.pop())
+        return None
@@ -1,46 +1,175 @@
 # distributions.py
 import numpy as np
 import math
+from traces import TraceReader
+from fitting import FITTED_DISTRIBUTIONS, DEFAULT_HISTOGRAM_BINS, fit_distribution, fitted_draw
+from nonstationary import RateProfile, ProfileArrivals
 
-def get_interarrival_time(dist_type: str, params: dict, rng: np.random.Generator) -> float:
-    """Generates interarrival time based on distribution type."""
+# Distributions whose draws do not depend on the state of the queue, so whole runs can be pre-drawn
+STATE_INDEPENDENT_ARRIVALS = ("Exponential (Poisson Process)", "Constant Rate", "Fixed Interval", "Trace", "Time-Varying Rate",
+                              *FITTED_DISTRIBUTIONS)
+STATE_INDEPENDENT_SERVICES = ("Exponential", "Constant", "Normal", "Trace", *FITTED_DISTRIBUTIONS)
+
+DEFAULT_BLOCK_SIZE = 4096
+
+class BlockSampler:
+    """Hands out values one at a time from pre-drawn NumPy blocks, refilled when a block runs out.
+
+    Values are consumed from the generator strictly in order, so for a given seed the stream is the
+    same whatever the block size and however next() and sample(n) calls are mixed.
+    """
+    def __init__(self, draw, block_size: int = DEFAULT_BLOCK_SIZE):
+        if block_size < 1:
+            raise ValueError("Block size must be at least 1.")
+        self._draw = draw # Callable: n -> ndarray of n values
+        self.block_size = block_size
+        self._block = [] # Current block as Python floats (cheaper to index than an ndarray)
+        self._pos = 0
+        # Sum and count of the values handed out before the current block, summed once per block
+        self._drawn_total = 0.0
+        self._drawn_count = 0
+
+    @property
+    def drawn_mean(self) -> float:
+        """Mean of the values handed out so far (0.0 before the first)."""
+        count = self._drawn_count + self._pos
+        return (self._drawn_total + sum(self._block[:self._pos])) / count if count else 0.0
+
+    def next(self) -> float:
+        """Returns the next value of the stream."""
+        if self._pos >= len(self._block):
+            self._drawn_total += sum(self._block)
+            self._drawn_count += len(self._block)
+            self._block = self._draw(self.block_size).tolist()
+            self._pos = 0
+        value = self._block[self._pos]
+        self._pos += 1
+        return value
+
+    def sample(self, n: int) -> np.ndarray:
+        """Returns the next n values of the stream as an array."""
+        buffered = self._block[self._pos:self._pos + n]
+        self._pos += len(buffered)
+        if len(buffered) == n:
+            return np.array(buffered, dtype=np.float64)
+        extra = self._draw(n - len(buffered))
+        self._drawn_total += float(extra.sum())
+        self._drawn_count += len(extra)
+        return np.concatenate([np.array(buffered, dtype=np.float64), extra])
+
+class ConstantSampler:
+    """Sampler interface for deterministic distributions (nothing to pre-draw)."""
+    def __init__(self, value: float):
+        self.value = float(value)
+        self.drawn_mean = self.value
+
+    def next(self) -> float:
+        return self.value
+
+    def sample(self, n: int) -> np.ndarray:
+        return np.full(n, self.value)
+
+def _antithetic_uniforms(rng: np.random.Generator, n: int, member: int) -> np.ndarray:
+    """U (member 0) or 1 - U (member 1) from the same generator state, on the open interval (0, 1).
+
+    U is a multiple of 2**-53 shifted by half a step, so 1 - U is exact and neither end is ever hit.
+    """
+    u = (rng.integers(0, 2 ** 53, size=n) + 0.5) / 2 ** 53
+    return u if member == 0 else 1.0 - u
+
+def _exponential_draw(rng: np.random.Generator, mean: float, antithetic):
+    """n -> n exponential values: numpy's sampler, or inverse-CDF draws from antithetic uniforms."""
+    if antithetic is None:
+        return lambda n: rng.exponential(mean, size=n)
+    return lambda n: -mean * np.log(_antithetic_uniforms(rng, n, antithetic))
+
+def fitted_params(dist_type: str, params: dict, side: str) -> tuple:
+    """(fit, scale) of a fitted distribution from the "<side>_sample_*" params (side: "arrival" or "service")."""
+    scale = params.get(f'{side}_sample_scale', 1.0)
+    if scale <= 0:
+        raise ValueError("Sample scale must be positive.")
+    fit = fit_distribution(dist_type, params.get(f'{side}_sample_path'), params.get(f'{side}_sample_column'),
+                           params.get(f'{side}_histogram_bins', DEFAULT_HISTOGRAM_BINS))
+    return fit, scale
+
+def _uniforms(rng: np.random.Generator, antithetic):
+    """n -> n uniforms on (0, 1]: plain, or U / 1 - U for an antithetic pair member."""
+    if antithetic is None:
+        return lambda n: 1.0 - rng.random(n) # Never log(0)
+    return lambda n: _antithetic_uniforms(rng, n, antithetic)
+
+def _fitted_sampler(dist_type: str, params: dict, side: str, rng: np.random.Generator, block_size: int, antithetic):
+    fit, scale = fitted_params(dist_type, params, side)
+    return BlockSampler(fitted_draw(dist_type, fit, rng, _uniforms(rng, antithetic), scale, antithetic), block_size)
+
+def rate_profile(params: dict) -> RateProfile:
+    """The RateProfile of the "Time-Varying Rate" arrival params."""
+    return RateProfile(params.get('rate_profile') or [], params.get('rate_profile_period', 24.0),
+                       params.get('rate_profile_shape', "Piecewise Constant"), params.get('rate_profile_scale', 1.0))
+
+def make_interarrival_sampler(dist_type: str, params: dict, rng: np.random.Generator, block_size: int = DEFAULT_BLOCK_SIZE,
+                              antithetic: int = None):
+    """Validates the arrival parameters once and returns a sampler of interarrival times.
+
+    antithetic=0 or 1 draws by inverse CDF from U or 1 - U, so two runs on the same seed form an antithetic pair.
+    """
     if dist_type == "Exponential (Poisson Process)":
-        # params['arrival_rate'] = arrivals per unit time
-        # mean interarrival time = 1 / arrival_rate
         if params['arrival_rate'] <= 0:
              raise ValueError("Arrival rate must be positive for Exponential distribution.")
         mean_interarrival = 1.0 / params['arrival_rate']
-        return rng.exponential(mean_interarrival)
+        return BlockSampler(_exponential_draw(rng, mean_interarrival, antithetic), block_size)
     elif dist_type == "Constant Rate":
          if params['arrival_rate'] <= 0:
              raise ValueError("Arrival rate must be positive for Constant Rate.")
-         return 1.0 / params['arrival_rate'] # Fixed time between arrivals
+         return ConstantSampler(1.0 / params['arrival_rate'])
     elif dist_type == "Fixed Interval":
         if params['fixed_interval'] <= 0:
             raise ValueError("Fixed interval must be positive.")
-        return params['fixed_interval']
+        return ConstantSampler(params['fixed_interval'])
+    elif dist_type == "Trace":
+        # Arrival timestamps replayed from a file (the same for every seed)
+        reader = TraceReader(params.get('arrival_trace_path'), params.get('arrival_trace_column'), timestamps=True,
+                             scale=params.get('arrival_trace_scale', 1.0))
+        return BlockSampler(reader.read, block_size)
+    elif dist_type == "Time-Varying Rate":
+        # Poisson arrivals whose rate follows a periodic profile (e.g. time of day)
+        return BlockSampler(ProfileArrivals(rate_profile(params), _uniforms(rng, antithetic)).read, block_size)
+    elif dist_type in FITTED_DISTRIBUTIONS:
+        # Interarrival times from a distribution fitted to a sample of them
+        return _fitted_sampler(dist_type, params, 'arrival', rng, block_size, antithetic)
     else:
         raise ValueError(f"Unknown arrival distribution type: {dist_type}")
 
-def get_service_time(dist_type: str, params: dict, rng: np.random.Generator) -> float:
-    """Generates service time based on distribution type."""
+def make_service_sampler(dist_type: str, params: dict, rng: np.random.Generator, block_size: int = DEFAULT_BLOCK_SIZE,
+                         antithetic: int = None):
+    """Validates the service parameters once and returns a sampler of service times (antithetic as above)."""
     if dist_type == "Exponential":
-        # params['service_rate'] = services per unit time
-        # mean service time = 1 / service_rate
         if params['service_rate'] <= 0:
             raise ValueError("Service rate must be positive for Exponential distribution.")
         mean_service_time = 1.0 / params['service_rate']
-        return rng.exponential(mean_service_time)
+        return BlockSampler(_exponential_draw(rng, mean_service_time, antithetic), block_size)
     elif dist_type == "Constant":
         if params['fixed_service_time'] <= 0:
             raise ValueError("Fixed service time must be positive.")
-        return params['fixed_service_time']
+        return ConstantSampler(params['fixed_service_time'])
     elif dist_type == "Normal":
         mean = params['mean_service_time']
         std_dev = params['std_dev_service_time']
         if mean <= 0 or std_dev < 0:
             raise ValueError("Mean service time must be positive and standard deviation non-negative for Normal distribution.")
         # Ensure non-negative service time
-        return max(0, rng.normal(mean, std_dev))
+        if antithetic is None:
+            return BlockSampler(lambda n: np.maximum(0.0, rng.normal(mean, std_dev, size=n)), block_size)
+        # The normal inverse CDF is odd around 1/2, so the draw for 1 - U is the mirrored draw for U
+        sign = 1.0 if antithetic == 0 else -1.0
+        return BlockSampler(lambda n: np.maximum(0.0, mean + sign * std_dev * rng.standard_normal(n)), block_size)
+    elif dist_type == "Trace":
+        # Service durations replayed from a file, in customer (service start) order
+        reader = TraceReader(params.get('service_trace_path'), params.get('service_trace_column'),
+                             scale=params.get('service_trace_scale', 1.0))
+        return BlockSampler(reader.read, block_size)
+    elif dist_type in FITTED_DISTRIBUTIONS:
+        # Service times from a distribution fitted to a sample of them
+        return _fitted_sampler(dist_type, params, 'service', rng, block_size, antithetic)
     else:
-        raise ValueError(f"Unknown service distribution type: {dist_type}")
\ No newline at end of file
+        raise ValueError(f"Unknown service distribution type: {dist_type}")
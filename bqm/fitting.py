@@ -0,0 +1,232 @@
+# fitting.py
+"""Distributions fitted to a sample file (empirical histogram, lognormal, gamma, Weibull), cached on disk by file hash."""
+import hashlib
+import math
+import os
+import numpy as np
+from traces import trace_chunks
+
+FITTED_DISTRIBUTIONS = ("Empirical", "Lognormal", "Gamma", "Weibull")
+DEFAULT_HISTOGRAM_BINS = 256
+# Same root as the result cache (result_cache.py imports the engines, which import this module)
+FIT_CACHE_DIR = os.path.join(os.environ.get("BQM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "bqm")), "fits")
+# Part of every fit cache key; bump it when a fitting method changes
+FIT_VERSION = 1
+
+_file_hashes = {} # (path, size, mtime) -> SHA-256, so a file is hashed once per process until it changes
+_fits = {} # Fit cache key -> fitted distribution, in front of the disk cache
+
+def file_sha256(path: str) -> str:
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+def load_sample(path: str, column=None) -> np.ndarray:
+    """All values of a sample column (same file types as traces), without missing values."""
+    if not path:
+        raise ValueError("No sample file given.")
+    if not os.path.isfile(path):
+        raise ValueError(f"Sample file not found: {path}")
+    values = np.concatenate(list(trace_chunks(path, column)) or [np.empty(0)])
+    values = values[~np.isnan(values)]
+    if len(values) < 2:
+        raise ValueError(f"Sample file needs at least two values to fit a distribution: {path}")
+    if (values < 0).any():
+        raise ValueError(f"Sample values must be non-negative: {path}")
+    return values
+
+def alias_table(probabilities: np.ndarray) -> tuple:
+    """Walker alias table (Vose's method): (acceptance probability, alias) per column, for O(1) draws.
+
+    Column j is picked uniformly; it yields j with probability prob[j] and alias[j] otherwise.
+    """
+    k = len(probabilities)
+    scaled = np.asarray(probabilities, dtype=np.float64) * k / np.sum(probabilities)
+    prob = np.ones(k)
+    alias = np.arange(k)
+    small = [j for j in range(k) if scaled[j] < 1.0]
+    large = [j for j in range(k) if scaled[j] >= 1.0]
+    while small and large:
+        j, l = small.pop(), large.pop()
+        prob[j], alias[j] = scaled[j], l
+        scaled[l] -= 1.0 - scaled[j]
+        (small if scaled[l] < 1.0 else large).append(l)
+    return prob, alias # Leftovers are 1.0 up to rounding and keep prob 1
+
+def _digamma(x: float) -> float:
+    result = 0.0
+    while x < 6.0: # Recurrence up to where the asymptotic series is accurate
+        result -= 1.0 / x
+        x += 1.0
+    f = 1.0 / (x * x)
+    return result + math.log(x) - 0.5 / x - f * (1.0 / 12 - f * (1.0 / 120 - f * (1.0 / 252 - f / 240)))
+
+def _trigamma(x: float) -> float:
+    result = 0.0
+    while x < 6.0:
+        result += 1.0 / (x * x)
+        x += 1.0
+    f = 1.0 / (x * x)
+    return result + 1.0 / x + f / 2 + f / x * (1.0 / 6 - f * (1.0 / 30 - f / 42))
+
+def _positive(values: np.ndarray, family: str) -> np.ndarray:
+    if (values <= 0).any():
+        raise ValueError(f"A {family} fit needs strictly positive sample values.")
+    return values
+
+def _fit_lognormal(values: np.ndarray) -> dict:
+    logs = np.log(_positive(values, "lognormal"))
+    return {"mu": float(logs.mean()), "sigma": float(logs.std())}
+
+def _fit_gamma(values: np.ndarray) -> dict:
+    """Maximum likelihood: Minka's starting point for the shape, then Newton steps on log(k) - digamma(k) = s."""
+    values = _positive(values, "gamma")
+    s = math.log(values.mean()) - float(np.log(values).mean())
+    if s <= 0: # All values equal
+        return {"shape": math.inf, "scale": 0.0, "value": float(values.mean())}
+    shape = (3.0 - s + math.sqrt((s - 3.0) ** 2 + 24.0 * s)) / (12.0 * s)
+    for _ in range(50):
+        step = (math.log(shape) - _digamma(shape) - s) / (1.0 / shape - _trigamma(shape))
+        shape = max(shape - step, shape / 10)
+        if abs(step) < 1e-12 * shape:
+            break
+    return {"shape": float(shape), "scale": float(values.mean()) / shape}
+
+def _fit_weibull(values: np.ndarray) -> dict:
+    """Maximum likelihood: Newton steps on sum(x^k ln x) / sum(x^k) - 1/k - mean(ln x) = 0, then the scale."""
+    values = _positive(values, "Weibull")
+    logs = np.log(values)
+    if np.ptp(logs) == 0:
+        return {"shape": math.inf, "scale": float(values[0])}
+    logs_scaled = logs - logs.max() # x^k / max(x)^k, so large k cannot overflow
+    shape = 1.2 / float(logs.std()) # Moment-style starting point
+    for _ in range(100):
+        w = np.exp(shape * logs_scaled)
+        a, b, c = w.sum(), (w * logs).sum(), (w * logs * logs).sum()
+        g = b / a - 1.0 / shape - logs.mean()
+        dg = c / a - (b / a) ** 2 + 1.0 / shape ** 2
+        step = g / dg
+        shape = max(shape - step, shape / 10)
+        if abs(step) < 1e-12 * shape:
+            break
+    scale = float(math.exp(logs.max()) * np.mean(np.exp(shape * logs_scaled)) ** (1.0 / shape))
+    return {"shape": float(shape), "scale": scale}
+
+def _fit_histogram(values: np.ndarray, bins: int) -> dict:
+    """Histogram on sample quantile edges: bins equal-probability bins, split further towards both tails.
+
+    The outermost bins are halved again and again (quantile levels 2^-j / bins from each end, down to
+    single order statistics), so a heavy tail is not smeared uniformly over one wide bin, which would
+    inflate the mean. Bins then differ in probability, which the alias table absorbs.
+    """
+    levels = np.linspace(0.0, 1.0, bins + 1)
+    tail = 2.0 ** -np.arange(1, max(1, int(np.log2(len(values) / bins)) + 1)) / bins
+    levels = np.unique(np.concatenate([levels, tail, 1.0 - tail]))
+    edges = np.unique(np.quantile(values, levels))
+    if len(edges) < 2: # All values equal
+        edges = np.array([values[0], values[0]])
+    counts, _ = np.histogram(values, edges)
+    prob, alias = alias_table(counts)
+    return {"edges": edges, "prob": prob, "alias": alias, "probabilities": counts / counts.sum()}
+
+def _moments(family: str, fit: dict) -> tuple:
+    """(mean, squared coefficient of variation) of a fitted distribution."""
+    if family == "Empirical":
+        low, high, p = fit["edges"][:-1], fit["edges"][1:], fit["probabilities"]
+        mean = float((p * (low + high) / 2).sum())
+        second = float((p * (low * low + low * high + high * high) / 3).sum()) # E[X^2] of a uniform bin
+    elif family == "Lognormal":
+        mean = math.exp(fit["mu"] + fit["sigma"] ** 2 / 2)
+        return mean, math.expm1(fit["sigma"] ** 2)
+    elif family == "Gamma":
+        if math.isinf(fit["shape"]):
+            return fit["value"], 0.0
+        return fit["shape"] * fit["scale"], 1.0 / fit["shape"]
+    else: # Weibull
+        if math.isinf(fit["shape"]):
+            return fit["scale"], 0.0
+        g1, g2 = math.gamma(1 + 1 / fit["shape"]), math.gamma(1 + 2 / fit["shape"])
+        return fit["scale"] * g1, g2 / (g1 * g1) - 1.0
+    return mean, second / (mean * mean) - 1.0 if mean > 0 else 0.0
+
+def fit_distribution(family: str, path: str, column=None, bins: int = DEFAULT_HISTOGRAM_BINS) -> dict:
+    """Fits family to the sample in path; the result holds the fitted parameters (or tables), "mean" and "scv".
+
+    Fits are keyed by the file's SHA-256, the column, the family and the bin count, kept in memory and
+    saved under FIT_CACHE_DIR, so repeated runs (and worker processes) load the fit instead of refitting.
+    """
+    if family not in FITTED_DISTRIBUTIONS:
+        raise ValueError(f"Unknown fitted distribution: {family}")
+    if not path or not os.path.isfile(path):
+        raise ValueError(f"Sample file not found: {path}" if path else "No sample file given.")
+    bins = int(bins) if family == "Empirical" else 0
+    key = hashlib.sha256(f"{FIT_VERSION}|{file_sha256(path)}|{column}|{family}|{bins}".encode()).hexdigest()
+    if key in _fits:
+        return _fits[key]
+    cache_path = os.path.join(FIT_CACHE_DIR, f"{key}.npz")
+    try:
+        with np.load(cache_path) as stored:
+            fit = {name: (stored[name] if stored[name].ndim else stored[name].item()) for name in stored.files}
+    except (OSError, ValueError, KeyError):
+        values = load_sample(path, column)
+        fit = {"Empirical": lambda: _fit_histogram(values, bins), "Lognormal": lambda: _fit_lognormal(values),
+               "Gamma": lambda: _fit_gamma(values), "Weibull": lambda: _fit_weibull(values)}[family]()
+        fit["mean"], fit["scv"] = _moments(family, fit)
+        fit["sample_size"] = len(values)
+        try:
+            os.makedirs(FIT_CACHE_DIR, exist_ok=True)
+            temporary = f"{cache_path}.{os.getpid()}.npz" # Written whole, then renamed: readers never see a partial file
+            np.savez(temporary, **fit)
+            os.replace(temporary, cache_path)
+        except OSError:
+            pass # A read-only cache directory only costs refitting
+    _fits[key] = fit
+    return fit
+
+def fitted_draw(family: str, fit: dict, rng: np.random.Generator, uniforms, scale: float = 1.0, antithetic=None):
+    """n -> n values from a fitted distribution, each draw O(1) whatever the number of histogram bins.
+
+    uniforms(n) supplies the open-interval uniforms for the empirical alias table and for the Weibull
+    inverse CDF; lognormal and gamma use numpy's samplers (the lognormal's normal is mirrored for
+    antithetic member 1, gamma draws are not antithetic). Antithetic empirical draws go through the
+    inverse CDF instead of the alias table (O(log bins) each), which maps U and 1 - U to opposite ends
+    of the distribution; the alias table would pair them with unrelated bins.
+    """
+    if family == "Empirical":
+        edges, prob, alias = fit["edges"], fit["prob"], fit["alias"]
+        k = len(prob)
+        widths = np.diff(edges)
+        if antithetic is not None:
+            cdf = np.cumsum(fit["probabilities"])
+            cdf /= cdf[-1]
+            below = np.concatenate([[0.0], cdf[:-1]])
+            def inverse_cdf(n):
+                u = uniforms(n)
+                chosen = np.minimum(np.searchsorted(cdf, u, side="right"), k - 1)
+                within = np.clip((u - below[chosen]) / np.maximum(cdf[chosen] - below[chosen], 1e-300), 0.0, 1.0)
+                return (edges[chosen] + within * widths[chosen]) * scale
+            return inverse_cdf
+        def draw(n):
+            # Two uniforms per value, taken as consecutive pairs so the stream does not depend on n
+            u = uniforms(2 * n).reshape(n, 2)
+            scaled = u[:, 0] * k
+            column = np.minimum(scaled.astype(np.int64), k - 1)
+            chosen = np.where(scaled - column < prob[column], column, alias[column])
+            return (edges[chosen] + u[:, 1] * widths[chosen]) * scale
+        return draw
+    if family == "Lognormal":
+        sign = -1.0 if antithetic == 1 else 1.0
+        return lambda n: np.exp(fit["mu"] + sign * fit["sigma"] * rng.standard_normal(n)) * scale
+    if family == "Gamma":
+        if math.isinf(fit["shape"]):
+            return lambda n: np.full(n, fit["value"] * scale)
+        return lambda n: rng.gamma(fit["shape"], fit["scale"], size=n) * scale
+    if math.isinf(fit["shape"]): # Weibull of a constant sample
+        return lambda n: np.full(n, fit["scale"] * scale)
+    return lambda n: fit["scale"] * (-np.log(uniforms(n))) ** (1.0 / fit["shape"]) * scale
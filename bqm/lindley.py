@@ -0,0 +1,58 @@
+# lindley.py
+"""FCFS G/G/c schedules computed in bulk from pre-drawn arrival and service time arrays."""
+from heapq import heapreplace
+import numpy as np
+
+def fcfs_schedule(arrival_times: np.ndarray, service_times: np.ndarray, num_servers: int) -> tuple:
+    """Returns (service_start_times, departure_times, server_ids) for customers served FCFS.
+
+    c=1 uses the Lindley recursion in closed form: D_n = cumS_n + max_{k<=n}(A_k - cumS_{k-1}).
+    c>1 uses the Kiefer-Wolfowitz workload vector, kept as a heap of server free times; each customer
+    takes the server that frees up first, which is the server the simpy.Store engine hands out.
+    """
+    arrival_times = np.asarray(arrival_times, dtype=np.float64)
+    service_times = np.asarray(service_times, dtype=np.float64)
+    if arrival_times.shape != service_times.shape:
+        raise ValueError("Arrival and service time arrays must have the same length.")
+    if num_servers < 1:
+        raise ValueError("Number of servers must be at least 1.")
+
+    if num_servers == 1:
+        cum_service = np.cumsum(service_times)
+        departures = cum_service + np.maximum.accumulate(arrival_times - (cum_service - service_times))
+        starts = departures - service_times
+        return starts, departures, np.zeros(len(arrival_times), dtype=np.int64)
+
+    starts = np.empty(len(arrival_times))
+    server_ids = np.empty(len(arrival_times), dtype=np.int64)
+    # (free_time, release_order, server_id): ties go to the server released first, like the store's FIFO items
+    workload = [(0.0, sid, sid) for sid in range(num_servers)]
+    release_order = num_servers
+    for i, (arrival, service) in enumerate(zip(arrival_times.tolist(), service_times.tolist())):
+        free_time, _, server_id = workload[0]
+        start = arrival if arrival > free_time else free_time
+        starts[i] = start
+        server_ids[i] = server_id
+        heapreplace(workload, (start + service, release_order, server_id))
+        release_order += 1
+    return starts, starts + service_times, server_ids
+
+def queue_length_steps(arrival_times: np.ndarray, service_starts: np.ndarray, end_time: float) -> tuple:
+    """Returns (intervals, lengths) of the queue-length step function on [0, end_time].
+
+    The queue grows by one at each arrival and shrinks by one at each service start; the length held
+    over an interval is the length after all events at its left edge, as SimulationData records it.
+    """
+    event_times = np.concatenate([arrival_times, service_starts])
+    deltas = np.concatenate([np.ones(len(arrival_times), dtype=np.int64), -np.ones(len(service_starts), dtype=np.int64)])
+    order = np.argsort(event_times, kind="stable")
+    times = event_times[order]
+    lengths_after = np.cumsum(deltas[order])
+
+    last_at_time = np.ones(len(times), dtype=bool)
+    last_at_time[:-1] = times[1:] != times[:-1]
+    edges = np.concatenate([[0.0], times[last_at_time], [end_time]])
+    lengths = np.concatenate([[0], lengths_after[last_at_time]])
+    intervals = np.diff(edges)
+    keep = intervals > 1e-9 # Same tolerance as SimulationData.record_queue_length
+    return intervals[keep], lengths[keep]
@@ -1,11 +1,24 @@
 # main_app.py
+import os
+import importlib.util
 import streamlit as st
 import numpy as np
 import pandas as pd
-from simulation_core import run_simulation, SimulationData
-from reporting import calculate_summary_stats
-from optimization import optimize_servers
+from simulation_core import run_simulation, iter_simulation, SimulationData, ENGINES
+from reporting import (summarize_run, build_chart_data, queue_trajectory_csv, customer_log_parquet, REPLICATION_METRICS,
+                       DEFAULT_CHART_POINTS)
+from optimization import optimize_servers, replicate_to_precision
+from sweep import grid_points, latin_hypercube, run_sweep, arrival_axis, service_axis
+from result_cache import ResultCache
+from steady_state import steady_state_summary
 import distributions # Ensure functions are accessible
+from nonstationary import PROFILE_SHAPES, parse_profile
+from rollups import DEFAULT_ROLLUP_BUCKETS
+from dispatch import DISPATCH_POLICIES, DEFAULT_DISPATCH_POLICY
+try:
+    import plotly.express as px # Optional: sweep heatmaps
+except ImportError:
+    px = None
 
 # --- Page Config ---
 st.set_page_config(
@@ -14,6 +27,40 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def get_result_cache() -> ResultCache:
+    """One cache per app server, so its in-memory tier survives reruns."""
+    return ResultCache()
+
+def show_message(level: str, text: str):
+    """Shows optimizer status text with the matching Streamlit element (st.write, st.info, st.success, ...)."""
+    getattr(st, level)(text)
+
+def fitted_inputs(dist_type: str, side: str, label: str) -> dict:
+    """Sidebar inputs of a distribution fitted to a sample file, as "<side>_sample_*" params, with the fit shown below."""
+    params = {
+        f"{side}_sample_path": st.sidebar.text_input(f"{label} Sample File", key=f"{side}_sample_path",
+                                                     help="Observed values to fit: .npy, raw float64 .bin, .csv or .parquet. "
+                                                          "Fits are cached on disk by file hash."),
+        f"{side}_sample_column": st.sidebar.text_input("Sample Column", value="", key=f"{side}_sample_column",
+                                                       help="Column name (CSV/Parquet) or index (2-D .npy). Empty: the first column.") or None,
+        f"{side}_sample_scale": st.sidebar.number_input(f"{label} Time Scale", min_value=0.01, value=1.0, step=0.05,
+                                                        key=f"{side}_sample_scale", help="Multiplies every drawn value."),
+    }
+    if dist_type == "Empirical":
+        params[f"{side}_histogram_bins"] = st.sidebar.number_input("Histogram Bins", min_value=1, max_value=100000,
+                                                                   value=distributions.DEFAULT_HISTOGRAM_BINS, step=16,
+                                                                   key=f"{side}_histogram_bins",
+                                                                   help="Bins on sample quantiles; draws cost the same for any number of bins.")
+    if params[f"{side}_sample_path"]:
+        try:
+            fit, scale = distributions.fitted_params(dist_type, params, side)
+            st.sidebar.caption(f"Fitted to {fit['sample_size']:,} values: mean {fit['mean'] * scale:.4g}, "
+                               f"squared CV {fit['scv']:.3g}")
+        except ValueError as e:
+            st.sidebar.error(str(e))
+    return params
+
 # --- Title ---
 st.title("📊 AIMS Basic Queue Modeler V1.0")
 st.markdown("""
@@ -29,12 +76,42 @@ st.sidebar.header("Simulation Parameters")
 st.sidebar.subheader("Arrival Process")
 arrival_dist_type = st.sidebar.selectbox(
     "Arrival Distribution",
-    ["Exponential (Poisson Process)", "Constant Rate", "Fixed Interval"],
+    ["Exponential (Poisson Process)", "Constant Rate", "Fixed Interval", "Time-Varying Rate", "Trace",
+     *distributions.FITTED_DISTRIBUTIONS],
     key="arrival_dist"
 )
 arrival_params = {}
 if arrival_dist_type == "Exponential (Poisson Process)" or arrival_dist_type == "Constant Rate":
     arrival_params['arrival_rate'] = st.sidebar.number_input("Average Arrival Rate (customers/unit time)", min_value=0.01, value=5.0, step=0.1, key="arrival_rate")
+elif arrival_dist_type == "Trace":
+    arrival_params['arrival_trace_path'] = st.sidebar.text_input("Arrival Trace File", key="arrival_trace_path",
+                                                                 help="Arrival timestamps, replayed in order and repeated when the file runs "
+                                                                      "out: .npy or raw float64 .bin (memory-mapped), or .csv/.parquet (read in chunks).")
+    arrival_params['arrival_trace_column'] = st.sidebar.text_input("Timestamp Column", value="", key="arrival_trace_column",
+                                                                   help="Column name (CSV/Parquet) or index (2-D .npy). Empty: the first column.") or None
+    arrival_params['arrival_trace_scale'] = st.sidebar.number_input("Arrival Trace Time Scale", min_value=0.01, value=1.0, step=0.05,
+                                                                    key="arrival_trace_scale",
+                                                                    help="Multiplies the gaps between arrivals: below 1 replays the trace faster.")
+elif arrival_dist_type == "Time-Varying Rate":
+    profile_text = st.sidebar.text_area("Rate Profile (time, rate per line)", value="0, 2\n6, 10\n10, 4\n18, 8\n22, 1",
+                                        key="rate_profile_text",
+                                        help="Breakpoints of the arrival rate over one period, the first at time 0. "
+                                             "Arrivals are a Poisson process with this rate, repeated every period.")
+    try:
+        arrival_params['rate_profile'] = parse_profile(profile_text)
+    except ValueError as e:
+        st.sidebar.error(str(e))
+        arrival_params['rate_profile'] = []
+    arrival_params['rate_profile_shape'] = st.sidebar.selectbox("Rate Between Breakpoints", PROFILE_SHAPES, key="rate_profile_shape",
+                                                                help="Constant: each rate holds until the next breakpoint. "
+                                                                     "Linear: rates are interpolated between breakpoints.")
+    arrival_params['rate_profile_period'] = st.sidebar.number_input("Profile Period", min_value=0.01, value=24.0, step=1.0,
+                                                                    key="rate_profile_period",
+                                                                    help="Length of one cycle of the profile, e.g. 24 for a daily profile in hours.")
+    arrival_params['rate_profile_scale'] = st.sidebar.number_input("Rate Scale", min_value=0.01, value=1.0, step=0.05,
+                                                                   key="rate_profile_scale", help="Multiplies every rate of the profile.")
+elif arrival_dist_type in distributions.FITTED_DISTRIBUTIONS:
+    arrival_params.update(fitted_inputs(arrival_dist_type, "arrival", "Interarrival"))
 else: # Fixed Interval
     arrival_params['fixed_interval'] = st.sidebar.number_input("Fixed Time Between Arrivals", min_value=0.01, value=0.2, step=0.01, key="fixed_interval")
 
@@ -42,7 +119,7 @@ else: # Fixed Interval
 st.sidebar.subheader("Service Process")
 service_dist_type = st.sidebar.selectbox(
     "Service Distribution",
-    ["Exponential", "Constant", "Normal"],
+    ["Exponential", "Constant", "Normal", "Trace", *distributions.FITTED_DISTRIBUTIONS],
     key="service_dist"
 )
 service_params = {}
@@ -50,6 +127,17 @@ if service_dist_type == "Exponential":
     service_params['service_rate'] = st.sidebar.number_input("Average Service Rate (customers/unit time)", min_value=0.01, value=6.0, step=0.1, key="service_rate")
 elif service_dist_type == "Constant":
     service_params['fixed_service_time'] = st.sidebar.number_input("Fixed Service Time", min_value=0.01, value=0.15, step=0.01, key="fixed_service_time")
+elif service_dist_type == "Trace":
+    service_params['service_trace_path'] = st.sidebar.text_input("Service Trace File", key="service_trace_path",
+                                                                 help="Service durations, one per customer in order of service start "
+                                                                      "(same file types as arrival traces).")
+    service_params['service_trace_column'] = st.sidebar.text_input("Duration Column", value="", key="service_trace_column",
+                                                                   help="Column name (CSV/Parquet) or index (2-D .npy). Empty: the first column.") or None
+    service_params['service_trace_scale'] = st.sidebar.number_input("Service Trace Time Scale", min_value=0.01, value=1.0, step=0.05,
+                                                                    key="service_trace_scale",
+                                                                    help="Multiplies every service duration.")
+elif service_dist_type in distributions.FITTED_DISTRIBUTIONS:
+    service_params.update(fitted_inputs(service_dist_type, "service", "Service"))
 else: # Normal
     service_params['mean_service_time'] = st.sidebar.number_input("Mean Service Time", min_value=0.01, value=0.15, step=0.01, key="mean_service_time")
     service_params['std_dev_service_time'] = st.sidebar.number_input("Std Dev Service Time", min_value=0.0, value=0.05, step=0.01, key="std_dev_service_time")
@@ -74,9 +162,87 @@ seed = st.sidebar.number_input("Random Seed (optional)", value=42, step=1, key="
 use_seed = st.sidebar.checkbox("Use Fixed Seed", value=True, key="use_seed")
 final_seed = seed if use_seed else None
 
+# Statistics Collection
+streaming_stats = st.sidebar.checkbox("Streaming Statistics (constant memory)", value=False, key="streaming_stats",
+                                      help="Keep running summaries instead of every wait time and the full queue-length "
+                                           "trajectory. Use for very long runs; the charts still come from the time buckets.")
+chart_buckets = st.sidebar.number_input("Chart Time Buckets", min_value=0, value=DEFAULT_ROLLUP_BUCKETS, step=50, key="chart_buckets",
+                                        help="Single runs tally arrivals, completions, queue length, utilization and waits "
+                                             "per time bucket as they go, and the charts plot those buckets. "
+                                             "0 charts the raw queue-length steps instead (needs full statistics).")
+chart_points = st.sidebar.number_input("Max Chart Points", min_value=100, value=DEFAULT_CHART_POINTS, step=500, key="chart_points",
+                                       help="Raw queue-length steps are downsampled to this many points (keeping each "
+                                            "pixel's lowest and highest value). The full trajectory is a download, so its "
+                                            "compact arrays stay in session state with the charts.")
+keep_customer_log = st.sidebar.checkbox("Keep Per-Customer Log", value=False, key="keep_customer_log",
+                                        help="Record every served customer's arrival, service start and end times and "
+                                             "server in NumPy columns, downloadable as Parquet or CSV (single runs only).")
+steady_state = st.sidebar.checkbox("Steady-State Estimates (drop warm-up)", value=False, key="steady_state",
+                                   disabled=streaming_stats,
+                                   help="Detect the initial transient (empty, idle start) with MSER-5 and leave it out of the "
+                                        "statistics. Single runs also get batch-means confidence intervals, so one long run "
+                                        "can stand in for several replications. Needs full statistics.")
+steady_state = steady_state and not streaming_stats
+warmup_params = {"warmup": "mser"} if steady_state else {} # Replication summaries drop the warm-up
+
+# Simulation Engine
+engine = st.sidebar.selectbox(
+    "Simulation Engine",
+    ENGINES,
+    help="simpy: reference engine. fast: heap-based engine, same results as simpy. "
+         "vectorized: bulk computation from pre-drawn arrays. auto: vectorized when possible.",
+    key="engine"
+)
+dispatch_policy = st.sidebar.selectbox(
+    "Server Dispatch Policy",
+    DISPATCH_POLICIES,
+    help="Which free server a customer gets. release order: the one idle longest. lowest id: server 0 first. "
+         "round robin: the next id after the last one used. least busy: the one with the least busy time so far. "
+         "Waits and totals are the same under every policy; the per-server utilization and customer counts "
+         "of single runs follow it. Policies other than release order use the fast engine instead of vectorized.",
+    key="dispatch_policy"
+)
+# Extra params of single runs only: replications neither chart nor export customers, and their totals
+# do not depend on the dispatch policy
+single_run_params = {"rollup_buckets": chart_buckets, **({"customer_log": True} if keep_customer_log else {}),
+                     **({"dispatch_policy": dispatch_policy} if dispatch_policy != DEFAULT_DISPATCH_POLICY else {})}
+
+use_cache = st.sidebar.checkbox("Reuse Cached Results", value=True, key="use_cache",
+                                help="Seeded runs with the same parameters are read from the result cache instead of "
+                                     "being simulated again (also per server count and replication in the optimizer).")
+result_cache = get_result_cache() if use_cache else None
+
 # --- Simulation Control ---
 st.sidebar.subheader("Run Simulation")
+live_run = st.sidebar.checkbox("Show Live Progress", value=False, key="live_run",
+                               help="Run the SimPy engine in slices and update the results as it goes. "
+                                    "Stop Simulation keeps the partial results.")
+convergence_pct = st.sidebar.number_input("Stop When Mean Wait Is Stable Within (%)", min_value=0.0, value=0.0, step=0.5,
+                                          disabled=not live_run, key="convergence_pct",
+                                          help="End the run once the running mean wait time changes by less than this "
+                                               "over three consecutive slices. 0 runs to the stopping condition.")
 run_button = st.sidebar.button("Run Single Simulation")
+stop_button = st.sidebar.button("Stop Simulation", disabled=not live_run) # Any click reruns the app, ending a live run
+
+# --- Replication Precision ---
+st.sidebar.subheader("Replication Precision")
+use_precision = st.sidebar.checkbox("Replicate Until Confidence Intervals Are Tight", value=False, key="use_precision",
+                                    help="Instead of a fixed number of replications, keep adding replications (in parallel "
+                                         "batches) until the Student-t interval of the average wait time meets the target, "
+                                         "or the max replications are reached. Applies to single runs and the optimizer.")
+wait_precision_kind = st.sidebar.radio("Wait Time Half-Width", ["Relative (% of mean)", "Absolute (time units)"],
+                                       disabled=not use_precision, key="wait_precision_kind")
+wait_precision = st.sidebar.number_input("Wait Time Target", min_value=0.0001, value=5.0, step=0.5, format="%.4f",
+                                         disabled=not use_precision, key="wait_precision")
+use_util_precision = st.sidebar.checkbox("Also Target Utilization Half-Width", value=False, disabled=not use_precision, key="use_util_precision")
+util_precision = st.sidebar.number_input("Utilization Target (percentage points)", min_value=0.01, value=1.0, step=0.1,
+                                         disabled=not (use_precision and use_util_precision), key="util_precision")
+precision = None
+if use_precision:
+    relative_wait = wait_precision_kind.startswith("Relative")
+    precision = {"avg_wait_time": (wait_precision / 100 if relative_wait else wait_precision, relative_wait)}
+    if use_util_precision:
+        precision["avg_server_utilization"] = (util_precision, False)
 
 # --- Optimization Section ---
 st.sidebar.subheader("Optimize Number of Servers")
@@ -85,6 +251,13 @@ optimize_button = st.sidebar.button("Run Optimization")
 min_opt_servers = st.sidebar.number_input("Min Servers to Test", min_value=1, value=1, step=1, key="min_opt_servers")
 max_opt_servers = st.sidebar.number_input("Max Servers to Test", min_value=min_opt_servers, value=5, step=1, key="max_opt_servers")
 num_replications = st.sidebar.number_input("Replications per Configuration", min_value=1, value=5, step=1, key="num_replications")
+max_workers = st.sidebar.number_input("Parallel Worker Processes", min_value=1, value=os.cpu_count() or 1, step=1, key="max_workers",
+                                      help="Replications are spread over this many processes. 1 runs them in the app process.")
+batched = st.sidebar.checkbox("Batch Replications (lockstep arrays)", value=False, key="batched",
+                              help="Simulate all replications of a configuration together as NumPy arrays, so hundreds of "
+                                   "replications take about as long as one. Needs state-independent distributions and "
+                                   "no warm-up truncation; other configurations run one by one. Applies to replicated "
+                                   "single runs, the optimizer and sweeps.")
 
 objective = st.sidebar.selectbox(
     "Optimization Objective",
@@ -92,6 +265,55 @@ objective = st.sidebar.selectbox(
     key="opt_objective"
 )
 
+search_label = st.sidebar.selectbox(
+    "Search Strategy",
+    ["Linear Sweep", "Bisection (monotone metrics)"],
+    help="Wait time, queue length and utilization never increase with more servers, so bisection only "
+         "simulates O(log range) configurations. Useful for wide ranges such as 1 to 500 servers.",
+    key="search"
+)
+search = "bisection" if search_label.startswith("Bisection") else "linear"
+selection_label = st.sidebar.selectbox(
+    "Selection Procedure",
+    ["Exhaustive Sweep", "Sequential Selection (KN, Common Random Numbers)"],
+    help="Sequential selection starts every configuration with the replications above, then keeps adding "
+         "replications only to configurations that are not yet clearly worse than the best one.",
+    key="selection"
+)
+selection = "kn" if selection_label.startswith("Sequential") else "exhaustive"
+use_crn = st.sidebar.checkbox("Common Random Numbers", value=selection == "kn", disabled=selection == "kn", key="use_crn",
+                              help="Use the same arrival and service streams for every number of servers.")
+antithetic = st.sidebar.checkbox("Antithetic Variates", value=False, key="antithetic",
+                                 help="Run every replication as a pair on one seed, drawing by inverse CDF from U and 1 - U, "
+                                      "and average the pair. Applies to the optimizer (not sequential selection) and precision-targeted runs.")
+control_variates = st.sidebar.checkbox("Control Variates", value=False, key="control_variates",
+                                       help="Adjust the estimates by regression on each run's mean interarrival and service "
+                                            "time, whose expected values are known. The comparison reports the achieved "
+                                            "variance reduction factor for the wait time.")
+selection_confidence = st.sidebar.slider("Confidence Level", min_value=0.5, max_value=0.99, value=0.95, step=0.01,
+                                         disabled=selection != "kn" and not use_precision, key="selection_confidence",
+                                         help="Probability of correct selection for sequential selection, and the "
+                                              "confidence of the intervals for the precision targets.")
+indifference_zone = st.sidebar.number_input("Indifference Zone (smallest difference worth detecting)", min_value=0.001, value=0.1, step=0.01,
+                                            format="%.3f", disabled=selection != "kn", key="indifference_zone")
+max_replications = st.sidebar.number_input("Max Replications per Configuration", min_value=2, value=50, step=1,
+                                           disabled=selection != "kn" and not use_precision, key="max_replications")
+use_analytic = st.sidebar.checkbox("Use Queueing Theory Shortcuts", value=False, key="use_analytic",
+                                   help="Answer M/M/c problems with the Erlang C formulas (steady state; replications, seed and "
+                                        "search are then not used) and start other distributions from the Allen-Cunneen answer "
+                                        "+/- 1 server, widening the range while the best count is on its edge.")
+use_windows = st.sidebar.checkbox("Report Metrics per Time Window", value=False, key="use_windows",
+                                  help="Break every configuration's metrics down by time window (e.g. per shift) and report "
+                                       "the fewest servers meeting the constraints in each window.")
+window_length_value = st.sidebar.number_input("Window Length", min_value=0.01, value=8.0, step=1.0, disabled=not use_windows,
+                                              key="window_length")
+fold_windows = st.sidebar.checkbox("Pool Windows over Profile Periods", value=True, key="fold_windows",
+                                   disabled=not use_windows or arrival_dist_type != "Time-Varying Rate",
+                                   help="Windows restart every rate profile period, so each one describes a time of day "
+                                        "across the whole run.")
+window_length = window_length_value if use_windows else None
+window_period = arrival_params['rate_profile_period'] if use_windows and fold_windows and arrival_dist_type == "Time-Varying Rate" else None
+
 # Constraints
 st.sidebar.markdown("**Constraints (Optional):**")
 use_wait_constraint = st.sidebar.checkbox("Max Average Wait Time", key="use_wait_const")
@@ -100,16 +322,51 @@ max_wait_constraint = st.sidebar.number_input("Value", min_value=0.0, value=1.0,
 use_util_constraint = st.sidebar.checkbox("Max Average Server Utilization (%)", key="use_util_const")
 max_util_constraint = st.sidebar.number_input("Value (%)", min_value=0.0, max_value=100.0, value=95.0, step=1.0, disabled=not use_util_constraint, key="max_util_const_val")
 
+# --- Parameter Sweep Section ---
+st.sidebar.subheader("Parameter Sweep")
+sweep_arrival_param = arrival_axis(arrival_dist_type)
+sweep_service_param = service_axis(service_dist_type)
+sweep_design = st.sidebar.selectbox("Sweep Design", ["Grid", "Latin Hypercube"], key="sweep_design",
+                                     help="Grid runs every combination; a Latin hypercube samples each range evenly with fewer points.")
+arrival_value = arrival_params[sweep_arrival_param]
+service_value = service_params[sweep_service_param]
+sweep_arrival_min = st.sidebar.number_input(f"Min {sweep_arrival_param}", min_value=0.01, value=round(arrival_value * 0.5, 3), key=f"sweep_arrival_min_{sweep_arrival_param}")
+sweep_arrival_max = st.sidebar.number_input(f"Max {sweep_arrival_param}", min_value=sweep_arrival_min, value=max(round(arrival_value * 1.5, 3), sweep_arrival_min), key=f"sweep_arrival_max_{sweep_arrival_param}")
+sweep_service_min = st.sidebar.number_input(f"Min {sweep_service_param}", min_value=0.01, value=round(service_value * 0.5, 3), key=f"sweep_service_min_{sweep_service_param}")
+sweep_service_max = st.sidebar.number_input(f"Max {sweep_service_param}", min_value=sweep_service_min, value=max(round(service_value * 1.5, 3), sweep_service_min), key=f"sweep_service_max_{sweep_service_param}")
+sweep_servers_min = st.sidebar.number_input("Min Servers", min_value=1, value=1, step=1, key="sweep_servers_min")
+sweep_servers_max = st.sidebar.number_input("Max Servers", min_value=sweep_servers_min, value=5, step=1, key="sweep_servers_max")
+if sweep_design == "Grid":
+    sweep_steps = st.sidebar.number_input("Values per Rate Axis", min_value=2, value=5, step=1, key="sweep_steps")
+else:
+    sweep_points = st.sidebar.number_input("Number of Points", min_value=2, value=30, step=1, key="sweep_points")
+sweep_replications = st.sidebar.number_input("Replications per Point", min_value=1, value=3, step=1, key="sweep_replications")
+sweep_button = st.sidebar.button("Run Sweep")
+
 # --- Main Area for Results ---
 st.header("Results")
 
 # Session state to store results
 if 'sim_results' not in st.session_state:
     st.session_state.sim_results = None
+if 'sim_chart_source' not in st.session_state:
+    st.session_state.sim_chart_source = None # (SimulationData, duration) until the charts are built
+if 'sim_charts' not in st.session_state:
+    st.session_state.sim_charts = None
+if 'rep_results' not in st.session_state:
+    st.session_state.rep_results = None # Means and CI half-widths of a precision-targeted single configuration
+if 'steady_results' not in st.session_state:
+    st.session_state.steady_results = None
+if 'sim_progress' not in st.session_state:
+    st.session_state.sim_progress = None # Progress of the latest live run
 if 'opt_results' not in st.session_state:
     st.session_state.opt_results = None
 if 'opt_comparison_df' not in st.session_state:
     st.session_state.opt_comparison_df = None
+if 'opt_windows_df' not in st.session_state:
+    st.session_state.opt_windows_df = None # Per-window metrics of the latest optimization, if requested
+if 'sweep_df' not in st.session_state:
+    st.session_state.sweep_df = None
 
 
 # --- Handle Button Clicks ---
@@ -117,6 +374,7 @@ if 'opt_comparison_df' not in st.session_state:
 if run_button:
     st.session_state.opt_results = None # Clear optimization results if single run is triggered
     st.session_state.opt_comparison_df = None
+    st.session_state.opt_windows_df = None
 
     params = {
         "arrival_distribution": arrival_dist_type,
@@ -126,22 +384,79 @@ if run_button:
         "num_servers": num_servers_single,
         "stop_condition_type": stop_condition_type,
         "stop_condition_value": stop_condition_value,
-        "seed": final_seed
+        "seed": final_seed,
+        "engine": engine,
+        "statistics": "streaming" if streaming_stats else "full"
     }
 
+    st.session_state.sim_progress = None
+    st.session_state.rep_results = None
+    st.session_state.steady_results = None
     try:
-        with st.spinner("Running Simulation..."):
-            sim_data = run_simulation(params)
-
-            # Determine actual sim duration for reporting
-            if params["stop_condition_type"] == "Simulation Time":
-                sim_duration = params["stop_condition_value"]
-            else:
-                sim_duration = sim_data.last_event_time
-
-            results = calculate_summary_stats(sim_data, sim_duration, params["num_servers"])
-            st.session_state.sim_results = results
+        if precision is not None:
+            st.session_state.sim_results = None
+            progress_bar = st.progress(0)
+            pool = replicate_to_precision({**params, **warmup_params}, precision, confidence=selection_confidence,
+                                          min_replications=num_replications, max_replications=max_replications,
+                                          max_workers=max_workers, cache=result_cache, on_progress=progress_bar.progress,
+                                          batched=batched, antithetic=antithetic, control_variates=control_variates)
+            progress_bar.empty()
+            st.session_state.rep_results = {
+                "replications": pool.count,
+                "confidence": selection_confidence,
+                "antithetic": antithetic,
+                "wait_vrf": pool.variance_reduction_factor("avg_wait_time") if antithetic or control_variates else None,
+                **{key: (pool.mean(key), pool.half_width(key, selection_confidence)) for key in REPLICATION_METRICS},
+            }
+            st.success("Replications Complete!")
+        elif live_run:
+            params.update(single_run_params)
+            live_progress = st.progress(0)
+            live_view = st.empty()
+            for sim_data, progress in iter_simulation(params, convergence_tolerance=convergence_pct / 100 or None):
+                # Keep every slice's results, so stopping (which reruns the script) leaves the latest ones
+                results = summarize_run(sim_data, progress["time"], params["num_servers"])
+                st.session_state.sim_results = results
+                st.session_state.sim_chart_source = (sim_data, progress["time"])
+                st.session_state.sim_charts = None
+                st.session_state.sim_progress = progress
+                if steady_state and progress["done"]:
+                    st.session_state.steady_results = steady_state_summary(sim_data, progress["time"], params["num_servers"])
+                live_progress.progress(progress["fraction"])
+                with live_view.container():
+                    live_col1, live_col2, live_col3, live_col4 = st.columns(4)
+                    live_col1.metric("Simulated Time", f"{progress['time']:.1f}")
+                    live_col2.metric("Customers Served", f"{progress['served']}")
+                    live_col3.metric("Avg Wait Time", f"{results['avg_wait_time']:.3f}")
+                    live_col4.metric("Avg Server Utilization (%)", f"{results['avg_server_utilization']:.2f}%")
+                    queue_df = build_chart_data(sim_data, progress["time"], chart_points)["queue_length_df"]
+                    if not queue_df.empty:
+                        st.line_chart(queue_df)
+            live_progress.empty()
+            live_view.empty()
             st.success("Simulation Complete!")
+        else:
+            params.update(single_run_params)
+            with st.spinner("Running Simulation..."):
+                if result_cache is not None:
+                    sim_data = result_cache.get_or_compute("simulation", params, run_simulation)
+                else:
+                    sim_data = run_simulation(params)
+
+                # Determine actual sim duration for reporting
+                if params["stop_condition_type"] == "Simulation Time":
+                    sim_duration = params["stop_condition_value"]
+                else:
+                    sim_duration = sim_data.last_event_time
+
+                # Scalars now; the chart DataFrames are only built when the results are displayed
+                results = summarize_run(sim_data, sim_duration, params["num_servers"])
+                st.session_state.sim_results = results
+                st.session_state.sim_chart_source = (sim_data, sim_duration)
+                st.session_state.sim_charts = None
+                if steady_state:
+                    st.session_state.steady_results = steady_state_summary(sim_data, sim_duration, params["num_servers"])
+                st.success("Simulation Complete!")
 
     except ValueError as e:
         st.error(f"Input Error: {e}")
@@ -151,6 +466,8 @@ if run_button:
 
 if optimize_button:
     st.session_state.sim_results = None # Clear single run results
+    st.session_state.rep_results = None
+    st.session_state.opt_windows_df = None
 
     base_params = {
         "arrival_distribution": arrival_dist_type,
@@ -160,7 +477,10 @@ if optimize_button:
         # num_servers is handled by optimization loop
         "stop_condition_type": stop_condition_type,
         "stop_condition_value": stop_condition_value,
-        "seed": final_seed # Base seed for replicability
+        "seed": final_seed, # Base seed for replicability
+        "engine": engine,
+        "statistics": "streaming" if streaming_stats else "full",
+        **warmup_params
     }
 
     constraints = {}
@@ -171,10 +491,19 @@ if optimize_button:
 
     try:
         with st.spinner("Running Optimization (this may take a while)..."):
+             progress_bar = st.progress(0)
              best_config, comparison_df = optimize_servers(
                  base_params, objective, constraints,
-                 min_opt_servers, max_opt_servers, num_replications
+                 min_opt_servers, max_opt_servers, num_replications,
+                 max_workers=max_workers, selection=selection, common_random_numbers=use_crn,
+                 confidence=selection_confidence, indifference_zone=indifference_zone,
+                 max_replications=max_replications, analytic=use_analytic, search=search, cache=result_cache,
+                 on_message=show_message, on_progress=progress_bar.progress, precision=precision,
+                 batched=batched, antithetic=antithetic, control_variates=control_variates,
+                 window_length=window_length, window_period=window_period,
+                 on_windows=lambda windows_df: st.session_state.update(opt_windows_df=windows_df)
              )
+             progress_bar.empty() # Remove progress bar
              st.session_state.opt_results = best_config
              st.session_state.opt_comparison_df = comparison_df
 
@@ -184,12 +513,73 @@ if optimize_button:
         st.error(f"An error occurred during optimization: {e}")
         st.session_state.opt_results = None
         st.session_state.opt_comparison_df = None
+        st.session_state.opt_windows_df = None
+
+
+if sweep_button:
+    st.session_state.sim_results = None
+    st.session_state.rep_results = None
+    st.session_state.opt_results = None
+    st.session_state.opt_comparison_df = None
+    st.session_state.opt_windows_df = None
+
+    base_params = {
+        "arrival_distribution": arrival_dist_type,
+        **arrival_params,
+        "service_distribution": service_dist_type,
+        **service_params,
+        "stop_condition_type": stop_condition_type,
+        "stop_condition_value": stop_condition_value,
+        "seed": final_seed,
+        "engine": engine,
+        "statistics": "streaming" if streaming_stats else "full",
+        **warmup_params
+    }
+    if sweep_design == "Grid":
+        points = grid_points({
+            sweep_arrival_param: np.linspace(sweep_arrival_min, sweep_arrival_max, sweep_steps).tolist(),
+            sweep_service_param: np.linspace(sweep_service_min, sweep_service_max, sweep_steps).tolist(),
+            "num_servers": list(range(sweep_servers_min, sweep_servers_max + 1)),
+        })
+    else:
+        points = latin_hypercube({
+            sweep_arrival_param: (sweep_arrival_min, sweep_arrival_max),
+            sweep_service_param: (sweep_service_min, sweep_service_max),
+            "num_servers": (sweep_servers_min, sweep_servers_max),
+        }, sweep_points, seed=final_seed)
+
+    try:
+        st.write(f"Sweeping {len(points)} points x {sweep_replications} replications...")
+        progress_bar = st.progress(0)
+        live_table = st.empty()
+        finished = []
+        def show_point(row):
+            finished.append(row)
+            live_table.dataframe(pd.DataFrame(finished))
+        st.session_state.sweep_df_design = sweep_design
+        st.session_state.sweep_df = run_sweep(base_params, points, sweep_replications, max_workers=max_workers,
+                                              cache=result_cache, on_point=show_point, on_progress=progress_bar.progress,
+                                              batched=batched)
+        progress_bar.empty()
+        live_table.empty()
+    except ValueError as e:
+        st.error(f"Input Error during Sweep setup: {e}")
+    except Exception as e:
+        st.error(f"An error occurred during the sweep: {e}")
+        st.session_state.sweep_df = None
 
 
 # --- Display Results ---
 
 if st.session_state.sim_results:
     st.subheader("Single Simulation Run Results")
+    progress = st.session_state.sim_progress
+    if progress is not None and progress["converged"]:
+        st.info(f"Stopped at time {progress['time']:.1f}: the running mean wait time was stable "
+                f"after {progress['served']} customers.")
+    elif progress is not None and not progress["done"]:
+        st.warning(f"Simulation stopped at time {progress['time']:.1f} ({progress['served']} customers served); "
+                   f"showing partial results.")
     results = st.session_state.sim_results
     col1, col2, col3 = st.columns(3)
     col1.metric("Avg Wait Time", f"{results.get('avg_wait_time', 0):.3f}")
@@ -202,19 +592,76 @@ if st.session_state.sim_results:
     col6.metric("Avg Server Utilization (%)", f"{results.get('avg_server_utilization', 0):.2f}%")
 
     st.metric("Total Customers Served", f"{results.get('total_served', 0)}")
+    if results.get("individual_server_utilization"):
+        with st.expander("Per-Server Utilization and Customers"):
+            server_df = pd.DataFrame({"Utilization (%)": results["individual_server_utilization"]})
+            server_df["Customers Served"] = [results["server_customer_counts"].get(i, 0) for i in range(len(server_df))]
+            st.bar_chart(server_df[["Utilization (%)"]])
+            st.dataframe(server_df)
+
+    if st.session_state.steady_results:
+        st.subheader("Steady-State Estimates")
+        steady = st.session_state.steady_results
+        st.write(f"MSER-5 warm-up: first {steady['warmup_time']:.1f} time units ({steady['warmup_fraction']:.1%} of the run, "
+                 f"{steady['warmup_customers']} customers) discarded; ± are 95% batch-means confidence interval half-widths.")
+        ss_col1, ss_col2, ss_col3 = st.columns(3)
+        ss_col1.metric("Avg Wait Time", f"{steady['avg_wait_time']:.3f} ± {steady['avg_wait_time_ci']:.3f}")
+        ss_col2.metric("Avg Queue Length", f"{steady['avg_queue_length']:.3f} ± {steady['avg_queue_length_ci']:.3f}")
+        ss_col3.metric("Avg Server Utilization (%)", f"{steady['avg_server_utilization']:.2f}%")
 
     st.subheader("Charts")
-    if results.get("queue_length_df") is not None and not results["queue_length_df"].empty:
-        st.line_chart(results["queue_length_df"])
+    if st.session_state.sim_charts is None and st.session_state.sim_chart_source is not None:
+        chart_data, chart_duration = st.session_state.sim_chart_source
+        st.session_state.sim_charts = build_chart_data(chart_data, chart_duration, chart_points)
+        st.session_state.sim_chart_source = None # Drop the run data; the charts keep only the trajectory and log for the downloads
+    charts = st.session_state.sim_charts or {}
+    rollup_df = charts.get("rollup_df")
+    if charts.get("queue_length_df") is not None and not charts["queue_length_df"].empty:
+        if rollup_df is not None:
+            st.caption(f"Per time bucket of {charts['rollup_width']:.3g} time units.")
+        st.line_chart(charts["queue_length_df"])
     else:
         st.write("Queue length data not available.")
-
-    if results.get("wait_time_hist_df") is not None and not results["wait_time_hist_df"].empty:
-         st.bar_chart(results["wait_time_hist_df"])
+    if charts.get("queue_trajectory") is not None:
+        trajectory = charts["queue_trajectory"]
+        # Built only on click, so the full-resolution CSV never sits in the page (the trajectory arrays stay in session state)
+        st.download_button(f"Download Full Queue Trajectory ({len(trajectory)} steps, CSV)",
+                           lambda: queue_trajectory_csv(trajectory), file_name="queue_trajectory.csv")
+    customer_log = charts.get("customer_log")
+    if customer_log is not None:
+        log_col1, log_col2 = st.columns(2)
+        # Parquet needs the optional pyarrow; both files are built only on click
+        log_col1.download_button(f"Download Customer Log ({len(customer_log)} customers, Parquet)",
+                                 lambda: customer_log_parquet(customer_log), file_name="customer_log.parquet",
+                                 disabled=importlib.util.find_spec("pyarrow") is None)
+        log_col2.download_button("Download Customer Log (CSV)", lambda: pd.DataFrame(customer_log.columns).to_csv(index=False),
+                                 file_name="customer_log.csv")
+    if rollup_df is not None and not rollup_df.empty:
+        st.line_chart(rollup_df[["Utilization (%)"]])
+        st.line_chart(rollup_df[["Avg Wait", "P90 Wait"]])
+        st.line_chart(rollup_df[["Arrivals", "Completions"]])
+
+    if charts.get("wait_time_hist_df") is not None and not charts["wait_time_hist_df"].empty:
+         st.bar_chart(charts["wait_time_hist_df"])
     else:
          st.write("Wait time histogram data not available.")
 
 
+if st.session_state.rep_results:
+    st.subheader("Replicated Estimate")
+    rep = st.session_state.rep_results
+    pairs_text = " antithetic pairs of" if rep["antithetic"] else ""
+    st.write(f"Mean over {rep['replications']}{pairs_text} replications with {rep['confidence']:.0%} confidence interval half-widths:")
+    rep_col1, rep_col2, rep_col3, rep_col4 = st.columns(4)
+    rep_col1.metric("Avg Wait Time", f"{rep['avg_wait_time'][0]:.3f} ± {rep['avg_wait_time'][1]:.3f}")
+    rep_col2.metric("Avg Queue Length", f"{rep['avg_queue_length'][0]:.3f} ± {rep['avg_queue_length'][1]:.3f}")
+    rep_col3.metric("Avg Server Utilization (%)", f"{rep['avg_server_utilization'][0]:.2f} ± {rep['avg_server_utilization'][1]:.2f}")
+    rep_col4.metric("Total Customers Served", f"{rep['total_served'][0]:.1f} ± {rep['total_served'][1]:.1f}")
+    if rep["wait_vrf"] is not None:
+        st.write(f"Wait time variance reduction factor: {rep['wait_vrf']:.2f} (plain replication would need about that "
+                 f"many times the runs for the same interval).")
+
+
 if st.session_state.opt_results:
     st.subheader("Optimization Results")
     st.write(f"**Objective:** {objective}")
@@ -242,17 +689,58 @@ if st.session_state.opt_results:
 
 if st.session_state.opt_comparison_df is not None:
      st.subheader("Optimization Comparison")
-     st.write("Performance across different numbers of servers (averaged over replications):")
-     st.dataframe(st.session_state.opt_comparison_df.style.format({
+     st.write("Performance across the evaluated numbers of servers (averaged over the replications each one received):")
+     comparison_formats = {
          "avg_wait_time": "{:.3f}",
+         "avg_wait_time_ci": "± {:.3f}",
          "avg_queue_length": "{:.3f}",
+         "avg_queue_length_ci": "± {:.3f}",
          "avg_server_utilization": "{:.2f}%",
-         "avg_total_served": "{:.1f}"
-     }))
-
-     # Plot comparison
-     st.line_chart(st.session_state.opt_comparison_df.set_index('num_servers')[['avg_wait_time', 'avg_queue_length']])
-     st.line_chart(st.session_state.opt_comparison_df.set_index('num_servers')[['avg_server_utilization']])
+         "avg_server_utilization_ci": "± {:.2f}",
+         "avg_total_served": "{:.1f}",
+         "avg_wait_time_vrf": "{:.2f}x"
+     }
+     # Confidence interval columns (half-widths) sit next to their means; analytic rows have none
+     comparison_df = st.session_state.opt_comparison_df
+     comparison_df = comparison_df[[col for col in ["num_servers", "avg_wait_time", "avg_wait_time_ci", "avg_queue_length",
+                                                    "avg_queue_length_ci", "avg_server_utilization", "avg_server_utilization_ci",
+                                                    "avg_total_served", "replications", "avg_wait_time_vrf"]
+                                    if col in comparison_df.columns]]
+     st.dataframe(comparison_df.style.format({col: fmt for col, fmt in comparison_formats.items() if col in comparison_df.columns}))
+
+     # Plot comparison (unstable configurations have infinite analytic wait times, which charts cannot show)
+     chart_df = st.session_state.opt_comparison_df.set_index('num_servers').replace([np.inf, -np.inf], np.nan)
+     st.line_chart(chart_df[['avg_wait_time', 'avg_queue_length']])
+     st.line_chart(chart_df[['avg_server_utilization']])
+
+     windows_df = st.session_state.opt_windows_df
+     if windows_df is not None:
+         st.subheader("Metrics per Time Window")
+         window_metric = st.selectbox("Window Metric", ["avg_wait_time", "avg_queue_length", "avg_server_utilization", "arrivals"],
+                                      key="window_metric")
+         # One line per number of servers over the windows
+         st.line_chart(windows_df.pivot(index="window_start", columns="num_servers", values=window_metric)
+                       .replace([np.inf, -np.inf], np.nan))
+         st.dataframe(windows_df)
+         st.download_button("Download Window Metrics (CSV)", windows_df.to_csv(index=False), file_name="window_metrics.csv")
+
+
+if st.session_state.sweep_df is not None and not st.session_state.sweep_df.empty:
+    st.subheader("Parameter Sweep")
+    sweep_df = st.session_state.sweep_df
+    x_param, y_param = sweep_df.columns[0], sweep_df.columns[1] # Arrival and service axes, as the points were built
+    sweep_metric = st.selectbox("Metric", ["avg_wait_time", "avg_queue_length", "avg_server_utilization", "total_served"], key="sweep_metric")
+    if st.session_state.sweep_df_design == "Grid": # One heatmap per number of servers
+        sweep_servers = st.select_slider("Number of Servers", options=sorted(sweep_df["num_servers"].unique()), key="sweep_servers")
+        grid = sweep_df[sweep_df["num_servers"] == sweep_servers].pivot(index=y_param, columns=x_param, values=sweep_metric)
+        if px is not None:
+            st.plotly_chart(px.imshow(grid, origin="lower", aspect="auto", labels={"color": sweep_metric}))
+        else:
+            st.dataframe(grid)
+    elif px is not None:
+        st.plotly_chart(px.scatter(sweep_df, x=x_param, y=y_param, color=sweep_metric, hover_data=["num_servers"]))
+    st.dataframe(sweep_df)
+    st.download_button("Download Sweep Results (CSV)", sweep_df.to_csv(index=False), file_name="sweep_results.csv")
 
 
 # --- Footer ---
@@ -1,92 +1,351 @@
 # optimization.py
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+import math
 import numpy as np
 import pandas as pd
 from simulation_core import run_simulation, SimulationData
-from reporting import calculate_summary_stats
-import streamlit as st # For progress updates
+from reporting import summarize_run, ReplicationPool, REPLICATION_METRICS
+from queueing_theory import analytic_metrics, is_markovian
+from result_cache import cache_key
+from steady_state import steady_state_summary
+from batched import can_batch, run_batched_replications
+from variance_reduction import VarianceReducedPool, antithetic_pair, control_means
+from windows import window_metrics
 
-def optimize_servers(base_params: dict, objective: str, constraints: dict,
-                     min_servers: int, max_servers: int, num_replications: int) -> tuple:
+# Replications per batched task: big enough for lockstep runs to pay off, small enough to spread over workers
+BATCH_REPLICATIONS = 256
+
+def _ignore(*args):
+    """Default progress/message callback: report nothing."""
+
+def replication_seeds(entropy, n_servers, num_replications: int) -> list:
+    """Integer seeds for the replications of one server count, spawned with numpy's SeedSequence.
+
+    Children are keyed by (n_servers, replication) under the base entropy, so a seed never depends on
+    the sweep range, on the order runs finish in, or on how many workers run them. n_servers=None gives
+    the common-random-numbers seeds (keyed by replication only) shared by every server count.
     """
-    Performs optimization by simulating different numbers of servers.
-    V1: Simple iterative search over the number of servers.
+    spawn_key = () if n_servers is None else (n_servers,)
+    parent = np.random.SeedSequence(entropy, spawn_key=spawn_key)
+    return [int(child.generate_state(1, dtype=np.uint64)[0]) for child in parent.spawn(num_replications)]
+
+def run_replication_summary(params: dict) -> dict:
+    """Runs one replication and returns only its scalar summary (cheap to send back from a worker).
+
+    With params["window_length"] (and optionally "window_period"), the summary also holds per-window
+    metrics under "windows".
     """
-    results_list = []
-    base_seed = base_params.get("seed", None)
-
-    st.write(f"Optimizing number of servers from {min_servers} to {max_servers} ({num_replications} replications each)...")
-    progress_bar = st.progress(0)
-    total_runs = (max_servers - min_servers + 1) * num_replications
-
-    current_run = 0
-    for n_servers in range(min_servers, max_servers + 1):
-        replication_results = []
-        rep_wait_times = []
-        rep_queue_lengths = []
-        rep_utilizations = []
-        rep_served = []
-
-        current_params = base_params.copy()
-        current_params["num_servers"] = n_servers
-
-        for i in range(num_replications):
-            # Generate a unique, deterministic seed for each replication
-            if base_seed is not None:
-                current_params["seed"] = base_seed + n_servers * num_replications + i
+    if params.get("window_length"):
+        params = {**params, "statistics": "full"} # Window metrics need the per-customer times
+    sim_data = run_simulation(params)
+
+    # Determine actual sim duration (needed for reporting)
+    if params["stop_condition_type"] == "Simulation Time":
+        sim_duration = params["stop_condition_value"]
+    else: # Number of customers - use the time the last event occurred
+        sim_duration = sim_data.last_event_time
+
+    # Scalars only: no chart DataFrames are built for replications
+    if params.get("warmup") == "mser": # Steady-state estimates: drop the MSER-5 warm-up first
+        stats = steady_state_summary(sim_data, sim_duration, params["num_servers"])
+    else:
+        stats = summarize_run(sim_data, sim_duration, params["num_servers"])
+    # The input means ride along for control variates
+    summary = {**{key: stats[key] for key in REPLICATION_METRICS}, **sim_data.input_means}
+    if params.get("window_length"):
+        summary["windows"] = window_metrics(sim_data, params["window_length"], sim_duration, params.get("window_period"))
+    return summary
+
+def _summary_namespace(params: dict, batched: bool) -> str:
+    return "batched_replication_summary" if batched and can_batch(params) else "replication_summary"
+
+def _batch_groups(jobs: dict) -> list:
+    """Splits {key: params} into [(params, keys)] groups that differ only by seed, BATCH_REPLICATIONS keys at most."""
+    groups = {}
+    for key, params in jobs.items():
+        config = cache_key("batch", {name: value for name, value in params.items() if name != "seed"})
+        groups.setdefault(config, (params, []))[1].append(key)
+    return [(params, keys[begin:begin + BATCH_REPLICATIONS]) for params, keys in groups.values()
+            for begin in range(0, len(keys), BATCH_REPLICATIONS)]
+
+def run_replications(jobs: dict, executor=None, on_done=_ignore, cache=None, on_result=_ignore, batched: bool = False) -> dict:
+    """Runs {key: params} replications, on the executor if given, calling on_done() after each one.
+
+    Jobs are submitted in the dict's order. on_result(key, summary) sees each summary as it arrives.
+    With a ResultCache, replications already cached are taken from it and new ones are stored in it.
+    batched=True runs the replications of each configuration that qualifies (see batched.can_batch)
+    together with run_batched_replications, BATCH_REPLICATIONS per task and ahead of the other jobs;
+    their summaries are cached apart from one-by-one runs, which they match only up to rounding.
+    """
+    summaries = {}
+    if cache is not None:
+        for key, params in jobs.items():
+            cached = cache.get(cache_key(_summary_namespace(params, batched), params))
+            if cached is not None:
+                summaries[key] = cached
+                on_result(key, cached)
+                on_done()
+        jobs = {key: params for key, params in jobs.items() if key not in summaries}
+
+    def store(key, summary):
+        summaries[key] = summary
+        if cache is not None:
+            cache.put(cache_key(_summary_namespace(jobs[key], batched), jobs[key]), summary)
+        on_result(key, summary)
+        on_done()
+
+    groups = _batch_groups({key: params for key, params in jobs.items() if can_batch(params)}) if batched else []
+    singles = {key: params for key, params in jobs.items() if not (batched and can_batch(params))}
+    if executor is not None:
+        batch_futures = {executor.submit(run_batched_replications, params, [jobs[key]["seed"] for key in keys]): keys
+                         for params, keys in groups}
+        futures = {executor.submit(run_replication_summary, params): key for key, params in singles.items()}
+        for future in as_completed([*batch_futures, *futures]):
+            if future in batch_futures:
+                for key, summary in zip(batch_futures[future], future.result()):
+                    store(key, summary)
             else:
-                 current_params["seed"] = None # Or generate a new random seed if base is None
+                store(futures[future], future.result())
+    else:
+        for params, keys in groups:
+            for key, summary in zip(keys, run_batched_replications(params, [jobs[key]["seed"] for key in keys])):
+                store(key, summary)
+        for key, params in singles.items():
+            store(key, run_replication_summary(params))
+    return summaries
 
-            sim_data = run_simulation(current_params)
+def _antithetic_jobs(jobs: dict) -> dict:
+    """Each {key: params} job as a U run (key, 0) and a 1 - U run (key, 1) on the same seed."""
+    return {(key, member): {**params, "antithetic": member} for key, params in jobs.items() for member in (0, 1)}
 
-            # Determine actual sim duration (needed for reporting)
-            if current_params["stop_condition_type"] == "Simulation Time":
-                sim_duration = current_params["stop_condition_value"]
-            else: # Number of customers - use the time the last event occurred
-                sim_duration = sim_data.last_event_time
+def _pair_summaries(summaries: dict) -> dict:
+    """{(key, member): summary} from _antithetic_jobs -> {key: antithetic pair}."""
+    return {key: antithetic_pair(summaries[(key, 0)], summaries[(key, 1)]) for key, member in summaries if member == 0}
 
-            stats = calculate_summary_stats(sim_data, sim_duration, n_servers)
-            replication_results.append(stats)
+def _variance_reduced_pool(params: dict, antithetic: bool, control_variates: bool):
+    """Pool factory for _replicate_to_precision: plain pools unless a variance reduction is on."""
+    if not (antithetic or control_variates):
+        return ReplicationPool
+    try:
+        means = control_means(params) if control_variates else None
+    except (ValueError, KeyError, ZeroDivisionError):
+        means = None # No known input means (trace replay, time-varying rates): antithetic pairs only
+    return lambda: VarianceReducedPool(means)
 
-            # Update progress
-            current_run += 1
-            progress_bar.progress(current_run / total_runs)
+# Metrics whose confidence interval half-widths are reported in the comparison rows
+CI_METRICS = ("avg_wait_time", "avg_queue_length", "avg_server_utilization")
 
+def _summarize_configuration(n_servers: int, pool: ReplicationPool, confidence: float = 0.95) -> dict:
+    """Turns a configuration's pooled replications into one comparison row (with "<metric>_ci" half-widths)."""
+    row = {
+        "num_servers": n_servers,
+        "avg_wait_time": pool.mean("avg_wait_time"),
+        "avg_queue_length": pool.mean("avg_queue_length"),
+        "avg_server_utilization": pool.mean("avg_server_utilization"),
+        "avg_total_served": pool.mean("total_served") if pool.count else 0.0, # Throughput proxy
+        "replications": pool.count,
+    }
+    for key in CI_METRICS:
+        row[f"{key}_ci"] = pool.half_width(key, confidence)
+    if isinstance(pool, VarianceReducedPool):
+        row["avg_wait_time_vrf"] = pool.variance_reduction_factor("avg_wait_time")
+    if pool.window_stats:
+        row["windows"] = pool.window_table(confidence) # Taken out again before the rows become a DataFrame
+    return row
 
-        # Average results across replications for this n_servers
-        avg_wait = np.mean([res.get("avg_wait_time", float('inf')) for res in replication_results])
-        avg_q_len = np.mean([res.get("avg_queue_length", float('inf')) for res in replication_results])
-        avg_util = np.mean([res.get("avg_server_utilization", float('inf')) for res in replication_results])
-        avg_served = np.mean([res.get("total_served", 0) for res in replication_results]) # Throughput proxy
+# --- Precision-targeted replication ---
+def meets_precision(pool: ReplicationPool, precision: dict, confidence: float) -> bool:
+    """True when every {metric: (half_width, relative)} target is met by the pool's Student-t interval.
 
-        results_list.append({
-            "num_servers": n_servers,
-            "avg_wait_time": avg_wait,
-            "avg_queue_length": avg_q_len,
-            "avg_server_utilization": avg_util,
-            "avg_total_served": avg_served
-        })
+    relative=True reads half_width as a fraction of the metric's mean, otherwise in the metric's units.
+    """
+    for key, (target, relative) in precision.items():
+        limit = target * abs(pool.mean(key)) if relative else target
+        if pool.half_width(key, confidence) > limit:
+            return False
+    return True
 
-    progress_bar.empty() # Remove progress bar
+def _replications_needed(pool: ReplicationPool, precision: dict, confidence: float) -> int:
+    """Total replications the current variance estimates call for (half-width shrinks like 1/sqrt(n))."""
+    needed = pool.count + 1
+    for key, (target, relative) in precision.items():
+        limit = target * abs(pool.mean(key)) if relative else target
+        half_width = pool.half_width(key, confidence)
+        if half_width > limit:
+            needed = max(needed, math.inf if limit <= 0 else math.ceil(pool.count * (half_width / limit) ** 2))
+    return needed
 
-    # --- AI Decision Logic ---
-    # Filter results based on constraints
-    valid_results = []
-    for res in results_list:
-        passes_constraints = True
-        if "max_avg_wait_time" in constraints and res["avg_wait_time"] > constraints["max_avg_wait_time"]:
-            passes_constraints = False
-        if "max_avg_queue_length" in constraints and res["avg_queue_length"] > constraints["max_avg_queue_length"]:
-            passes_constraints = False
-        if "max_avg_utilization" in constraints and res["avg_server_utilization"] > constraints["max_avg_utilization"]:
-             passes_constraints = False
-        # Add more constraint checks here if needed (e.g., min throughput)
-
-        if passes_constraints:
-            valid_results.append(res)
+def _replicate_to_precision(configs: list, run_batch, n0: int, max_replications: int, precision: dict,
+                            confidence: float, new_pool=ReplicationPool) -> dict:
+    """Replicates every configuration n0 times, then in batches until its precision targets are met.
+
+    run_batch({config: replication indices}) returns {(config, index): summary}. Each round sizes a
+    configuration's batch from its current variance, and all batches of a round run together. Stops
+    at max_replications per configuration. Returns {config: new_pool()} pooled in replication order.
+    """
+    pools = {config: new_pool() for config in configs}
+    requests = {config: range(n0) for config in configs}
+    while requests:
+        summaries = run_batch(requests)
+        for config, indices in requests.items():
+            for i in indices:
+                pools[config].add(summaries[(config, i)])
+        requests = {}
+        for config, pool in pools.items():
+            if pool.count >= max_replications or meets_precision(pool, precision, confidence):
+                continue
+            target_count = min(max_replications, _replications_needed(pool, precision, confidence))
+            requests[config] = range(pool.count, target_count)
+    return pools
+
+def replicate_to_precision(params: dict, precision: dict, confidence: float = 0.95, min_replications: int = 5,
+                           max_replications: int = 50, max_workers: int = 1, executor=None, cache=None,
+                           on_progress=_ignore, batched: bool = False, antithetic: bool = False,
+                           control_variates: bool = False) -> ReplicationPool:
+    """Replicates one configuration until the Student-t intervals meet the precision targets.
+
+    Seeds are the optimizer's (base seed, server count) seeds, so its replications share cache entries.
+    batched=True runs each round's replications in lockstep (see run_replications). With antithetic
+    or control_variates the result is a VarianceReducedPool, as in optimize_servers.
+    """
+    entropy = np.random.SeedSequence(params.get("seed", None)).entropy
+    if params.get("seed", None) is None:
+        cache = None
+    seeds = replication_seeds(entropy, params["num_servers"], max_replications)
+    completed_runs = 0
+    total_runs = max_replications * (2 if antithetic else 1)
+
+    def on_done():
+        nonlocal completed_runs
+        completed_runs += 1
+        on_progress(min(1.0, completed_runs / total_runs))
+
+    def run_batch(requests):
+        jobs = {(config, i): {**params, "seed": seeds[i]} for config, indices in requests.items() for i in indices}
+        if antithetic:
+            return _pair_summaries(run_replications(_antithetic_jobs(jobs), executor, on_done, cache, batched=batched))
+        return run_replications(jobs, executor, on_done, cache, batched=batched)
+
+    if executor is not None:
+        pool_context = nullcontext(executor)
+    else:
+        pool_context = ProcessPoolExecutor(max_workers=max_workers) if max_workers is None or max_workers > 1 else nullcontext()
+    with pool_context as executor:
+        pools = _replicate_to_precision([params["num_servers"]], run_batch, max(2, min_replications),
+                                        max_replications, precision, confidence,
+                                        _variance_reduced_pool(params, antithetic, control_variates))
+    on_progress(1.0)
+    return pools[params["num_servers"]]
+
+def _passes_constraints(res: dict, constraints: dict) -> bool:
+    """Checks an averaged comparison row against the user's constraints."""
+    if "max_avg_wait_time" in constraints and res["avg_wait_time"] > constraints["max_avg_wait_time"]:
+        return False
+    if "max_avg_queue_length" in constraints and res["avg_queue_length"] > constraints["max_avg_queue_length"]:
+        return False
+    if "max_avg_utilization" in constraints and res["avg_server_utilization"] > constraints["max_avg_utilization"]:
+        return False
+    # Add more constraint checks here if needed (e.g., min throughput)
+    return True
+
+# --- Sequential ranking and selection (Kim & Nelson's KN procedure) ---
+# The quantity KN minimizes for each objective: (summary key, sign); None means no single metric to rank on
+SELECTION_METRICS = {
+    "Minimize Average Waiting Time": ("avg_wait_time", 1.0),
+    "Maximize Throughput (Avg Total Served)": ("total_served", -1.0),
+}
+
+def kn_eta(confidence: float, num_systems: int, n0: int) -> float:
+    """KN constant eta for k systems, n0 first-stage replications and probability of correct selection."""
+    alpha = 1.0 - confidence
+    return 0.5 * ((2.0 * alpha / (num_systems - 1)) ** (-2.0 / (n0 - 1)) - 1.0)
+
+def _kn_select(candidates: list, run_stage, metric: tuple, constraints: dict, n0: int, max_replications: int,
+               confidence: float, indifference_zone: float) -> tuple:
+    """Runs KN with one replication per surviving candidate per stage.
+
+    run_stage(candidates, r) returns {n_servers: summary} for replication index r. Candidates whose
+    running means break a constraint are screened out before each elimination round, and KN (eta
+    included) runs among the feasible ones only. Returns (pools by candidate, survivors).
+    """
+    key, sign = metric
+    pools = {n: ReplicationPool() for n in candidates}
+    first_stage = {n: [] for n in candidates}
+    for r in range(n0):
+        stage = run_stage(candidates, r)
+        for n in candidates:
+            pools[n].add(stage[n])
+            first_stage[n].append(sign * stage[n][key])
 
+    def screen(systems: list) -> list:
+        return [n for n in systems if _passes_constraints(_summarize_configuration(n, pools[n]), constraints)]
+
+    # Only candidates passing the constraint screen are compared, so an infeasible one never eliminates a feasible one
+    survivors = screen(candidates)
+    if len(survivors) <= 1:
+        return pools, survivors
+    values = {n: np.array(first_stage[n]) for n in survivors}
+    h2 = 2.0 * kn_eta(confidence, len(survivors), n0) * (n0 - 1)
+    # Variances of pairwise differences from the first stage; CRN makes these small for neighbouring counts
+    diff_var = {(i, l): np.var(values[i] - values[l], ddof=1) for i in survivors for l in survivors if i != l}
+
+    r = n0
+    while True:
+        means = {n: sign * pools[n].mean(key) for n in survivors}
+        remaining = []
+        for i in survivors:
+            beaten = False
+            for l in survivors:
+                if l == i:
+                    continue
+                w = max(0.0, indifference_zone / (2.0 * r) * (h2 * diff_var[(i, l)] / indifference_zone ** 2 - r))
+                if means[i] > means[l] + w:
+                    beaten = True
+                    break
+            if not beaten:
+                remaining.append(i)
+        survivors = remaining
+        if len(survivors) <= 1 or r >= max_replications:
+            break
+        stage = run_stage(survivors, r)
+        for n in survivors:
+            pools[n].add(stage[n])
+        r += 1
+        survivors = screen(survivors) # Running means move, so the screen is applied again
+    return pools, survivors
+
+def smallest_feasible(low: int, high: int, feasible):
+    """Smallest n in [low, high] with feasible(n), assuming feasibility is monotone in n; None if none is.
+
+    Gallops upward from low (low+1, low+2, low+4, ...) until a feasible count is found, then bisects the
+    last gap, so only O(log(high - low)) counts are evaluated.
+    """
+    if feasible(low):
+        return low
+    last_infeasible, step = low, 1
+    while True:
+        probe = min(low + step, high)
+        if feasible(probe):
+            break
+        if probe == high:
+            return None
+        last_infeasible, step = probe, step * 2
+    first_feasible = probe
+    while first_feasible - last_infeasible > 1:
+        mid = (last_infeasible + first_feasible) // 2
+        if feasible(mid):
+            first_feasible = mid
+        else:
+            last_infeasible = mid
+    return first_feasible
+
+def select_best(results: list, objective: str, constraints: dict):
+    """Applies the constraints and the objective to comparison rows; returns the best row or None."""
+    # Filter results based on constraints
+    valid_results = [res for res in results if _passes_constraints(res, constraints)]
     if not valid_results:
-        st.warning("No configuration met the specified constraints.")
-        return None, pd.DataFrame(results_list)
+        return None
 
     # Select best based on objective
     best_result = None
@@ -102,11 +361,291 @@ def optimize_servers(base_params: dict, objective: str, constraints: dict,
     elif objective == "Maximize Throughput (Avg Total Served)":
          best_result = max(valid_results, key=lambda x: x["avg_total_served"])
     # Add other objectives like minimizing queue length...
+    return best_result
+
+def _widen_bracket(best, low: int, high: int, full_range: tuple, step: int) -> tuple:
+    """(low, high) widened by step towards each edge the best row sits on, upwards if none is feasible,
+    within full_range; unchanged when the best configuration is inside the bracket."""
+    step = max(step, 1)
+    if best is None or best["num_servers"] == high:
+        high = min(full_range[1], high + step)
+    if best is not None and best["num_servers"] == low:
+        low = max(full_range[0], low - step)
+    return low, high
+
+def analytic_configuration(base_params: dict, n_servers: int) -> dict:
+    """Comparison row from queueing formulas instead of simulation (replications = 0)."""
+    metrics = analytic_metrics(base_params, n_servers)
+    if base_params["stop_condition_type"] == "Simulation Time":
+        served = metrics["throughput"] * base_params["stop_condition_value"]
+    else:
+        served = base_params["stop_condition_value"]
+    return {
+        "num_servers": n_servers,
+        "avg_wait_time": metrics["avg_wait_time"],
+        "avg_queue_length": metrics["avg_queue_length"],
+        "avg_server_utilization": metrics["avg_server_utilization"],
+        "avg_total_served": served,
+        "replications": 0,
+    }
+
+def optimize_servers(base_params: dict, objective: str, constraints: dict,
+                     min_servers: int, max_servers: int, num_replications: int,
+                     max_workers: int = 1, selection: str = "exhaustive", common_random_numbers: bool = False,
+                     confidence: float = 0.95, indifference_zone: float = 0.1, max_replications: int = 50,
+                     analytic: bool = False, bracket_margin: int = 1, search: str = "linear", cache=None,
+                     executor=None, on_message=_ignore, on_progress=_ignore, precision: dict = None,
+                     batched: bool = False, antithetic: bool = False, control_variates: bool = False,
+                     window_length: float = None, window_period: float = None, on_windows=_ignore) -> tuple:
+    """
+    Performs optimization by simulating different numbers of servers.
+    V1: Simple iterative search over the number of servers.
+    The (server count x replication) grid runs on a process pool when max_workers > 1.
+    selection="kn" runs the KN sequential procedure with common random numbers instead: num_replications
+    first-stage runs per server count, then one more per surviving count until a single best remains
+    (at the given confidence and indifference zone) or max_replications is reached.
+    With analytic=True, M/M/c requests are answered from the Erlang C formulas without simulating
+    (replications, seeds and search are then not used), and other distributions first simulate the
+    Allen-Cunneen answer +/- bracket_margin servers; while the best configuration is on an edge of that
+    bracket, or none is feasible, the bracket widens by bracket_margin within min_servers..max_servers.
+    search="bisection" relies on wait, queue length and utilization being non-increasing in the number of
+    servers: "Minimize Number of Servers" gallops and bisects to the smallest feasible count, and the other
+    objectives only need max_servers. The comparison then lists just the evaluated counts.
+    With a ResultCache, each (server count, replication) result is looked up before it is simulated; as
+    seeds do not depend on the range, widening max_servers only simulates the new server counts.
+    With precision ({metric: (half_width, relative)}, see meets_precision), the sweep and bisection start
+    each configuration with num_replications (at least 2) and add replications in parallel batches until
+    its confidence intervals meet the targets or it has max_replications.
+    batched=True simulates the replications of a server count together as arrays (batched.py) when its
+    distributions allow, so hundreds of replications cost about as much Python work as one.
+    antithetic=True makes every replication a pair of runs on one seed, drawing by inverse CDF from U and
+    1 - U, and pools the pair averages. control_variates=True adjusts the wait, queue length and utilization
+    estimates by regression on each run's mean interarrival and service time, whose expectations are known.
+    Both apply to the sweep and bisection; rows then report the achieved wait-time variance reduction
+    factor ("avg_wait_time_vrf").
+    With window_length, every replication also reports its metrics per time window (windows.py), e.g. per
+    shift under a time-varying arrival rate; with window_period the windows repeat every period and pool
+    their occurrences (shifts of the day over a week-long run). on_windows(DataFrame) then receives them,
+    one row per server count and window, and the fewest servers meeting the constraints in each window
+    are reported. The Erlang C shortcut is skipped, as it has no windows.
+    Nothing here depends on a UI: on_message(level, text) receives status text (level is "write", "info",
+    "success", "warning" or "error") and on_progress(fraction) the share of runs done. Pass a shared
+    executor to run on an existing process pool instead of starting one.
+    """
+    # Resolve the base entropy once so an unseeded run still uses one consistent seed tree
+    entropy = np.random.SeedSequence(base_params.get("seed", None)).entropy
+    if base_params.get("seed", None) is None:
+        cache = None # Fresh entropy every time: nothing would ever be looked up again
+    candidates = list(range(min_servers, max_servers + 1))
+    if window_length:
+        base_params = {**base_params, "window_length": window_length}
+        if window_period:
+            base_params["window_period"] = window_period
+
+    full_range = (min_servers, max_servers)
+    if analytic:
+        try:
+            analytic_rows = [analytic_configuration(base_params, n) for n in candidates]
+        except (ValueError, KeyError, ZeroDivisionError):
+            analytic_rows = None # Distribution without closed-form moments: simulate the full range
+        if analytic_rows and is_markovian(base_params) and not window_length:
+            on_message("info", "Poisson arrivals with exponential service: metrics come from the Erlang C formulas (steady state), no simulation needed.")
+            return _report_selection(select_best(analytic_rows, objective, constraints), analytic_rows, constraints,
+                                     on_message=on_message)
+        approx_best = select_best(analytic_rows, objective, constraints) if analytic_rows else None
+        if approx_best is not None:
+            low = max(min_servers, approx_best["num_servers"] - bracket_margin)
+            high = min(max_servers, approx_best["num_servers"] + bracket_margin)
+            if (low, high) != (min_servers, max_servers):
+                on_message("info", f"Allen-Cunneen approximation suggests {approx_best['num_servers']} servers; "
+                                   f"simulating {low} to {high} instead of {min_servers} to {max_servers}.")
+                min_servers, max_servers = low, high
+                candidates = list(range(min_servers, max_servers + 1))
+    metric = SELECTION_METRICS.get(objective)
+    if search == "bisection" and selection == "kn":
+        on_message("info", "Bisection search evaluates a fixed number of replications per configuration; sequential selection is not used.")
+        selection = "exhaustive"
+    if selection == "kn" and (metric is None or len(candidates) < 2 or num_replications < 2):
+        on_message("info", "Sequential selection needs a waiting-time or throughput objective, at least two server counts "
+                           "and two first-stage replications; running the exhaustive sweep instead.")
+        selection = "exhaustive"
+    if selection == "kn" and (indifference_zone <= 0 or not 0 < confidence < 1):
+        raise ValueError("Sequential selection needs a positive indifference zone and a confidence between 0 and 1.")
+    common_random_numbers = common_random_numbers or selection == "kn"
+
+    if precision and selection == "kn":
+        on_message("info", "Sequential selection decides its own replication counts; the precision targets are not used.")
+        precision = None
+    if (antithetic or control_variates) and selection == "kn":
+        on_message("info", "Sequential selection compares plain replications; antithetic and control variates are not used.")
+        antithetic = control_variates = False
+    if control_variates:
+        try:
+            control_means(base_params)
+        except (ValueError, KeyError, ZeroDivisionError):
+            on_message("info", "The input distributions have no known means (trace replay or time-varying rates); control variates are not used.")
+            control_variates = False
+    if precision:
+        n0, reps_per_config = max(2, num_replications), max(max_replications, num_replications, 2)
+        reps_text = f"{n0} to {reps_per_config} replications each, until the confidence intervals meet the targets"
+    else:
+        n0 = reps_per_config = num_replications
+        reps_text = f"{num_replications} replications each"
+    if antithetic:
+        reps_text += ", each an antithetic pair of runs"
+    new_pool = _variance_reduced_pool(base_params, antithetic, control_variates)
+
+    seeds = {}
+    def seeds_for(n_servers, count):
+        return replication_seeds(entropy, None if common_random_numbers else n_servers, count)
+
+    def run_batch(requests):
+        """Runs {n_servers: replication indices}; replication i of a count always gets the same seed."""
+        jobs = {}
+        for n_servers, indices in requests.items():
+            if n_servers not in seeds:
+                seeds[n_servers] = seeds_for(n_servers, reps_per_config)
+            for i in indices:
+                jobs[(n_servers, i)] = {**base_params, "num_servers": n_servers, "seed": seeds[n_servers][i]}
+        if antithetic:
+            return _pair_summaries(run_replications(_antithetic_jobs(jobs), executor, on_done, cache, batched=batched))
+        return run_replications(jobs, executor, on_done, cache, batched=batched)
+
+    if search == "bisection":
+        on_message("write", f"Searching {min_servers} to {max_servers} servers by bisection ({reps_text})...")
+        total_runs = (2 * math.ceil(math.log2(len(candidates) + 1)) + 1) * reps_per_config # Upper bound
+    elif selection == "kn":
+        on_message("write", f"Sequential selection over {min_servers} to {max_servers} servers "
+                            f"({num_replications} first-stage replications, up to {max_replications} each, common random numbers)...")
+        total_runs = len(candidates) * max_replications
+    else:
+        on_message("write", f"Optimizing number of servers from {min_servers} to {max_servers} ({reps_text})...")
+        total_runs = len(candidates) * reps_per_config
+    if antithetic:
+        total_runs *= 2
+    on_progress(0.0)
+    completed_runs = 0
+
+    def on_done():
+        nonlocal completed_runs
+        completed_runs += 1
+        on_progress(min(1.0, completed_runs / total_runs))
+
+    if executor is not None:
+        pool_context = nullcontext(executor)
+    else:
+        pool_context = ProcessPoolExecutor(max_workers=max_workers) if max_workers is None or max_workers > 1 else nullcontext()
+    evaluated, pools = {}, {} # Kept across bracket widenings, so no configuration is simulated twice
+    with pool_context as executor:
+        while True:
+            if search == "bisection":
+                def evaluate(n_servers):
+                    if n_servers not in evaluated:
+                        pool = _replicate_to_precision([n_servers], run_batch, n0, reps_per_config, precision or {}, confidence,
+                                                       new_pool)[n_servers]
+                        evaluated[n_servers] = _summarize_configuration(n_servers, pool, confidence)
+                    return evaluated[n_servers]
+
+                if objective == "Minimize Number of Servers":
+                    smallest_feasible(min_servers, max_servers, lambda n: _passes_constraints(evaluate(n), constraints))
+                else:
+                    # Waiting time falls and throughput rises with more servers, and the constraints only get easier
+                    evaluate(max_servers)
+                results_list = [evaluated[n] for n in sorted(evaluated)]
+                contenders = results_list
+                on_message("info", f"Bisection evaluated {len(evaluated)} of {len(candidates)} configurations.")
+            elif selection == "kn":
+                crn_seeds = seeds_for(None, max_replications)
+
+                def run_stage(stage_candidates, r):
+                    jobs = {n: {**base_params, "num_servers": n, "seed": crn_seeds[r]} for n in stage_candidates}
+                    return run_replications(jobs, executor, on_done, cache)
+
+                pools, survivors = _kn_select(candidates, run_stage, metric, constraints, num_replications,
+                                              max_replications, confidence, indifference_zone)
+                results_list = [_summarize_configuration(n, pools[n], confidence) for n in candidates]
+                contenders = [res for res in results_list if res["num_servers"] in survivors]
+                exhaustive_runs = len(candidates) * max(res["replications"] for res in results_list)
+                on_message("info", f"Sequential selection used {completed_runs} simulations; an exhaustive sweep giving every "
+                                   f"configuration the same {exhaustive_runs // len(candidates)} replications needs {exhaustive_runs} "
+                                   f"(saved {exhaustive_runs - completed_runs}).")
+            else:
+                # Pools are filled in replication order, so results do not depend on completion order
+                pools.update(_replicate_to_precision([n for n in candidates if n not in pools], run_batch, n0, reps_per_config,
+                                                     precision or {}, confidence, new_pool))
+                results_list = [_summarize_configuration(n, pools[n], confidence) for n in candidates]
+                contenders = results_list
+            if (min_servers, max_servers) == full_range:
+                break
+            best = select_best(contenders, objective, constraints)
+            low, high = _widen_bracket(best, min_servers, max_servers, full_range, bracket_margin)
+            if (low, high) == (min_servers, max_servers):
+                break
+            on_message("info", f"The best configuration is on an edge of the simulated range ({min_servers} to {max_servers}) "
+                               f"or none meets the constraints; widening it to {low} to {high}.")
+            min_servers, max_servers = low, high
+            candidates = list(range(min_servers, max_servers + 1))
+
+    on_progress(1.0)
+    if antithetic or control_variates:
+        _report_variance_reduction(results_list, antithetic, on_message)
+
+    window_tables = {res["num_servers"]: res.pop("windows") for res in results_list if "windows" in res}
+
+    # --- AI Decision Logic ---
+    best_result, comparison_df = _report_selection(select_best(contenders, objective, constraints), results_list,
+                                                   constraints, contenders, on_message)
+    if window_tables:
+        windows_df = pd.concat([table.assign(num_servers=n) for n, table in window_tables.items()], ignore_index=True)
+        on_windows(windows_df)
+        if constraints:
+            _report_window_staffing(windows_df, constraints, window_length, window_period, on_message)
+    return best_result, comparison_df
+
+def window_staffing(windows_df: pd.DataFrame, constraints: dict) -> pd.Series:
+    """Fewest evaluated servers meeting the constraints in each window (indexed by window start; nan if none do)."""
+    passing = windows_df[[_passes_constraints(row, constraints) for row in windows_df.to_dict("records")]]
+    staffing = passing.groupby("window_start")["num_servers"].min()
+    return staffing.reindex(sorted(windows_df["window_start"].unique()))
+
+def _report_window_staffing(windows_df: pd.DataFrame, constraints: dict, window_length: float, window_period: float = None,
+                            on_message=_ignore):
+    """Reports window_staffing as time ranges, merging consecutive windows that need the same number of servers."""
+    staffing = window_staffing(windows_df, constraints)
+    spans = [] # [start, end, servers]
+    for start, servers in staffing.items():
+        servers = None if math.isnan(servers) else int(servers)
+        end = min(start + window_length, window_period) if window_period else start + window_length
+        if spans and spans[-1][2] == servers:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end, servers])
+    text = ", ".join(f"{start:g}-{end:g}: {servers if servers is not None else 'none evaluated'}"
+                     for start, end, servers in spans)
+    on_message("info", f"Fewest servers meeting the constraints per time window: {text}. Customers still waiting "
+                       "when a run ends count the wait so far, so late windows of understaffed runs read low.")
+
+def _report_variance_reduction(results_list: list, antithetic: bool, on_message=_ignore):
+    """Sums up the wait-time variance reduction factors as the plain runs they stand in for."""
+    runs_per_replication = 2 if antithetic else 1
+    rows = [res for res in results_list if math.isfinite(res.get("avg_wait_time_vrf", math.nan))]
+    if not rows:
+        return
+    runs = sum(res["replications"] * runs_per_replication for res in rows)
+    equivalent = sum(res["avg_wait_time_vrf"] * res["replications"] * runs_per_replication for res in rows)
+    factors = [res["avg_wait_time_vrf"] for res in rows]
+    on_message("info", f"Variance reduction factor for the average wait: {min(factors):.2f} to {max(factors):.2f} per "
+                       f"configuration. The {runs} runs were worth about {equivalent:.0f} plain runs.")
 
+def _report_selection(best_result, results_list: list, constraints: dict, contenders: list = None,
+                      on_message=_ignore) -> tuple:
+    """Reports the outcome through on_message and returns (best configuration or None, comparison DataFrame)."""
+    contenders = results_list if contenders is None else contenders
     if best_result:
-        st.success(f"Optimization complete. Recommended configuration found.")
+        on_message("success", f"Optimization complete. Recommended configuration found.")
         return best_result, pd.DataFrame(results_list) # Return best and all results for comparison
+    if not any(_passes_constraints(res, constraints) for res in contenders):
+        on_message("warning", "No configuration met the specified constraints.")
     else:
-        # This case should ideally be covered by the "No configuration met constraints" warning
-        st.error("Could not determine optimal configuration.")
-        return None, pd.DataFrame(results_list)
\ No newline at end of file
+        on_message("error", "Could not determine optimal configuration.")
+    return None, pd.DataFrame(results_list)
@@ -0,0 +1,101 @@
+# queueing_theory.py
+"""Closed-form steady-state metrics: Erlang C for M/M/c and the Allen-Cunneen approximation for G/G/c."""
+import math
+from fitting import FITTED_DISTRIBUTIONS
+from distributions import fitted_params, rate_profile
+
+def erlang_c(num_servers: int, offered_load: float) -> float:
+    """Probability that an arrival has to wait in an M/M/c queue (offered_load = arrival_rate / service_rate).
+
+    Uses the Erlang B recursion, which stays numerically stable for hundreds of servers.
+    """
+    if offered_load <= 0:
+        return 0.0
+    if offered_load >= num_servers:
+        return 1.0
+    erlang_b = 1.0
+    for k in range(1, num_servers + 1):
+        erlang_b = offered_load * erlang_b / (k + offered_load * erlang_b)
+    return num_servers * erlang_b / (num_servers - offered_load * (1.0 - erlang_b))
+
+def ggc_metrics(arrival_rate: float, mean_service_time: float, num_servers: int,
+                arrival_scv: float = 1.0, service_scv: float = 1.0) -> dict:
+    """Steady-state wait, queue length and utilization of a G/G/c queue.
+
+    The M/M/c (Erlang C) waiting time is scaled by (ca^2 + cs^2) / 2, the Allen-Cunneen approximation,
+    where ca^2 and cs^2 are the squared coefficients of variation of interarrival and service times;
+    with both equal to 1 the result is exact. Unstable systems get infinite wait and queue length.
+    """
+    if arrival_rate <= 0 or mean_service_time <= 0 or num_servers < 1:
+        raise ValueError("Arrival rate, mean service time and number of servers must be positive.")
+    offered_load = arrival_rate * mean_service_time
+    utilization = offered_load / num_servers
+    if utilization >= 1.0:
+        return {"avg_wait_time": math.inf, "avg_queue_length": math.inf, "avg_server_utilization": 100.0,
+                "prob_wait": 1.0, "throughput": num_servers / mean_service_time}
+
+    prob_wait = erlang_c(num_servers, offered_load)
+    wait = prob_wait * mean_service_time / (num_servers - offered_load) * (arrival_scv + service_scv) / 2.0
+    return {
+        "avg_wait_time": wait,
+        "avg_queue_length": arrival_rate * wait, # Little's law
+        "avg_server_utilization": utilization * 100,
+        "prob_wait": prob_wait,
+        "throughput": arrival_rate,
+    }
+
+def arrival_moments(dist_type: str, params: dict) -> tuple:
+    """(arrival rate, squared coefficient of variation) of an arrival distribution from distributions.py."""
+    if dist_type == "Exponential (Poisson Process)":
+        return params['arrival_rate'], 1.0
+    elif dist_type == "Constant Rate":
+        return params['arrival_rate'], 0.0
+    elif dist_type == "Fixed Interval":
+        return 1.0 / params['fixed_interval'], 0.0
+    elif dist_type in FITTED_DISTRIBUTIONS:
+        fit, scale = fitted_params(dist_type, params, "arrival")
+        return 1.0 / (fit["mean"] * scale), fit["scv"]
+    raise ValueError(f"No analytic moments for arrival distribution type: {dist_type}")
+
+def mean_arrival_rate(params: dict) -> float:
+    """Long-run arrivals per unit time of params' arrival process (also for time-varying rates, which have no
+    stationary moments for the formulas below)."""
+    if params["arrival_distribution"] == "Time-Varying Rate":
+        return rate_profile(params).mean_rate
+    arrival_rate, _ = arrival_moments(params["arrival_distribution"], params)
+    return arrival_rate
+
+def service_moments(dist_type: str, params: dict) -> tuple:
+    """(mean service time, squared coefficient of variation) of a service distribution from distributions.py.
+
+    For "Normal" the moments are those of the draws, which are clipped at zero.
+    """
+    if dist_type == "Exponential":
+        return 1.0 / params['service_rate'], 1.0
+    elif dist_type == "Constant":
+        return params['fixed_service_time'], 0.0
+    elif dist_type == "Normal":
+        mu, sigma = params['mean_service_time'], params['std_dev_service_time']
+        if sigma <= 0:
+            return mu, 0.0
+        # E[max(0, X)] = mu Phi(z) + sigma phi(z) and E[max(0, X)^2] = (mu^2 + sigma^2) Phi(z) + mu sigma phi(z), z = mu / sigma
+        z = mu / sigma
+        cdf, pdf = 0.5 * (1.0 + math.erf(z / math.sqrt(2.0))), math.exp(-z * z / 2.0) / math.sqrt(2.0 * math.pi)
+        mean = mu * cdf + sigma * pdf
+        second = (mu * mu + sigma * sigma) * cdf + mu * sigma * pdf
+        return mean, second / (mean * mean) - 1.0
+    elif dist_type in FITTED_DISTRIBUTIONS:
+        fit, scale = fitted_params(dist_type, params, "service")
+        return fit["mean"] * scale, fit["scv"]
+    raise ValueError(f"No analytic moments for service distribution type: {dist_type}")
+
+def is_markovian(params: dict) -> bool:
+    """True for Poisson arrivals with exponential service, where Erlang C is exact."""
+    return (params["arrival_distribution"] == "Exponential (Poisson Process)"
+            and params["service_distribution"] == "Exponential")
+
+def analytic_metrics(params: dict, num_servers: int) -> dict:
+    """Steady-state metrics for a run's params dict (exact for M/M/c, Allen-Cunneen otherwise)."""
+    arrival_rate, arrival_scv = arrival_moments(params["arrival_distribution"], params)
+    mean_service_time, service_scv = service_moments(params["service_distribution"], params)
+    return ggc_metrics(arrival_rate, mean_service_time, num_servers, arrival_scv, service_scv)
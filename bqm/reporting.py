@@ -1,14 +1,33 @@
 # reporting.py
+import io
+import math
 import statistics
 import numpy as np
 import pandas as pd
 from simulation_core import SimulationData
+from streaming_stats import RunningStats, student_t_quantile
+
+# Scalar metrics pooled across replications
+REPLICATION_METRICS = ("avg_wait_time", "avg_queue_length", "avg_server_utilization", "total_served")
+# Most points a chart series is drawn with; longer series are downsampled
+DEFAULT_CHART_POINTS = 2000
 
 def calculate_summary_stats(data: SimulationData, sim_duration: float, num_servers: int) -> dict:
     """Calculates summary statistics from simulation data (updated for individual server util)."""
+    results = summarize_run(data, sim_duration, num_servers)
+    results.update(build_chart_data(data, sim_duration))
+    return results
+
+def summarize_run(data: SimulationData, sim_duration: float, num_servers: int) -> dict:
+    """Scalar summary statistics only (no DataFrames), for replications and other batch use."""
     results = {}
 
-    if data.wait_times:
+    if data.streaming:
+        # Same keys from the O(1) accumulators (sample std dev, like statistics.stdev)
+        results["avg_wait_time"] = data.wait_stats.mean if data.wait_stats.count else 0.0
+        results["max_wait_time"] = data.wait_stats.max if data.wait_stats.count else 0.0
+        results["std_dev_wait_time"] = data.wait_stats.stdev
+    elif data.wait_times:
         results["avg_wait_time"] = statistics.mean(data.wait_times)
         results["max_wait_time"] = max(data.wait_times)
         results["std_dev_wait_time"] = statistics.stdev(data.wait_times) if len(data.wait_times) > 1 else 0.0
@@ -18,7 +37,11 @@ def calculate_summary_stats(data: SimulationData, sim_duration: float, num_serve
         results["std_dev_wait_time"] = 0.0
 
     # Calculate time-weighted average queue length (same as before)
-    total_time_x_length = sum(interval * length for interval, length in data.queue_lengths_over_time)
+    if data.streaming:
+        total_time_x_length = data.queue_area
+    else:
+        trajectory = data.queue_trajectory
+        total_time_x_length = float(np.dot(trajectory.intervals, trajectory.lengths))
     # Use the finalized simulation duration as total time
     total_recorded_time = sim_duration
     # Adjust slightly if last_event_time is negligibly different due to floating point
@@ -31,7 +54,10 @@ def calculate_summary_stats(data: SimulationData, sim_duration: float, num_serve
     else:
          results["avg_queue_length"] = 0.0
 
-    results["max_queue_length"] = max(length for _, length in data.queue_lengths_over_time) if data.queue_lengths_over_time else 0
+    if data.streaming:
+        results["max_queue_length"] = data.max_queue_length
+    else:
+        results["max_queue_length"] = int(data.queue_trajectory.lengths.max()) if len(data.queue_trajectory) else 0
 
     # --- Calculate average AND individual server utilization ---
     total_possible_server_time_per_server = sim_duration
@@ -59,30 +85,84 @@ def calculate_summary_stats(data: SimulationData, sim_duration: float, num_serve
     results["server_customer_counts"] = dict(data.server_customer_counts) # Convert defaultdict
 
     results["total_served"] = data.total_served_count
+    return results
+
+def downsample_steps(edges: np.ndarray, values: np.ndarray, max_points: int = DEFAULT_CHART_POINTS) -> tuple:
+    """(times, values) drawing the step function values[i] on [edges[i], edges[i+1]) with at most max_points + 1 points.
+
+    A short series gives every step's start and end point. A longer one is cut into equal time buckets
+    (about one per pixel) that each keep their first, lowest, highest and last step (M4 downsampling),
+    so every spike and dip stays visible; vectorized, O(n log n) in the number of steps.
+    """
+    starts = edges[:-1]
+    if 2 * len(values) <= max_points:
+        return np.column_stack([starts, edges[1:]]).ravel(), np.repeat(values, 2)
+    num_buckets = max(1, max_points // 4)
+    span = edges[-1] - edges[0]
+    if span > 0:
+        bucket = np.minimum(((starts - edges[0]) / span * num_buckets).astype(np.int64), num_buckets - 1)
+    else:
+        bucket = np.zeros(len(starts), dtype=np.int64)
+    first = np.flatnonzero(np.diff(bucket, prepend=-1)) # Each bucket's first step
+    last = np.append(first[1:], len(bucket)) - 1
+    by_value = np.lexsort((values, bucket)) # Steps bucket by bucket, lowest value first
+    keep = np.unique(np.concatenate([first, last, by_value[first], by_value[last]]))
+    return np.append(starts[keep], edges[-1]), np.append(values[keep], values[-1])
+
+def queue_trajectory_csv(trajectory) -> str:
+    """The full queue-length trajectory as CSV, one row per step (the time the length starts holding)."""
+    times = np.concatenate([[0.0], np.cumsum(trajectory.intervals)[:-1]])
+    return pd.DataFrame({"Time": times, "Queue Length": trajectory.lengths}).to_csv(index=False)
+
+def customer_log_parquet(log) -> bytes:
+    """A CustomerLog as Parquet file contents (needs pyarrow)."""
+    buffer = io.BytesIO()
+    log.write_parquet(buffer)
+    return buffer.getvalue()
+
+def build_chart_data(data: SimulationData, sim_duration: float, max_points: int = DEFAULT_CHART_POINTS) -> dict:
+    """Builds the chart DataFrames (queue_length_df, wait_time_hist_df, rollup_df) for the single-run view.
+
+    With time-bucket rollups (params["rollup_buckets"]) the queue length is charted as its average per
+    bucket, one point per bucket whatever the run length, and rollup_df holds the other per-bucket series.
+    Otherwise the queue-length steps are downsampled to at most max_points points; the full trajectory
+    is passed on as "queue_trajectory" (compact arrays, for queue_trajectory_csv) when it was kept, and the
+    run's CustomerLog (or None) as "customer_log".
+    """
+    results = {"rollup_df": None,
+               "queue_trajectory": data.queue_trajectory if not data.streaming and len(data.queue_trajectory) else None,
+               "customer_log": data.customer_log}
 
     # Plotting data generation (same as before)
     # Queue length over time
-    if data.queue_lengths_over_time:
-        plot_times = []
-        plot_lengths = []
-        current_time = 0
-        for interval, length in data.queue_lengths_over_time:
-            plot_times.extend([current_time, current_time + interval])
-            plot_lengths.extend([length, length])
-            current_time += interval
-        queue_df = pd.DataFrame({'Time': plot_times, 'Queue Length': plot_lengths}).set_index('Time')
+    if data.rollups is not None:
+        rollup_df = data.rollups.frame(sim_duration)
+        results["rollup_df"] = rollup_df
+        results["rollup_width"] = data.rollups.width
+        results["queue_length_df"] = rollup_df[["Avg Queue Length"]].rename(columns={"Avg Queue Length": "Queue Length"})
+    elif data.streaming:
+        # The trajectory is not kept in streaming mode
+        results["queue_length_df"] = pd.DataFrame({'Queue Length': []}, index=pd.Index([], name='Time'))
+    elif len(data.queue_trajectory):
+        edges = np.concatenate([[0.0], np.cumsum(data.queue_trajectory.intervals)])
+        lengths = data.queue_trajectory.lengths
         # Ensure the chart extends to the full sim_duration
-        if not queue_df.empty and queue_df.index[-1] < sim_duration:
-             last_len = queue_df['Queue Length'].iloc[-1]
-             extra_row = pd.DataFrame({'Queue Length': [last_len]}, index=[sim_duration])
-             queue_df = pd.concat([queue_df, extra_row])
-        results["queue_length_df"] = queue_df
+        if edges[-1] < sim_duration:
+            edges, lengths = np.append(edges, sim_duration), np.append(lengths, lengths[-1])
+        plot_times, plot_lengths = downsample_steps(edges, lengths, max_points)
+        results["queue_length_df"] = pd.DataFrame({'Time': plot_times, 'Queue Length': plot_lengths}).set_index('Time')
     else:
          results["queue_length_df"] = pd.DataFrame({'Time': [0, sim_duration], 'Queue Length': [0, 0]}).set_index('Time')
 
 
     # Wait time histogram data
-    if data.wait_times:
+    if data.streaming and data.wait_stats.count:
+        # Re-bin the log-bucketed sketch onto Sturges' number of equal-width bins
+        num_bins = min(50, int(np.ceil(np.log2(data.wait_stats.count))) + 1)
+        counts, bin_edges = data.wait_sketch.histogram(num_bins, (data.wait_stats.min, data.wait_stats.max))
+        hist_df = pd.DataFrame({'Wait Time Interval': [f"{bin_edges[i]:.2f}-{bin_edges[i+1]:.2f}" for i in range(len(counts))], 'Count': counts})
+        results["wait_time_hist_df"] = hist_df.set_index('Wait Time Interval')
+    elif data.wait_times:
         counts, bin_edges = np.histogram(data.wait_times, bins='auto')
         hist_df = pd.DataFrame({'Wait Time Interval': [f"{bin_edges[i]:.2f}-{bin_edges[i+1]:.2f}" for i in range(len(counts))], 'Count': counts})
         hist_df = hist_df.set_index('Wait Time Interval')
@@ -90,4 +170,70 @@ def calculate_summary_stats(data: SimulationData, sim_duration: float, num_serve
     else:
         results["wait_time_hist_df"] = pd.DataFrame({'Wait Time Interval': ['N/A'], 'Count': [0]}).set_index('Wait Time Interval')
 
-    return results
\ No newline at end of file
+    return results
+
+class ReplicationPool:
+    """Mergeable running mean/variance of the scalar metrics of one configuration's replications.
+
+    Replications are folded in one summary at a time, and pools from different workers or batches
+    merge, so no list of per-replication results has to be kept. Summaries with per-window metrics
+    (a "windows" dict, see windows.window_metrics) are pooled window by window as well; a window's
+    nan values (no customers) are left out of its statistics.
+    """
+    def __init__(self):
+        self.stats = {key: RunningStats() for key in REPLICATION_METRICS}
+        self.window_starts = []
+        self.window_stats = {} # metric -> one RunningStats per window
+
+    def add(self, summary: dict):
+        for key in REPLICATION_METRICS:
+            self.stats[key].add(summary[key])
+        windows = summary.get("windows")
+        if windows:
+            if len(windows["window_start"]) > len(self.window_starts):
+                self.window_starts = list(windows["window_start"])
+            for key, values in windows.items():
+                if key == "window_start":
+                    continue
+                stats = self.window_stats.setdefault(key, [])
+                stats.extend(RunningStats() for _ in range(len(values) - len(stats)))
+                for window, value in enumerate(values):
+                    if not math.isnan(value):
+                        stats[window].add(value)
+
+    def merge(self, other: "ReplicationPool"):
+        for key in REPLICATION_METRICS:
+            self.stats[key].merge(other.stats[key])
+        if len(other.window_starts) > len(self.window_starts):
+            self.window_starts = list(other.window_starts)
+        for key, other_stats in other.window_stats.items():
+            stats = self.window_stats.setdefault(key, [])
+            stats.extend(RunningStats() for _ in range(len(other_stats) - len(stats)))
+            for window, window_stats in enumerate(other_stats):
+                stats[window].merge(window_stats)
+
+    @property
+    def count(self) -> int:
+        return self.stats[REPLICATION_METRICS[0]].count
+
+    def mean(self, key: str) -> float:
+        return self.stats[key].mean if self.stats[key].count else float('inf')
+
+    def stdev(self, key: str) -> float:
+        return self.stats[key].stdev
+
+    def half_width(self, key: str, confidence: float = 0.95) -> float:
+        """Half-width of the Student-t confidence interval for the mean of a metric (inf below two replications)."""
+        n = self.stats[key].count
+        if n < 2:
+            return float('inf')
+        return student_t_quantile(0.5 + confidence / 2, n - 1) * self.stats[key].stdev / n ** 0.5
+
+    def window_table(self, confidence: float = 0.95) -> pd.DataFrame:
+        """Per-window means and "<metric>_ci" half-widths, one row per window (empty without windows)."""
+        table = {"window_start": self.window_starts}
+        for key, stats in self.window_stats.items():
+            table[key] = [s.mean if s.count else math.nan for s in stats]
+            table[f"{key}_ci"] = [student_t_quantile(0.5 + confidence / 2, s.count - 1) * s.stdev / s.count ** 0.5
+                                  if s.count > 1 else math.inf for s in stats]
+        return pd.DataFrame(table)
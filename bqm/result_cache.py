@@ -0,0 +1,151 @@
+# result_cache.py
+"""Content-addressed cache of simulation results: in-memory LRU tier over an SQLite tier on disk."""
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from simulation_core import ENGINE_VERSION
+
+DEFAULT_CACHE_DIR = os.environ.get("BQM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "bqm"))
+
+def _canonical(value):
+    """Normalizes params so equal inputs hash equally (5 and 5.0, tuples and lists, numpy scalars)."""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, (bool, np.bool_)) or value is None:
+        return None if value is None else bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    return str(value)
+
+def _file_fingerprints(params: dict) -> dict:
+    """Size and modification time of the files params point to ("..._path" keys, e.g. trace files).
+
+    Results depend on those files' contents, so a changed file must not hit entries stored for the old one.
+    """
+    fingerprints = {}
+    for key, value in params.items():
+        if str(key).endswith("_path") and isinstance(value, str) and os.path.isfile(value):
+            stat = os.stat(value)
+            fingerprints[str(key)] = [stat.st_size, stat.st_mtime_ns]
+    return fingerprints
+
+def cache_key(namespace: str, params: dict) -> str:
+    """SHA-256 of the canonical params (seed included), referenced files, the result kind and the engine version."""
+    payload = {"namespace": namespace, "engine_version": ENGINE_VERSION, "params": _canonical(params)}
+    fingerprints = _file_fingerprints(params)
+    if fingerprints: # Keys of runs without files stay as they were
+        payload["files"] = fingerprints
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+def is_cacheable(params: dict) -> bool:
+    """Only seeded runs are reproducible, so only they are cached."""
+    return params.get("seed", None) is not None
+
+class ResultCache:
+    """Two-tier cache: an LRU dict of recent results in memory over an SQLite table on disk.
+
+    Both tiers evict least recently used entries first. The disk tier is capped at max_disk_bytes of
+    pickled values; the memory tier at memory_items entries and at max_memory_bytes, counted by the
+    pickled size of each value (a lower bound on its size in memory, as Python lists of floats take
+    about three times their pickled size). A value over the whole memory budget stays on disk only.
+    Each operation opens its own connection, so the cache can be shared across the
+    threads Streamlit runs scripts in.
+    """
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, memory_items: int = 256, max_disk_bytes: int = 512 * 1024 ** 2,
+                 max_memory_bytes: int = 128 * 1024 ** 2):
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self._memory = OrderedDict() # key -> (value, pickled size)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, "results.sqlite")
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_access REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _remember(self, key: str, value, size: int):
+        self._forget(key)
+        if size > self.max_memory_bytes:
+            return
+        self._memory[key] = (value, size)
+        self._memory_bytes += size
+        while len(self._memory) > self.memory_items or self._memory_bytes > self.max_memory_bytes:
+            self._memory_bytes -= self._memory.popitem(last=False)[1][1]
+
+    def _forget(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+
+    def get(self, key: str):
+        """Returns the cached value or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key][0]
+            with self._connect() as conn:
+                row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+            if row is None:
+                self.misses += 1
+                return None
+            value = pickle.loads(row[0])
+            self._remember(key, value, len(row[0]))
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(key, value, len(blob))
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO results (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                             (key, blob, len(blob), time.time()))
+                self._evict(conn)
+
+    def _evict(self, conn):
+        """Deletes least recently used disk entries until the tier fits in max_disk_bytes."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_access").fetchall():
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._forget(key)
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+
+    def get_or_compute(self, namespace: str, params: dict, compute):
+        """Returns the cached result for params, or compute(params) stored under its key (unseeded runs bypass the cache)."""
+        if not is_cacheable(params):
+            return compute(params)
+        key = cache_key(namespace, params)
+        value = self.get(key)
+        if value is None:
+            value = compute(params)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            with self._connect() as conn:
+                conn.execute("DELETE FROM results")
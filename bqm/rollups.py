@@ -0,0 +1,209 @@
+# rollups.py
+"""Fixed-width time-bucket rollups of a run: O(1) updates per event, memory bounded by the number of buckets."""
+import math
+import numpy as np
+import pandas as pd
+
+# Wait-time sketch per bucket: bin 0 counts zero waits, bins 1..SKETCH_BINS are sqrt(2)-spaced from SKETCH_LOW
+SKETCH_BINS = 48
+SKETCH_LOW = 2.0 ** -12
+# Target number of buckets when a run asks for rollups without choosing a count
+DEFAULT_ROLLUP_BUCKETS = 500
+
+def busy_area(starts: np.ndarray, ends: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Total busy time before each t of the intervals [start_i, end_i]: sum_i of the part before t."""
+    starts, ends = np.sort(starts), np.sort(ends)
+    start_sums = np.concatenate([[0.0], np.cumsum(starts)])
+    end_sums = np.concatenate([[0.0], np.cumsum(ends)])
+    started = np.searchsorted(starts, t)
+    ended = np.searchsorted(ends, t)
+    return (started * t - start_sums[started]) - (ended * t - end_sums[ended])
+
+def _sketch_bin(wait: float) -> int:
+    """Scalar _sketch_bins, for per-event updates."""
+    if wait <= 0:
+        return 0
+    return min(max(math.floor(2.0 * math.log2(wait / SKETCH_LOW)) + 1, 1), SKETCH_BINS)
+
+def _sketch_bins(waits: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore"):
+        bins = np.floor(2.0 * np.log2(np.maximum(waits, 0.0) / SKETCH_LOW)) + 1
+    return np.where(waits > 0, np.clip(bins, 1, SKETCH_BINS), 0).astype(np.int64)
+
+class TimeBuckets:
+    """Per-bucket arrivals, completions, queue-length area, per-server busy time and a wait-time sketch.
+
+    Bucket k covers [k * width, (k + 1) * width). Arrivals and completions count where they happen;
+    a completed customer's wait goes to the bucket it arrived in. Queue-length and busy intervals
+    are split over the buckets they span. When an event falls beyond max_buckets, adjacent buckets
+    are merged in pairs and the width doubles, so memory never grows past max_buckets rows.
+    """
+    def __init__(self, width: float, num_servers: int, max_buckets: int = 2 * DEFAULT_ROLLUP_BUCKETS):
+        if width <= 0 or max_buckets < 2:
+            raise ValueError("Rollups need a positive bucket width and at least two buckets.")
+        self.width = float(width)
+        self.num_servers = num_servers
+        self.max_buckets = max_buckets
+        self.size = 0 # Buckets in use
+        self.covered = 0.0 # size * width: times below it need no _reach
+        capacity = min(max_buckets, 64)
+        self.arrivals = np.zeros(capacity, dtype=np.int64)
+        self.completions = np.zeros(capacity, dtype=np.int64)
+        self.queue_area = np.zeros(capacity)
+        self.wait_sum = np.zeros(capacity)
+        self.busy = np.zeros((capacity, num_servers))
+        self.wait_counts = np.zeros((capacity, SKETCH_BINS + 1), dtype=np.int64)
+
+    _ARRAYS = ("arrivals", "completions", "queue_area", "wait_sum", "busy", "wait_counts")
+
+    def _coarsen(self):
+        """Merges buckets 2k and 2k+1 into bucket k and doubles the width."""
+        for name in self._ARRAYS:
+            array = getattr(self, name)
+            if len(array) % 2:
+                array = np.concatenate([array, np.zeros_like(array[:1])])
+            setattr(self, name, array[0::2] + array[1::2])
+        self.width *= 2
+        self.size = (self.size + 1) // 2
+        self.covered = self.size * self.width
+
+    def _last_index(self, t: float) -> int:
+        """Bucket holding the end of an interval ending at t (an interval ending on an edge stays below it)."""
+        index = int(t // self.width)
+        return index - 1 if index > 0 and t <= index * self.width else index
+
+    def _reach(self, t: float, point: bool = False):
+        """Makes room for buckets up to time t, merging buckets first if t lies beyond max_buckets.
+
+        An interval ending at t needs the buckets up to _last_index(t); a point event at t (point=True)
+        needs the bucket starting at t as well when t lies on an edge.
+        """
+        if t < self.covered and not point:
+            return
+        index = (lambda: int(t // self.width)) if point else (lambda: self._last_index(t))
+        while index() >= self.max_buckets:
+            self._coarsen()
+        needed = index() + 1
+        if needed > len(self.arrivals):
+            capacity = min(self.max_buckets, max(needed, 2 * len(self.arrivals)))
+            for name in self._ARRAYS:
+                array = getattr(self, name)
+                grown = np.zeros((capacity, *array.shape[1:]), dtype=array.dtype)
+                grown[:len(array)] = array
+                setattr(self, name, grown)
+        self.size = max(self.size, needed)
+        self.covered = self.size * self.width
+
+    def _bucket(self, t: float) -> int:
+        """Bucket of a point event at t, making room for it first."""
+        index = int(t // self.width)
+        if index >= self.size:
+            self._reach(t, point=True)
+            index = int(t // self.width)
+        return index
+
+    def _spread(self, array: str, start: float, end: float, weight: float = 1.0, column: int = None):
+        """Adds weight * (overlap with each bucket) of [start, end] to array (one column of a 2-D array)."""
+        if end <= start:
+            return
+        self._reach(end)
+        target = getattr(self, array)
+        first, last = int(start // self.width), self._last_index(end)
+        if first == last: # The common case: the interval fits in one bucket
+            if column is None:
+                target[first] += weight * (end - start)
+            else:
+                target[first, column] += weight * (end - start)
+            return
+        if column is not None:
+            target = target[:, column]
+        target[first] += weight * ((first + 1) * self.width - start)
+        target[first + 1:last] += weight * self.width
+        target[last] += weight * (end - last * self.width)
+
+    # --- Per-event updates (event engines) ---
+    def add_arrival(self, t: float):
+        bucket = self._bucket(t) # First: making room may replace the arrays
+        self.arrivals[bucket] += 1
+
+    def add_completion(self, arrival_time: float, wait_time: float, departure_time: float):
+        self._reach(departure_time)
+        bucket = self._bucket(arrival_time) # May merge buckets, so the departure's bucket is taken after it
+        self.completions[self._last_index(departure_time)] += 1
+        self.wait_sum[bucket] += wait_time
+        self.wait_counts[bucket, _sketch_bin(wait_time)] += 1
+
+    def add_queue_interval(self, start: float, end: float, length: int):
+        if length:
+            self._spread("queue_area", start, end, length)
+
+    def add_busy(self, server_id: int, start: float, end: float):
+        self._spread("busy", start, end, column=server_id)
+
+    # --- Bulk updates (vectorized engine) ---
+    def add_arrivals_bulk(self, times: np.ndarray):
+        if len(times):
+            self._reach(float(times.max()), point=True)
+            self.arrivals[:self.size] += np.bincount((times // self.width).astype(np.int64), minlength=self.size)[:self.size]
+
+    def add_completions_bulk(self, arrival_times: np.ndarray, wait_times: np.ndarray, departure_times: np.ndarray):
+        if not len(departure_times):
+            return
+        self._reach(float(departure_times.max()))
+        self._reach(float(arrival_times.max()), point=True)
+        done = (departure_times // self.width).astype(np.int64)
+        done -= (done > 0) & (departure_times <= done * self.width) # As _last_index
+        self.completions[:self.size] += np.bincount(done, minlength=self.size)[:self.size]
+        arrived = (arrival_times // self.width).astype(np.int64)
+        self.wait_sum[:self.size] += np.bincount(arrived, weights=wait_times, minlength=self.size)[:self.size]
+        np.add.at(self.wait_counts, (arrived, _sketch_bins(wait_times)), 1)
+
+    def _edges(self) -> np.ndarray:
+        return np.arange(self.size + 1) * self.width
+
+    def add_queue_steps(self, start: float, intervals: np.ndarray, lengths: np.ndarray):
+        """Adds a queue-length step function starting at time start (steps as in QueueTrajectory)."""
+        if not len(intervals):
+            return
+        times = start + np.concatenate([[0.0], np.cumsum(intervals)])
+        self._reach(float(times[-1]))
+        area = np.concatenate([[0.0], np.cumsum(intervals * lengths)])
+        self.queue_area[:self.size] += np.diff(np.interp(self._edges(), times, area))
+
+    def add_busy_bulk(self, server_ids: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+        if not len(starts):
+            return
+        self._reach(float(ends.max()))
+        edges = self._edges()
+        for server_id in np.unique(server_ids):
+            mine = server_ids == server_id
+            self.busy[:self.size, server_id] += np.diff(busy_area(starts[mine], ends[mine], edges))
+
+    # --- Results ---
+    def wait_quantile(self, q: float) -> np.ndarray:
+        """Approximate q-quantile of the wait of each bucket's arrivals (within a factor sqrt(2); nan if none)."""
+        counts = self.wait_counts[:self.size]
+        totals = counts.sum(axis=1)
+        cumulative = np.cumsum(counts, axis=1)
+        rank = np.minimum(q * (totals - 1), np.maximum(totals - 1, 0))
+        bins = (cumulative <= rank[:, None]).sum(axis=1)
+        values = np.where(bins == 0, 0.0, SKETCH_LOW * 2.0 ** ((bins - 0.5) / 2))
+        return np.where(totals > 0, values, math.nan)
+
+    def frame(self, end_time: float = None) -> pd.DataFrame:
+        """One row per bucket, indexed by bucket start time; a last bucket cut short by end_time is averaged over its part."""
+        starts = np.arange(self.size) * self.width
+        spans = np.full(self.size, self.width)
+        if end_time is not None and self.size:
+            spans = np.clip(end_time - starts, 1e-12, self.width)
+        waited = self.wait_counts[:self.size].sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg_wait = self.wait_sum[:self.size] / waited
+        return pd.DataFrame({
+            "Arrivals": self.arrivals[:self.size],
+            "Completions": self.completions[:self.size],
+            "Avg Queue Length": self.queue_area[:self.size] / spans,
+            "Utilization (%)": self.busy[:self.size].sum(axis=1) / (spans * self.num_servers) * 100,
+            "Avg Wait": avg_wait,
+            "P90 Wait": self.wait_quantile(0.9),
+        }, index=pd.Index(starts, name="Time"))
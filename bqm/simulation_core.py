@@ -1,13 +1,31 @@
 # simulation_core.py
 import simpy
 import numpy as np
-from distributions import get_interarrival_time, get_service_time
-import time # To track wall-clock time if needed
+from distributions import (make_interarrival_sampler, make_service_sampler, DEFAULT_BLOCK_SIZE,
+                           STATE_INDEPENDENT_ARRIVALS, STATE_INDEPENDENT_SERVICES)
+from lindley import fcfs_schedule, queue_length_steps
+from streaming_stats import RunningStats, LogHistogram
+from queueing_theory import mean_arrival_rate
+from rollups import TimeBuckets
+from dispatch import FreeServers, ServerStore, DEFAULT_DISPATCH_POLICY
+import math
+import copy
 import statistics
-from collections import defaultdict # Useful for per-server data
+from collections import defaultdict, deque # Useful for per-server data
+from heapq import heappush, heappop
+from itertools import count
+
+# Engines accepted in params["engine"]; "simpy" is the reference implementation and
+# "auto" picks "vectorized" when the run qualifies for it and "fast" otherwise
+ENGINES = ("simpy", "fast", "vectorized", "auto")
+# Part of every result cache key; bump it whenever a change alters the results for the same params and seed
+# or the attributes of the cached SimulationData
+ENGINE_VERSION = 6
 
 class Customer:
-    """Minimal customer representation"""
+    """Minimal customer representation (slots only: one is created per SimPy arrival)"""
+    __slots__ = ("id", "arrival_time", "service_start_time", "service_end_time", "server_id_used")
+
     def __init__(self, customer_id, arrival_time):
         self.id = customer_id
         self.arrival_time = arrival_time
@@ -15,47 +33,257 @@ class Customer:
         self.service_end_time = -1.0
         self.server_id_used = None # Track which server was used
 
+class QueueTrajectory:
+    """Queue-length step function as (interval, length) pairs in growable NumPy buffers.
+
+    Capacity doubles when full, so appends are amortized O(1) and the pairs stay as a float64 interval
+    array and an int32 length array that reporting can use directly.
+    """
+    def __init__(self, capacity: int = 1024):
+        self._intervals = np.empty(capacity, dtype=np.float64)
+        self._lengths = np.empty(capacity, dtype=np.int32)
+        self._size = 0
+
+    def _reserve(self, size: int):
+        if size > len(self._intervals):
+            capacity = max(size, 2 * len(self._intervals))
+            intervals = np.empty(capacity, dtype=np.float64)
+            lengths = np.empty(capacity, dtype=np.int32)
+            intervals[:self._size] = self._intervals[:self._size]
+            lengths[:self._size] = self._lengths[:self._size]
+            self._intervals, self._lengths = intervals, lengths
+
+    def append(self, interval: float, length: int):
+        if self._size == len(self._intervals):
+            self._reserve(self._size + 1)
+        self._intervals[self._size] = interval
+        self._lengths[self._size] = length
+        self._size += 1
+
+    def extend(self, intervals: np.ndarray, lengths: np.ndarray):
+        end = self._size + len(intervals)
+        self._reserve(end)
+        self._intervals[self._size:end] = intervals
+        self._lengths[self._size:end] = lengths
+        self._size = end
+
+    @property
+    def intervals(self) -> np.ndarray:
+        """Durations of the recorded steps (a view, no copy)."""
+        return self._intervals[:self._size]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Queue length held during each step (a view, no copy)."""
+        return self._lengths[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def copy(self) -> "QueueTrajectory":
+        trajectory = QueueTrajectory(capacity=max(1, self._size))
+        trajectory.extend(self.intervals, self.lengths)
+        return trajectory
+
+    def __getstate__(self):
+        # Pickle only the filled part of the buffers (results are pickled into the result cache)
+        return {"_intervals": self.intervals.copy(), "_lengths": self.lengths.copy(), "_size": self._size}
+
+# Columns of a CustomerLog and their dtypes
+CUSTOMER_LOG_COLUMNS = (("arrival_time", np.float64), ("service_start_time", np.float64),
+                        ("service_end_time", np.float64), ("server_id", np.int32))
+
+class CustomerLog:
+    """Served customers' journeys in growable NumPy columns, one row per customer in departure order.
+
+    Like QueueTrajectory, appends are amortized O(1) and build no per-customer objects; the filled
+    columns go to pandas, Arrow or Parquet as whole arrays, without per-row Python conversion.
+    """
+    def __init__(self, capacity: int = 1024):
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in CUSTOMER_LOG_COLUMNS}
+        self._size = 0
+
+    def _reserve(self, size: int):
+        capacity = len(self._columns["arrival_time"])
+        if size > capacity:
+            capacity = max(size, 2 * capacity)
+            for name, dtype in CUSTOMER_LOG_COLUMNS:
+                column = np.empty(capacity, dtype=dtype)
+                column[:self._size] = self._columns[name][:self._size]
+                self._columns[name] = column
+
+    def append(self, arrival_time: float, service_start_time: float, service_end_time: float, server_id: int):
+        self._reserve(self._size + 1)
+        row, columns = self._size, self._columns
+        columns["arrival_time"][row] = arrival_time
+        columns["service_start_time"][row] = service_start_time
+        columns["service_end_time"][row] = service_end_time
+        columns["server_id"][row] = server_id
+        self._size += 1
+
+    def extend(self, arrival_times: np.ndarray, service_start_times: np.ndarray, service_end_times: np.ndarray,
+               server_ids: np.ndarray):
+        end = self._size + len(arrival_times)
+        self._reserve(end)
+        for (name, _), values in zip(CUSTOMER_LOG_COLUMNS, (arrival_times, service_start_times, service_end_times, server_ids)):
+            self._columns[name][self._size:end] = values
+        self._size = end
+
+    @property
+    def columns(self) -> dict:
+        """{column name: filled part of the column} (views, no copy); pd.DataFrame(log.columns) gives a table."""
+        return {name: column[:self._size] for name, column in self._columns.items()}
+
+    def __len__(self):
+        return self._size
+
+    def copy(self) -> "CustomerLog":
+        log = CustomerLog(capacity=max(1, self._size))
+        log.extend(*self.columns.values())
+        return log
+
+    def __getstate__(self):
+        # Pickle only the filled part of the buffers, as QueueTrajectory does
+        return {"_columns": {name: column.copy() for name, column in self.columns.items()}, "_size": self._size}
+
+    def to_arrow(self):
+        """The log as a pyarrow Table (the NumPy columns are wrapped without copying)."""
+        try:
+            import pyarrow as pa # Optional: only needed to export the log
+        except ImportError:
+            raise ImportError("Exporting the customer log to Arrow or Parquet needs pyarrow (pip install pyarrow).") from None
+        return pa.table(self.columns)
+
+    def write_parquet(self, where):
+        """Writes the log as Parquet to a path or binary file object."""
+        table = self.to_arrow() # Raises first if pyarrow is missing
+        import pyarrow.parquet as pq
+        pq.write_table(table, where)
+
 class SimulationData:
     """Collects data during the simulation run (modified for individual server tracking)"""
-    def __init__(self, num_servers):
+    def __init__(self, num_servers, streaming=False, rollups: TimeBuckets = None, customer_log: CustomerLog = None):
         self.num_servers = num_servers
         self.wait_times = []
         self.system_times = []
+        self.departure_times = [] # Aligned with wait_times, for warm-up truncation in time
+        # Every arrival and service start in time order; service is FCFS, so the k-th start is the k-th
+        # arrival's, and arrivals past the last start were still queued when the run ended
+        self.arrival_times = []
+        self.service_start_times = []
         # Track busy time per server
         self.server_busy_time = defaultdict(float)
         self.server_busy_start_times = {} # key: server_id, value: last busy start time
         self.total_served_count = 0
         self.server_customer_counts = defaultdict(int) # Track customers served per server
-        self.queue_lengths_over_time = [] # List of tuples (timestamp, queue_length)
+        self.queue_trajectory = QueueTrajectory() # (interval, queue_length) steps
         self.last_event_time = 0.0
         self.current_queue_length = 0
+        # Streaming mode keeps O(1) summaries instead of the per-customer lists and the queue trajectory
+        self.streaming = streaming
+        self.wait_stats = RunningStats()
+        self.system_stats = RunningStats()
+        self.wait_sketch = LogHistogram() # Quantiles and histogram of wait times
+        self.queue_area = 0.0 # Integral of queue length over time
+        self.max_queue_length = 0
+        # Mean interarrival and service time the run drew ("mean_interarrival", "mean_service"), for control variates
+        self.input_means = {}
+        # Optional fixed-width time-bucket rollups (see rollups.py), kept in both statistics modes
+        self.rollups = rollups
+        # Optional per-customer log (see CustomerLog), kept in both statistics modes
+        self.customer_log = customer_log
+
+    @property
+    def queue_lengths_over_time(self) -> list:
+        """The queue trajectory as a list of (interval, queue_length) tuples (builds Python objects; prefer queue_trajectory)."""
+        return list(zip(self.queue_trajectory.intervals.tolist(), self.queue_trajectory.lengths.tolist()))
 
     def record_queue_length(self, timestamp):
         """Records the queue length just before it changes."""
         time_interval = timestamp - self.last_event_time
         # Prevent recording zero-duration intervals excessively if events happen at the same time
         if time_interval > 1e-9: # Use a small tolerance instead of > 0
-            self.queue_lengths_over_time.append((time_interval, self.current_queue_length))
+            if self.streaming:
+                self.queue_area += time_interval * self.current_queue_length
+                if self.current_queue_length > self.max_queue_length:
+                    self.max_queue_length = self.current_queue_length
+            else:
+                self.queue_trajectory.append(time_interval, self.current_queue_length)
+            if self.rollups is not None:
+                self.rollups.add_queue_interval(self.last_event_time, timestamp, self.current_queue_length)
             self.last_event_time = timestamp
         # If multiple events happen "simultaneously", ensure last_event_time updates
         elif time_interval == 0:
             self.last_event_time = timestamp
 
+    def record_arrival(self, timestamp):
+        """Records a customer joining the queue."""
+        self.record_queue_length(timestamp)
+        self.current_queue_length += 1
+        if not self.streaming:
+            self.arrival_times.append(timestamp)
+        if self.rollups is not None:
+            self.rollups.add_arrival(timestamp)
+
+    def record_service_start(self, timestamp):
+        """Records the customer at the head of the queue starting service."""
+        self.record_queue_length(timestamp)
+        self.current_queue_length -= 1
+        if not self.streaming:
+            self.service_start_times.append(timestamp)
 
     def add_customer_served(self, customer: Customer, env_now: float):
-        wait_time = customer.service_start_time - customer.arrival_time
-        system_time = env_now - customer.arrival_time
-        self.wait_times.append(wait_time)
-        self.system_times.append(system_time)
+        self.record_departure(customer.arrival_time, customer.service_start_time, env_now, customer.server_id_used)
+
+    def record_departure(self, arrival_time, service_start_time, departure_time, server_id):
+        """Records a served customer from its raw timestamps (no Customer object needed)."""
+        wait_time = service_start_time - arrival_time
+        system_time = departure_time - arrival_time
+        if self.streaming:
+            self.wait_stats.add(wait_time)
+            self.system_stats.add(system_time)
+            self.wait_sketch.add(wait_time)
+        else:
+            self.wait_times.append(wait_time)
+            self.system_times.append(system_time)
+            self.departure_times.append(departure_time)
         self.total_served_count += 1
-        if customer.server_id_used is not None:
-            self.server_customer_counts[customer.server_id_used] += 1
+        if self.rollups is not None:
+            self.rollups.add_completion(arrival_time, wait_time, departure_time)
+        if self.customer_log is not None:
+            self.customer_log.append(arrival_time, service_start_time, departure_time, -1 if server_id is None else server_id)
+        if server_id is not None:
+            self.server_customer_counts[server_id] += 1
+
+    def record_departures_bulk(self, wait_times: np.ndarray, system_times: np.ndarray, departure_times: np.ndarray):
+        """Records many served customers at once (in departure order); server counts are set by the caller."""
+        if self.streaming:
+            self.wait_stats.add_array(wait_times)
+            self.system_stats.add_array(system_times)
+            self.wait_sketch.add_array(wait_times)
+        else:
+            self.wait_times.extend(wait_times.tolist())
+            self.system_times.extend(system_times.tolist())
+            self.departure_times.extend(departure_times.tolist())
+        self.total_served_count += len(wait_times)
+        if self.rollups is not None:
+            self.rollups.add_completions_bulk(departure_times - system_times, wait_times, departure_times)
+
+    def record_queue_steps(self, intervals: np.ndarray, lengths: np.ndarray):
+        """Records a whole queue-length step function at once (bulk counterpart of record_queue_length)."""
+        if self.streaming:
+            self.queue_area += float(np.dot(intervals, lengths))
+            if len(lengths):
+                self.max_queue_length = max(self.max_queue_length, int(lengths.max()))
+        else:
+            self.queue_trajectory.extend(intervals, lengths)
+        if self.rollups is not None:
+            self.rollups.add_queue_steps(self.last_event_time, intervals, lengths)
 
     def record_server_start_busy(self, server_id, timestamp):
         # Should not already be busy, but check defensively
         if server_id not in self.server_busy_start_times:
             self.server_busy_start_times[server_id] = timestamp
-        # else: print(f"Warning: Server {server_id} started busy at {timestamp} but was already marked busy.") # Debugging line
 
     def record_server_end_busy(self, server_id, timestamp):
         if server_id in self.server_busy_start_times:
@@ -63,8 +291,9 @@ class SimulationData:
             busy_duration = timestamp - start_time
             if busy_duration > 0: # Avoid adding zero duration if start/end are same instant
                  self.server_busy_time[server_id] += busy_duration
+                 if self.rollups is not None:
+                     self.rollups.add_busy(server_id, start_time, timestamp)
             del self.server_busy_start_times[server_id] # Mark server as idle for tracking
-        # else: print(f"Warning: Server {server_id} ended busy at {timestamp} but wasn't marked busy.") # Debugging line
 
 
     def finalize(self, env_now):
@@ -76,19 +305,40 @@ class SimulationData:
              busy_duration = env_now - start_time
              if busy_duration > 0:
                   self.server_busy_time[server_id] += busy_duration
+                  if self.rollups is not None:
+                      self.rollups.add_busy(server_id, start_time, env_now)
              del self.server_busy_start_times[server_id] # Clear ongoing busy status
 
          # Record final queue length interval
          self.record_queue_length(env_now)
 
+    def snapshot(self, env_now) -> "SimulationData":
+        """Finalized copy of the data collected up to env_now; this instance keeps collecting."""
+        snap = copy.copy(self)
+        snap.wait_times = list(self.wait_times)
+        snap.system_times = list(self.system_times)
+        snap.departure_times = list(self.departure_times)
+        snap.arrival_times = list(self.arrival_times)
+        snap.service_start_times = list(self.service_start_times)
+        snap.server_busy_time = defaultdict(float, self.server_busy_time)
+        snap.server_busy_start_times = dict(self.server_busy_start_times)
+        snap.server_customer_counts = defaultdict(int, self.server_customer_counts)
+        snap.queue_trajectory = self.queue_trajectory.copy()
+        snap.wait_stats = copy.copy(self.wait_stats)
+        snap.system_stats = copy.copy(self.system_stats)
+        snap.wait_sketch = copy.deepcopy(self.wait_sketch)
+        snap.rollups = copy.deepcopy(self.rollups)
+        snap.customer_log = self.customer_log.copy() if self.customer_log is not None else None
+        snap.finalize(env_now)
+        return snap
+
 # --- customer_process needs significant changes ---
-def customer_process(env, customer_id, server_pool, arrival_params, service_params, data, rng, arrival_dist, service_dist):
+def customer_process(env, customer_id, server_pool, service_sampler, data):
     """Process defining a customer's journey (using simpy.Store)."""
     customer = Customer(customer_id, env.now)
 
     # Record queue length change on arrival
-    data.record_queue_length(env.now)
-    data.current_queue_length += 1
+    data.record_arrival(env.now)
 
     # Request a server object from the store
     # Server objects are just integers representing IDs in this case
@@ -99,14 +349,13 @@ def customer_process(env, customer_id, server_pool, arrival_params, service_para
     customer.service_start_time = env.now
 
     # Record queue length change on service start
-    data.record_queue_length(env.now)
-    data.current_queue_length -= 1
+    data.record_service_start(env.now)
 
     # Record that this specific server is now busy
     data.record_server_start_busy(server_id, customer.service_start_time)
 
     # Perform service
-    service_time = get_service_time(service_dist, service_params, rng)
+    service_time = service_sampler.next()
     yield env.timeout(service_time) # Undergo service
 
     # Service finished
@@ -123,17 +372,17 @@ def customer_process(env, customer_id, server_pool, arrival_params, service_para
 
 
 # --- customer_source needs to pass server_pool ---
-def customer_source(env, server_pool, arrival_params, service_params, data, rng, stop_condition_type, stop_condition_value, arrival_dist, service_dist):
+def customer_source(env, server_pool, arrival_sampler, service_sampler, data, stop_condition_type, stop_condition_value):
     """Generates customers based on arrival distribution."""
     customer_id = 0
     while True:
         # Generate next arrival time
-        interarrival = get_interarrival_time(arrival_dist, arrival_params, rng)
+        interarrival = arrival_sampler.next()
         yield env.timeout(interarrival) # Wait for next arrival
 
         customer_id += 1
         # Pass server_pool instead of servers resource
-        env.process(customer_process(env, customer_id, server_pool, arrival_params, service_params, data, rng, arrival_dist, service_dist))
+        env.process(customer_process(env, customer_id, server_pool, service_sampler, data))
 
         # Check stopping condition (same logic as before)
         if stop_condition_type == "Number of Customers" and data.total_served_count >= stop_condition_value:
@@ -141,46 +390,326 @@ def customer_source(env, server_pool, arrival_params, service_params, data, rng,
         if stop_condition_type == "Simulation Time" and env.now >= stop_condition_value:
             break
 
-# --- run_simulation needs to initialize Store and Data correctly ---
-def run_simulation(params: dict) -> SimulationData:
-    """Sets up and runs a single simulation instance (using simpy.Store)."""
-    start_time = time.time() # Wall-clock time
-
-    seed = params.get("seed", None)
-    rng = np.random.default_rng(seed)
-    num_servers = params["num_servers"] # Get number of servers
-
-    env = simpy.Environment()
-    # Use a Store for individual server tracking
-    server_pool = simpy.Store(env, capacity=num_servers)
-    # Initialize the store with server IDs (0 to N-1)
-    server_pool.items.extend(range(num_servers))
-
-    # Pass num_servers to SimulationData constructor
-    data = SimulationData(num_servers=num_servers)
-
+def _split_params(params: dict) -> tuple:
+    """Extracts the distribution names and their parameter dicts from the flat params dict."""
     arrival_dist = params["arrival_distribution"]
     service_dist = params["service_distribution"]
-    arrival_p = {k: v for k, v in params.items() if k.startswith('arrival_')}
-    service_p = {k: v for k, v in params.items() if k.startswith('service_') or k.startswith('fixed_') or k.startswith('mean_') or k.startswith('std_dev_')}
+    arrival_p = {k: v for k, v in params.items() if k.startswith(('arrival_', 'rate_profile')) or k == 'fixed_interval'}
+    service_p = {k: v for k, v in params.items() if k.startswith('service_') or k == 'fixed_service_time' or k.startswith('mean_') or k.startswith('std_dev_')}
+    return arrival_dist, service_dist, arrival_p, service_p
+
+def make_samplers(params: dict) -> tuple:
+    """Builds the (arrival, service) samplers for a run, each on its own stream spawned from the seed.
+
+    Separate streams keep every engine drawing the same values for a seed, whatever order the
+    engine interleaves arrivals and service starts in and whatever the sampler block size.
+    """
+    arrival_dist, service_dist, arrival_p, service_p = _split_params(params)
+    arrival_rng, service_rng = [np.random.default_rng(s) for s in np.random.SeedSequence(params.get("seed", None)).spawn(2)]
+    block_size = params.get("sampler_block_size", DEFAULT_BLOCK_SIZE)
+    antithetic = params.get("antithetic", None) # 0 or 1: which member of an antithetic pair this run is
+    return (make_interarrival_sampler(arrival_dist, arrival_p, arrival_rng, block_size, antithetic),
+            make_service_sampler(service_dist, service_p, service_rng, block_size, antithetic))
+
+def make_free_servers(params: dict) -> FreeServers:
+    """All servers free under params["dispatch_policy"]; "random" draws from a third stream spawned from the seed."""
+    policy = params.get("dispatch_policy", DEFAULT_DISPATCH_POLICY)
+    rng = np.random.default_rng(np.random.SeedSequence(params.get("seed", None)).spawn(3)[2]) if policy == "random" else None
+    return FreeServers(policy, params["num_servers"], rng)
+
+def _record_input_means(data: SimulationData, arrival_sampler, service_sampler):
+    data.input_means = {"mean_interarrival": arrival_sampler.drawn_mean, "mean_service": service_sampler.drawn_mean}
+
+def expected_horizon(params: dict) -> float:
+    """Simulated time a run is expected to last (for "Number of Customers", the time to admit them)."""
+    stop_type = params["stop_condition_type"]
+    stop_value = params["stop_condition_value"]
+    if stop_type == "Simulation Time":
+        return stop_value
+    if stop_type == "Number of Customers":
+        try:
+            return stop_value / mean_arrival_rate(params)
+        except (ValueError, KeyError, ZeroDivisionError):
+            return stop_value
+    raise ValueError("Invalid stop condition type")
+
+def new_simulation_data(params: dict) -> SimulationData:
+    """Empty SimulationData for a run: statistics="streaming" keeps O(1) summaries only, rollup_buckets
+    adds time-bucket rollups of about that many buckets over the expected horizon, and customer_log=True
+    keeps a CustomerLog of every served customer."""
+    num_servers = params["num_servers"]
+    rollups = None
+    num_buckets = params.get("rollup_buckets")
+    if num_buckets:
+        # Twice the room before buckets merge, in case the run outlasts its expected horizon
+        rollups = TimeBuckets(max(expected_horizon(params), 1e-9) / num_buckets, num_servers, max_buckets=2 * num_buckets)
+    return SimulationData(num_servers=num_servers, streaming=params.get("statistics") == "streaming", rollups=rollups,
+                          customer_log=CustomerLog() if params.get("customer_log") else None)
+
+def _build_simpy_model(params: dict) -> tuple:
+    """Creates the SimPy environment, server store and source process for a run; returns (env, data, samplers)."""
+    arrival_sampler, service_sampler = make_samplers(params) # Validates distribution params up front
+    free_servers = make_free_servers(params)
+
+    env = simpy.Environment()
+    data = new_simulation_data(params)
+    # Use a Store of server IDs (0 to N-1) for individual server tracking, handed out by the dispatch policy
+    server_pool = ServerStore(env, free_servers, data)
 
     # Pass server_pool to the source
-    env.process(customer_source(env, server_pool, arrival_p, service_p, data, rng,
-                                params["stop_condition_type"], params["stop_condition_value"],
-                                arrival_dist, service_dist))
+    env.process(customer_source(env, server_pool, arrival_sampler, service_sampler, data,
+                                params["stop_condition_type"], params["stop_condition_value"]))
+    return env, data, (arrival_sampler, service_sampler)
+
+# --- run_simulation needs to initialize Store and Data correctly ---
+def run_simulation(params: dict) -> SimulationData:
+    """Sets up and runs a single simulation instance (using simpy.Store)."""
+    engine = params.get("engine", "simpy")
+    if engine == "auto":
+        engine = "vectorized" if can_vectorize(params) else "fast"
+    if engine == "fast":
+        return run_heap_simulation(params)
+    if engine == "vectorized":
+        return run_vectorized_simulation(params)
+    if engine != "simpy":
+        raise ValueError(f"Unknown simulation engine: {engine}")
+
+    env, data, samplers = _build_simpy_model(params)
 
     # Run simulation (same logic as before)
     if params["stop_condition_type"] == "Simulation Time":
         env.run(until=params["stop_condition_value"])
     elif params["stop_condition_type"] == "Number of Customers":
-         try:
-            env.run() # Run until no more events or source stops generation based on count
-         except Exception as e:
-             print(f"Simulation run interrupted potentially by stopping condition: {e}")
+        env.run() # Run until no more events or source stops generation based on count
     else:
         raise ValueError("Invalid stop condition type")
 
     # Finalize data collection
     data.finalize(env.now)
-    # print(f"Simulation run (seed {seed}) took {time.time() - start_time:.2f} s wall clock time.")
-    return data
\ No newline at end of file
+    _record_input_means(data, *samplers)
+    return data
+
+def _running_mean_wait(data: SimulationData) -> float:
+    if data.streaming:
+        return data.wait_stats.mean
+    return statistics.fmean(data.wait_times) if data.wait_times else 0.0
+
+def iter_simulation(params: dict, num_chunks: int = 50, convergence_tolerance: float = None, patience: int = 3):
+    """Runs the SimPy model in slices of simulated time, yielding (data, progress) after each slice.
+
+    Slices are 1/num_chunks of the horizon (for "Number of Customers", of the expected time to admit
+    them). Every yield but the last gives a finalized snapshot, so the caller can summarize and chart it
+    while the run goes on, or simply stop iterating to abandon the run; the last yield gives the run's
+    own data, identical to run_simulation with engine "simpy". progress holds "time" (the duration to
+    report the data over), "fraction", "served", "mean_wait", "converged" and "done".
+    With convergence_tolerance, the run also ends once the running mean wait time changed by at most
+    that fraction of itself over `patience` consecutive slices.
+    """
+    stop_type = params["stop_condition_type"]
+    stop_value = params["stop_condition_value"]
+    step = expected_horizon(params) / num_chunks
+
+    env, data, samplers = _build_simpy_model(params)
+    previous_mean, stable_slices = None, 0
+    target = 0.0
+    while True:
+        target += step
+        if stop_type == "Simulation Time":
+            target = min(target, stop_value)
+        # Step event by event so the slice edges do not change the run: events at `target` go to the next slice
+        while env.peek() < target:
+            env.step()
+        if stop_type == "Simulation Time":
+            done, now = target >= stop_value, target
+            fraction = now / stop_value
+        else:
+            done = env.peek() == math.inf # Every admitted customer has left
+            now = env.now if done else target
+            fraction = min(1.0, data.total_served_count / stop_value)
+
+        mean_wait = _running_mean_wait(data)
+        if (convergence_tolerance and previous_mean is not None and data.total_served_count > 0
+                and abs(mean_wait - previous_mean) <= convergence_tolerance * abs(previous_mean)):
+            stable_slices += 1
+        else:
+            stable_slices = 0
+        previous_mean = mean_wait
+        converged = stable_slices >= patience
+
+        progress = {"time": now, "fraction": 1.0 if done else fraction, "served": data.total_served_count,
+                    "mean_wait": mean_wait, "converged": converged, "done": done or converged}
+        if progress["done"]:
+            data.finalize(now)
+            _record_input_means(data, *samplers)
+            yield data, progress
+            return
+        yield data.snapshot(now), progress
+
+# --- Heap engine: same model as above without SimPy processes ---
+# Event kinds, one per SimPy event the reference engine schedules for a customer
+_ARRIVAL = 0   # source timeout fires: a new customer arrives
+_START = 1     # server_pool.get() succeeds: service starts
+_DEPART = 2    # service timeout fires: customer leaves
+_RELEASE = 3   # server_pool.put() is processed: the store re-offers servers to the queue
+
+def run_heap_simulation(params: dict) -> SimulationData:
+    """Runs the run_simulation model on a plain binary heap instead of SimPy processes.
+
+    Heap entries are (time, sequence, kind, payload); the sequence number is assigned in the same
+    order SimPy assigns event ids, and free servers are kept in release order like the simpy.Store
+    items, so the same seed produces the same SimulationData as the SimPy engine.
+    """
+    arrival_sampler, service_sampler = make_samplers(params)
+    data = new_simulation_data(params)
+
+    stop_type = params["stop_condition_type"]
+    stop_value = params["stop_condition_value"]
+    if stop_type == "Simulation Time":
+        until = stop_value # Like env.run(until=...), events at exactly this time are not processed
+    elif stop_type == "Number of Customers":
+        until = math.inf
+    else:
+        raise ValueError("Invalid stop condition type")
+
+    free_servers = make_free_servers(params) # The store's items, handed out by the dispatch policy
+    waiting = deque() # Arrival times of customers whose get() is pending, oldest first
+    heap = []
+    seq = count()
+    now = 0.0
+
+    heappush(heap, (arrival_sampler.next(), next(seq), _ARRIVAL, None))
+    while heap and heap[0][0] < until:
+        now, _, kind, payload = heappop(heap)
+
+        # Zero-delay follow-up events are handled inline when nothing else is due at `now`,
+        # since SimPy would process them next anyway; otherwise they are queued behind those events.
+        while kind is not None:
+            next_kind, next_payload = None, None
+
+            if kind == _ARRIVAL:
+                # The source checks its stop condition and draws the next arrival before the new customer runs
+                if not ((stop_type == "Number of Customers" and data.total_served_count >= stop_value) or
+                        (stop_type == "Simulation Time" and now >= stop_value)):
+                    heappush(heap, (now + arrival_sampler.next(), next(seq), _ARRIVAL, None))
+                data.record_arrival(now)
+                waiting.append(now)
+                # A new get() only offers a server to the head of the queue, like Store._trigger_get
+                if free_servers:
+                    next_kind, next_payload = _START, (waiting.popleft(), free_servers.pop())
+
+            elif kind == _START:
+                arrival_time, server_id = payload
+                data.record_service_start(now)
+                data.record_server_start_busy(server_id, now)
+                service_time = service_sampler.next()
+                heappush(heap, (now + service_time, next(seq), _DEPART, (arrival_time, now, server_id)))
+
+            elif kind == _DEPART:
+                arrival_time, service_start_time, server_id = payload
+                data.record_server_end_busy(server_id, now)
+                data.record_departure(arrival_time, service_start_time, now, server_id)
+                # The put succeeds immediately, the queue is served when it is processed
+                free_servers.push(server_id, data.server_busy_time.get(server_id, 0.0))
+                # With nobody waiting the release is a no-op: any arrival before it takes a free server itself
+                if waiting:
+                    next_kind = _RELEASE
+
+            else: # _RELEASE
+                if free_servers and waiting:
+                    next_kind, next_payload = _START, (waiting.popleft(), free_servers.pop())
+
+            if next_kind is not None and heap and heap[0][0] <= now:
+                heappush(heap, (now, next(seq), next_kind, next_payload))
+                next_kind = None
+            kind, payload = next_kind, next_payload
+
+    if until != math.inf:
+        now = until
+    data.finalize(now)
+    _record_input_means(data, arrival_sampler, service_sampler)
+    return data
+
+# --- Vectorized engine: bulk Lindley / Kiefer-Wolfowitz schedule for state-independent runs ---
+def can_vectorize(params: dict) -> bool:
+    """True when arrival and service draws do not depend on the queue state, so a run can be pre-drawn,
+    and servers are dispatched in release order (the only order fcfs_schedule assigns them in)."""
+    return (params["arrival_distribution"] in STATE_INDEPENDENT_ARRIVALS
+            and params["service_distribution"] in STATE_INDEPENDENT_SERVICES
+            and params.get("dispatch_policy", DEFAULT_DISPATCH_POLICY) == DEFAULT_DISPATCH_POLICY)
+
+def run_vectorized_simulation(params: dict) -> SimulationData:
+    """Computes a FCFS run from pre-drawn NumPy arrays instead of simulating event by event.
+
+    The samplers hand out the same values as in the event engines, so customers see the same
+    interarrival and service times; results differ only by floating-point rounding and tie handling.
+    """
+    if not can_vectorize(params):
+        raise ValueError("The vectorized engine needs state-independent arrival and service distributions "
+                         "and the release-order dispatch policy.")
+    num_servers = params["num_servers"]
+    arrival_sampler, service_sampler = make_samplers(params)
+    stop_type = params["stop_condition_type"]
+    stop_value = params["stop_condition_value"]
+
+    block = DEFAULT_BLOCK_SIZE
+    interarrivals = arrival_sampler.sample(block)
+    if stop_type == "Simulation Time":
+        # Every arrival strictly before the horizon is admitted, as with env.run(until=...)
+        while interarrivals.sum() < stop_value:
+            interarrivals = np.concatenate([interarrivals, arrival_sampler.sample(len(interarrivals))])
+        arrivals = np.cumsum(interarrivals)
+        num_customers = int(np.searchsorted(arrivals, stop_value, side="left"))
+        arrivals = arrivals[:num_customers]
+        services = service_sampler.sample(num_customers)
+        starts, departures, server_ids = fcfs_schedule(arrivals, services, num_servers)
+        end_time = float(stop_value)
+    elif stop_type == "Number of Customers":
+        # The source stops after the first arrival that finds stop_value customers already served
+        services = service_sampler.sample(block)
+        while True:
+            arrivals = np.cumsum(interarrivals)
+            starts, departures, server_ids = fcfs_schedule(arrivals, services, num_servers)
+            served_before = np.searchsorted(np.sort(departures), arrivals, side="left")
+            hits = np.flatnonzero(served_before >= stop_value)
+            if hits.size:
+                break
+            interarrivals = np.concatenate([interarrivals, arrival_sampler.sample(len(interarrivals))])
+            services = np.concatenate([services, service_sampler.sample(len(services))])
+        num_customers = int(hits[0]) + 1
+        arrivals, starts, departures, server_ids = (arrivals[:num_customers], starts[:num_customers],
+                                                    departures[:num_customers], server_ids[:num_customers])
+        end_time = float(departures.max()) # The run drains every admitted customer
+    else:
+        raise ValueError("Invalid stop condition type")
+
+    data = new_simulation_data(params)
+    served = departures < end_time if stop_type == "Simulation Time" else np.ones(num_customers, dtype=bool)
+    started = starts < end_time if stop_type == "Simulation Time" else np.ones(num_customers, dtype=bool)
+
+    # Served customers are recorded in departure order, like add_customer_served
+    order = np.argsort(departures[served], kind="stable")
+    data.record_departures_bulk((starts - arrivals)[served][order], (departures - arrivals)[served][order],
+                                departures[served][order])
+    if data.customer_log is not None:
+        data.customer_log.extend(arrivals[served][order], starts[served][order], departures[served][order],
+                                 server_ids[served][order])
+
+    busy = np.bincount(server_ids[started], weights=np.minimum(departures[started], end_time) - starts[started], minlength=num_servers)
+    counts = np.bincount(server_ids[served], minlength=num_servers)
+    data.server_busy_time.update({sid: float(t) for sid, t in enumerate(busy) if t > 0})
+    data.server_customer_counts.update({sid: int(n) for sid, n in enumerate(counts) if n > 0})
+
+    intervals, lengths = queue_length_steps(arrivals, starts[started], end_time)
+    data.record_queue_steps(intervals, lengths)
+    if data.rollups is not None:
+        data.rollups.add_arrivals_bulk(arrivals)
+        data.rollups.add_busy_bulk(server_ids[started], starts[started], np.minimum(departures[started], end_time))
+    data.current_queue_length = int(num_customers - started.sum())
+    if not data.streaming:
+        data.arrival_times.extend(arrivals.tolist())
+        data.service_start_times.extend(starts[started].tolist()) # FCFS starts follow arrival order
+    data.last_event_time = end_time
+    # The draws of the admitted customers (the arrays hold extra draws past the stopping point)
+    data.input_means = {"mean_interarrival": float(interarrivals[:num_customers].mean()) if num_customers else 0.0,
+                        "mean_service": float(services[:num_customers].mean()) if num_customers else 0.0}
+    return data
@@ -0,0 +1,107 @@
+# steady_state.py
+"""Steady-state estimates from one run: MSER-5 warm-up truncation and batch-means confidence intervals."""
+import math
+import numpy as np
+from rollups import busy_area
+from simulation_core import SimulationData
+from streaming_stats import student_t_quantile
+
+def mser_truncation(series, batch_size: int = 5) -> int:
+    """Number of leading observations to discard as warm-up (MSER-m, White 1997; MSER-5 by default).
+
+    The series is averaged in batches of batch_size, and the truncation d (in batches) minimizes
+    sum_{i>d} (Y_i - mean_d)^2 / (k - d)^2, the squared standard error of the truncated mean.
+    Only the first half of the run is considered; a minimum later than that means the run is too
+    short to tell, and the first-half minimum is returned anyway.
+    """
+    values = np.asarray(series, dtype=np.float64)
+    k = len(values) // batch_size
+    if k < 2:
+        return 0
+    batches = values[:k * batch_size].reshape(k, batch_size).mean(axis=1)
+    batches = batches - batches.mean() # Centering keeps the sums of squares well conditioned
+    remaining = np.arange(k, 0, -1, dtype=np.float64) # k - d for d = 0 .. k-1
+    suffix_sum = np.cumsum(batches[::-1])[::-1]
+    suffix_sq = np.cumsum((batches ** 2)[::-1])[::-1]
+    mser = (suffix_sq - suffix_sum ** 2 / remaining) / remaining ** 2
+    return int(np.argmin(mser[:k // 2 + 1])) * batch_size
+
+def batch_means(values, num_batches: int = 20, confidence: float = 0.95) -> tuple:
+    """(mean, CI half-width) of a correlated series from num_batches non-overlapping batch means.
+
+    Trailing values that do not fill a batch are left out of the interval but not of the mean.
+    The half-width is inf when there are fewer values than batches.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return 0.0, math.inf
+    size = len(values) // num_batches
+    if num_batches < 2 or size == 0:
+        return float(values.mean()), math.inf
+    means = values[:size * num_batches].reshape(num_batches, size).mean(axis=1)
+    half_width = student_t_quantile(0.5 + confidence / 2, num_batches - 1) * means.std(ddof=1) / math.sqrt(num_batches)
+    return float(values.mean()), float(half_width)
+
+def queue_area(data: SimulationData):
+    """(step end times, cumulative queue-length area) of the trajectory, starting from (0, 0)."""
+    trajectory = data.queue_trajectory
+    times = np.concatenate([[0.0], np.cumsum(trajectory.intervals)])
+    area = np.concatenate([[0.0], np.cumsum(trajectory.intervals * trajectory.lengths)])
+    return times, area
+
+def queue_length_windows(data: SimulationData, start: float, end: float, num_windows: int) -> np.ndarray:
+    """Time-average queue length over num_windows equal windows of [start, end].
+
+    The cumulative area is piecewise linear in time, so interpolating it at the window edges is exact.
+    """
+    times, area = queue_area(data)
+    edges = np.linspace(start, end, num_windows + 1)
+    return np.diff(np.interp(edges, times, area)) / np.diff(edges)
+
+def steady_state_summary(data: SimulationData, sim_duration: float, num_servers: int, num_batches: int = 20,
+                         confidence: float = 0.95, queue_windows: int = 1000) -> dict:
+    """Summary statistics with the warm-up discarded, plus batch-means CI half-widths ("<metric>_ci").
+
+    MSER-5 runs on the wait times (in departure order) and on the queue length averaged over
+    queue_windows time windows; the later of the two truncation points, as a time, is the warm-up.
+    Waits count for customers departing after it and queue length is averaged from it on.
+    Utilization is the busy time within [warm-up, sim_duration] over the server time of that span:
+    service intervals are clipped to it, and customers still in service at the end count up to it.
+    """
+    if num_batches < 2:
+        raise ValueError("Batch means need at least two batches.")
+    if data.streaming:
+        raise ValueError("Warm-up truncation needs full statistics (per-customer wait times and the queue trajectory).")
+    waits = np.asarray(data.wait_times, dtype=np.float64)
+    departures = np.asarray(data.departure_times, dtype=np.float64)
+
+    wait_cut = mser_truncation(waits)
+    wait_warmup = departures[wait_cut - 1] if wait_cut > 0 else 0.0
+    queue_cut = mser_truncation(queue_length_windows(data, 0.0, sim_duration, queue_windows)) if sim_duration > 0 else 0
+    queue_warmup = sim_duration * queue_cut / queue_windows
+    warmup_time = float(max(wait_warmup, queue_warmup))
+    kept = departures > warmup_time
+    steady_waits = waits[kept]
+    remaining_time = sim_duration - warmup_time
+
+    results = {"warmup_time": warmup_time, "warmup_customers": int(len(waits) - kept.sum()),
+               "warmup_fraction": warmup_time / sim_duration if sim_duration > 0 else 0.0}
+    results["avg_wait_time"], results["avg_wait_time_ci"] = batch_means(steady_waits, num_batches, confidence)
+    results["max_wait_time"] = float(steady_waits.max()) if len(steady_waits) else 0.0
+    results["std_dev_wait_time"] = float(steady_waits.std(ddof=1)) if len(steady_waits) > 1 else 0.0
+    if remaining_time > 1e-9:
+        windows = queue_length_windows(data, warmup_time, sim_duration, num_batches)
+        results["avg_queue_length"] = float(windows.mean())
+        results["avg_queue_length_ci"] = float(student_t_quantile(0.5 + confidence / 2, num_batches - 1) * windows.std(ddof=1)
+                                               / math.sqrt(num_batches))
+        starts = np.asarray(data.service_start_times, dtype=np.float64)
+        # busy_area pairs no starts with ends, so customers still in service simply end at sim_duration
+        ends = np.concatenate([departures, np.full(len(starts) - len(departures), float(sim_duration))])
+        busy = float(np.diff(busy_area(starts, ends, np.array([warmup_time, sim_duration])))[0])
+        results["avg_server_utilization"] = busy / (remaining_time * num_servers) * 100
+    else:
+        results["avg_queue_length"], results["avg_queue_length_ci"] = 0.0, math.inf
+        results["avg_server_utilization"] = 0.0
+    results["total_served"] = data.total_served_count
+    results["steady_state_served"] = int(kept.sum())
+    return results
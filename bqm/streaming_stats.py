@@ -0,0 +1,174 @@
+# streaming_stats.py
+"""Constant-memory, mergeable accumulators for long simulation runs."""
+import math
+import numpy as np
+
+class RunningStats:
+    """Count, mean, variance (Welford), min and max of a stream of values."""
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 # Sum of squared deviations from the mean
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def add_array(self, values: np.ndarray):
+        """Adds a batch of values at once (merges the batch's own moments)."""
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        batch = RunningStats()
+        batch.count = int(values.size)
+        batch.mean = float(values.mean())
+        batch.m2 = float(((values - batch.mean) ** 2).sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        self.merge(batch)
+
+    def merge(self, other: "RunningStats"):
+        """Combines another accumulator into this one (Chan et al. parallel formula)."""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2, self.min, self.max = other.count, other.mean, other.m2, other.min, other.max
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (0.0 for fewer than two values), matching statistics.variance."""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.variance)
+
+def student_t_cdf(t: float, df: int) -> float:
+    """CDF of Student's t distribution for a whole number of degrees of freedom (closed form, no SciPy)."""
+    theta = math.atan(t / math.sqrt(df))
+    cos2 = math.cos(theta) ** 2
+    term, total = 1.0, 1.0
+    if df % 2: # Odd df: 1/2 + (theta + sin cos (1 + 2/3 cos^2 + 2*4/(3*5) cos^4 + ...)) / pi
+        for k in range(1, (df - 1) // 2):
+            term *= cos2 * (2 * k) / (2 * k + 1)
+            total += term
+        series = math.sin(theta) * math.cos(theta) * total if df > 1 else 0.0
+        return 0.5 + (theta + series) / math.pi
+    # Even df: 1/2 + sin (1 + 1/2 cos^2 + 1*3/(2*4) cos^4 + ...) / 2
+    for k in range(1, df // 2):
+        term *= cos2 * (2 * k - 1) / (2 * k)
+        total += term
+    return 0.5 + 0.5 * math.sin(theta) * total
+
+def student_t_quantile(p: float, df: int) -> float:
+    """p-quantile of Student's t distribution with df degrees of freedom, by bisection on student_t_cdf."""
+    if df < 1 or not 0 < p < 1:
+        raise ValueError("Need df >= 1 and 0 < p < 1.")
+    if p < 0.5:
+        return -student_t_quantile(1 - p, df)
+    low, high = 0.0, 1.0
+    while student_t_cdf(high, df) < p:
+        low, high = high, 2 * high
+    for _ in range(100):
+        mid = 0.5 * (low + high)
+        if student_t_cdf(mid, df) < p:
+            low = mid
+        else:
+            high = mid
+        if high - low <= 1e-12 * high:
+            break
+    return 0.5 * (low + high)
+
+class LogHistogram:
+    """Log-bucketed histogram that doubles as a mergeable quantile sketch (DDSketch-style).
+
+    Positive values fall in buckets [gamma^(i-1), gamma^i) with gamma = (1 + a) / (1 - a), so any quantile
+    is returned within relative error a, and the number of buckets grows with log(max / min) rather than
+    with the number of values. Zeros (customers who never wait) are counted separately.
+    """
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("Relative accuracy must be between 0 and 1.")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {} # bucket index -> count
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float):
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def add_array(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        self.count += int(values.size)
+        positive = values[values > 0]
+        self.zero_count += int(values.size - positive.size)
+        if positive.size:
+            indices, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64), return_counts=True)
+            for index, n in zip(indices.tolist(), counts.tolist()):
+                self.buckets[index] = self.buckets.get(index, 0) + n
+
+    def merge(self, other: "LogHistogram"):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge histograms with different relative accuracy.")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+
+    def _bucket_value(self, index: int) -> float:
+        """Representative value of a bucket (relative error at most relative_accuracy)."""
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q: float) -> float:
+        """Approximate q-quantile (0 <= q <= 1) of the values added so far."""
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return self._bucket_value(index)
+        return self._bucket_value(max(self.buckets))
+
+    def histogram(self, bins: int, value_range: tuple) -> tuple:
+        """Re-bins the sketch onto `bins` equal-width bins over value_range; returns (counts, bin_edges) like np.histogram."""
+        low, high = value_range
+        if high <= low:
+            high = low + 1.0
+        edges = np.linspace(low, high, bins + 1)
+        counts = np.zeros(bins, dtype=np.int64)
+        if self.zero_count:
+            counts[0] += self.zero_count
+        if self.buckets:
+            indices = np.fromiter(self.buckets.keys(), dtype=np.int64, count=len(self.buckets))
+            bucket_counts = np.fromiter(self.buckets.values(), dtype=np.int64, count=len(self.buckets))
+            values = np.clip(2 * self.gamma ** indices.astype(np.float64) / (self.gamma + 1), low, high)
+            positions = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, bins - 1)
+            np.add.at(counts, positions, bucket_counts)
+        return counts, edges
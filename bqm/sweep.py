@@ -0,0 +1,135 @@
+# sweep.py
+"""Parameter sweeps: grids or Latin hypercubes of scenarios run on one shared process pool."""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import product
+import numpy as np
+import pandas as pd
+from reporting import ReplicationPool, REPLICATION_METRICS
+from optimization import replication_seeds, run_replications
+from queueing_theory import mean_arrival_rate
+from fitting import FITTED_DISTRIBUTIONS
+
+# Params that only take whole numbers when sampled from a range
+INTEGER_PARAMS = ("num_servers",)
+
+def _ignore(*args):
+    """Default progress/point callback: report nothing."""
+
+def arrival_axis(arrival_distribution: str) -> str:
+    """The param that sets the arrival rate for an arrival distribution from distributions.py."""
+    if arrival_distribution == "Trace":
+        return "arrival_trace_scale"
+    if arrival_distribution in FITTED_DISTRIBUTIONS:
+        return "arrival_sample_scale"
+    if arrival_distribution == "Time-Varying Rate":
+        return "rate_profile_scale"
+    return "fixed_interval" if arrival_distribution == "Fixed Interval" else "arrival_rate"
+
+def service_axis(service_distribution: str) -> str:
+    """The param that sets the service speed for a service distribution from distributions.py."""
+    if service_distribution in FITTED_DISTRIBUTIONS:
+        return "service_sample_scale"
+    return {"Exponential": "service_rate", "Constant": "fixed_service_time", "Normal": "mean_service_time",
+            "Trace": "service_trace_scale"}[service_distribution]
+
+def grid_points(axes: dict) -> list:
+    """Every combination of {param: values} as a list of {param: value} dicts."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in product(*(axes[name] for name in names))]
+
+def latin_hypercube(ranges: dict, num_points: int, seed=None) -> list:
+    """num_points {param: value} dicts from a Latin hypercube over {param: (low, high)}.
+
+    Each range is cut into num_points equal strata and every stratum is sampled exactly once, so the
+    points cover each axis evenly. Params in INTEGER_PARAMS are rounded to whole numbers.
+    """
+    rng = np.random.default_rng(seed)
+    points = [{} for _ in range(num_points)]
+    for name, (low, high) in ranges.items():
+        u = (rng.permutation(num_points) + rng.random(num_points)) / num_points
+        values = low + u * (high - low)
+        for point, value in zip(points, values.tolist()):
+            point[name] = int(round(value)) if name in INTEGER_PARAMS else value
+    return points
+
+def job_cost(params: dict) -> float:
+    """Expected number of customers in a run, which the engines' run time grows with."""
+    if params["stop_condition_type"] == "Number of Customers":
+        return float(params["stop_condition_value"])
+    try:
+        arrival_rate = mean_arrival_rate(params)
+    except (ValueError, KeyError, ZeroDivisionError):
+        return float(params["stop_condition_value"])
+    return arrival_rate * params["stop_condition_value"]
+
+class SweepTable:
+    """Columnar table of finished sweep points: one list per column, appended to as points complete."""
+    def __init__(self):
+        self.columns = {}
+        self.num_rows = 0
+
+    def add(self, row: dict):
+        for name in row:
+            if name not in self.columns:
+                self.columns[name] = [None] * self.num_rows # Column first seen now: earlier rows lack it
+        for name, values in self.columns.items():
+            values.append(row.get(name))
+        self.num_rows += 1
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns)
+
+    def __len__(self):
+        return self.num_rows
+
+def run_sweep(base_params: dict, points: list, num_replications: int, max_workers: int = None, executor=None,
+              cache=None, on_point=_ignore, on_progress=_ignore, batched: bool = False) -> pd.DataFrame:
+    """Simulates base_params overridden by each point, num_replications times each, on one process pool.
+
+    All (point, replication) runs are submitted at once, largest expected run first, so long runs do not
+    end up alone at the tail. A point's replication seeds depend only on its server count and the base
+    seed, as in the optimizer, so points share common random numbers and cached results. Each finished
+    point is passed to on_point(row) and appended to the returned table, in completion order.
+    batched=True runs each point's replications together as arrays where possible (see run_replications).
+    """
+    entropy = np.random.SeedSequence(base_params.get("seed", None)).entropy
+    if base_params.get("seed", None) is None:
+        cache = None # Fresh entropy every time: nothing would ever be looked up again
+    point_params = [{**base_params, **point} for point in points]
+    jobs = {}
+    for index, params in enumerate(point_params):
+        for r, seed in enumerate(replication_seeds(entropy, params["num_servers"], num_replications)):
+            jobs[(index, r)] = {**params, "seed": seed}
+    # Longest processing time first
+    jobs = dict(sorted(jobs.items(), key=lambda item: -job_cost(item[1])))
+
+    table = SweepTable()
+    pending = {}
+    def on_result(key, summary):
+        index, _ = key
+        pending.setdefault(index, {})[key[1]] = summary
+        if len(pending[index]) == num_replications:
+            pool = ReplicationPool()
+            for r in range(num_replications): # Pool in replication order, whatever order runs finished in
+                pool.add(pending[index][r])
+            del pending[index]
+            row = {**points[index], "replications": pool.count}
+            for name in REPLICATION_METRICS:
+                row[name] = pool.mean(name)
+            table.add(row)
+            on_point(row)
+
+    done = 0
+    def on_done():
+        nonlocal done
+        done += 1
+        on_progress(done / len(jobs))
+
+    if executor is not None:
+        pool_context = nullcontext(executor)
+    else:
+        pool_context = ProcessPoolExecutor(max_workers=max_workers) if max_workers is None or max_workers > 1 else nullcontext()
+    with pool_context as executor:
+        run_replications(jobs, executor, on_done, cache, on_result, batched)
+    return table.to_frame()
@@ -0,0 +1,33 @@
+# test_rollups.py
+"""Regression tests for time-bucket rollups: events exactly on bucket edges at the max_buckets limit."""
+import numpy as np
+import pytest
+from rollups import TimeBuckets
+from simulation_core import run_simulation
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_point_events_on_edges_beyond_max_buckets(bulk):
+    buckets = TimeBuckets(1.0, 1, max_buckets=4)
+    times = np.arange(9.0) # Every arrival on an edge, the last one on the edge past max_buckets
+    if bulk:
+        buckets.add_arrivals_bulk(times)
+        buckets.add_completions_bulk(times, np.zeros(9), times)
+    else:
+        for t in times:
+            buckets.add_arrival(t)
+            buckets.add_completion(t, 0.0, t)
+    frame = buckets.frame()
+    assert buckets.size <= buckets.max_buckets
+    assert frame["Arrivals"].sum() == 9
+    assert frame["Completions"].sum() == 9
+    assert buckets.wait_counts[:buckets.size].sum() == 9
+
+@pytest.mark.parametrize("engine", ["simpy", "fast", "vectorized"])
+@pytest.mark.parametrize("interval, horizon, num_buckets", [(1.0, 200.0, 100), (0.25, 100.0, 400)])
+def test_fixed_arrivals_on_edges(engine, interval, horizon, num_buckets):
+    params = {"arrival_distribution": "Fixed Interval", "fixed_interval": interval,
+              "service_distribution": "Constant", "fixed_service_time": interval / 2, "num_servers": 1,
+              "stop_condition_type": "Simulation Time", "stop_condition_value": horizon, "seed": 1,
+              "rollup_buckets": num_buckets, "engine": engine}
+    data = run_simulation(params)
+    assert data.rollups.frame(horizon)["Arrivals"].sum() == len(data.arrival_times)
@@ -0,0 +1,24 @@
+# test_steady_state.py
+"""Tests of the steady-state summary's utilization against cases with a known server load."""
+import pytest
+from simulation_core import run_simulation
+from steady_state import steady_state_summary
+
+@pytest.mark.parametrize("engine", ["simpy", "fast", "vectorized"])
+def test_utilization_counts_service_in_progress_at_the_end(engine):
+    # D/D/1, rho = 0.95; the run ends half a time unit into the last customer's service
+    params = {"arrival_distribution": "Fixed Interval", "fixed_interval": 10.0,
+              "service_distribution": "Constant", "fixed_service_time": 9.5, "num_servers": 1,
+              "stop_condition_type": "Simulation Time", "stop_condition_value": 2000.5, "seed": 1, "engine": engine}
+    summary = steady_state_summary(run_simulation(params), 2000.5, 1)
+    busy = 199 * 9.5 + 0.5 # Arrivals at 10, 20, ..., 2000
+    assert summary["warmup_time"] == 0.0 # No waits and no queue: nothing to discard
+    assert summary["avg_server_utilization"] == pytest.approx(busy / 2000.5 * 100, rel=1e-9)
+
+def test_utilization_matches_rho_after_warmup():
+    # M/M/2 with rho = lambda / (c mu) = 0.8
+    params = {"arrival_distribution": "Exponential (Poisson Process)", "arrival_rate": 1.6,
+              "service_distribution": "Exponential", "service_rate": 1.0, "num_servers": 2,
+              "stop_condition_type": "Simulation Time", "stop_condition_value": 50000.0, "seed": 3, "engine": "fast"}
+    summary = steady_state_summary(run_simulation(params), 50000.0, 2)
+    assert summary["avg_server_utilization"] == pytest.approx(80.0, abs=1.5)
@@ -0,0 +1,124 @@
+# traces.py
+"""Trace files for trace-driven runs: arrival timestamps and service durations read chunk by chunk."""
+import os
+import numpy as np
+import pandas as pd
+
+# Rows read from a trace file at a time
+TRACE_CHUNK_ROWS = 65536
+# Extensions read as headerless float64 arrays through np.memmap
+RAW_EXTENSIONS = (".bin", ".dat", ".f8")
+
+def _npy_chunks(path: str, column, chunk_rows: int):
+    array = np.load(path, mmap_mode="r") # Memory-mapped: only the rows sliced below are read
+    if array.ndim == 2:
+        array = array[:, int(column or 0)]
+    elif array.ndim != 1:
+        raise ValueError(f"{path}: expected a 1-D array or a 2-D array of columns.")
+    for start in range(0, len(array), chunk_rows):
+        yield np.asarray(array[start:start + chunk_rows], dtype=np.float64)
+
+def _raw_chunks(path: str, column, chunk_rows: int):
+    array = np.memmap(path, dtype=np.float64, mode="r")
+    for start in range(0, len(array), chunk_rows):
+        yield np.asarray(array[start:start + chunk_rows])
+
+def _csv_chunks(path: str, column, chunk_rows: int):
+    for frame in pd.read_csv(path, usecols=[column if column is not None else 0], chunksize=chunk_rows):
+        yield frame.iloc[:, 0].to_numpy(dtype=np.float64)
+
+def _parquet_chunks(path: str, column, chunk_rows: int):
+    import pyarrow.parquet as pq # Only needed for Parquet traces
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=[column] if column is not None else None):
+        yield batch.column(0).to_numpy(zero_copy_only=False).astype(np.float64)
+
+def trace_chunks(path: str, column=None, chunk_rows: int = TRACE_CHUNK_ROWS):
+    """Yields a trace column as float64 arrays of at most chunk_rows values, never holding the whole file.
+
+    .npy files are memory-mapped (column is the column index of a 2-D array), .bin/.dat/.f8 files are
+    raw float64 arrays memory-mapped with np.memmap, and CSV (.csv, .txt) and Parquet (.parquet, .pq)
+    files are read in chunks (column is a column name; default the first column).
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return _npy_chunks(path, column, chunk_rows)
+    if extension in RAW_EXTENSIONS:
+        return _raw_chunks(path, column, chunk_rows)
+    if extension in (".csv", ".txt"):
+        return _csv_chunks(path, column, chunk_rows)
+    if extension in (".parquet", ".pq"):
+        return _parquet_chunks(path, column, chunk_rows)
+    raise ValueError(f"Unsupported trace file type: {path} (use .npy, {', '.join(RAW_EXTENSIONS)}, .csv or .parquet).")
+
+class TraceReader:
+    """Hands out a trace column as gaps (timestamps=True: differences of successive timestamps) or as is.
+
+    read(n) returns the next n values; at the end of the file the trace is replayed from the start, with
+    the trace's mean gap between the last timestamp and the first. The first customer arrives at time 0.
+    Values are multiplied by scale, so a trace can be replayed faster or slower. Only the current
+    chunk is held in memory.
+    """
+    def __init__(self, path: str, column=None, timestamps: bool = False, scale: float = 1.0,
+                 chunk_rows: int = TRACE_CHUNK_ROWS):
+        if not path:
+            raise ValueError("No trace file given.")
+        if not os.path.isfile(path):
+            raise ValueError(f"Trace file not found: {path}")
+        if scale <= 0:
+            raise ValueError("Trace scale must be positive.")
+        self.path, self.column, self.timestamps, self.scale, self.chunk_rows = path, column, timestamps, scale, chunk_rows
+        self._chunks = trace_chunks(path, column, chunk_rows)
+        self._buffer = np.empty(0)
+        self._last_timestamp = None
+        self._first_timestamp = None
+        self._rows = 0 # Rows of the current pass, to tell an empty file from the end of a pass
+        self._wrap_gap = None
+
+    def _next_chunk(self) -> np.ndarray:
+        for values in self._chunks:
+            if len(values):
+                self._rows += len(values)
+                return values
+        if self._rows == 0:
+            raise ValueError(f"Trace file has no rows: {self.path}")
+        if self.timestamps:
+            span = self._last_timestamp - self._first_timestamp
+            # Replaying a trace without a time span would give zero gaps forever, so time would never advance
+            if self._rows < 2 or span <= 0:
+                raise ValueError(f"An arrival trace needs at least two rows spanning a positive time: {self.path}")
+            self._wrap_gap = span / (self._rows - 1)
+        self._chunks = trace_chunks(self.path, self.column, self.chunk_rows) # Replay from the start
+        self._rows = 0
+        return self._next_chunk()
+
+    def _convert(self, values: np.ndarray) -> np.ndarray:
+        if np.isnan(values).any():
+            raise ValueError(f"Trace has missing values: {self.path}")
+        if not self.timestamps:
+            if (values < 0).any():
+                raise ValueError(f"Trace durations must be non-negative: {self.path}")
+            return values * self.scale
+        if self._last_timestamp is None: # First row of the first pass: the first arrival is at time 0
+            self._first_timestamp = values[0]
+            previous = values[0]
+        elif self._rows == len(values): # First chunk of a replay
+            self._first_timestamp = values[0]
+            previous = values[0] - self._wrap_gap
+        else:
+            previous = self._last_timestamp
+        gaps = np.diff(values, prepend=previous)
+        if (gaps < 0).any():
+            raise ValueError(f"Trace timestamps must be in non-decreasing order: {self.path}")
+        self._last_timestamp = values[-1]
+        return gaps * self.scale
+
+    def read(self, n: int) -> np.ndarray:
+        parts, have = [], 0
+        while have < n:
+            if not len(self._buffer):
+                self._buffer = self._convert(self._next_chunk())
+            part = self._buffer[:n - have]
+            self._buffer = self._buffer[len(part):]
+            parts.append(part)
+            have += len(part)
+        return np.concatenate(parts) if parts else np.empty(0)
@@ -0,0 +1,107 @@
+# variance_reduction.py
+"""Antithetic pairs and control variates for replicated estimates, with the variance reduction they achieve."""
+import math
+import numpy as np
+from reporting import ReplicationPool, REPLICATION_METRICS
+from streaming_stats import RunningStats, student_t_quantile
+from queueing_theory import arrival_moments, service_moments
+
+# Per-run sample means with known expectations, recorded in every replication summary
+CONTROLS = ("mean_interarrival", "mean_service")
+# Metrics adjusted by the controls
+CONTROLLED_METRICS = ("avg_wait_time", "avg_queue_length", "avg_server_utilization")
+
+def control_means(params: dict) -> dict:
+    """Expected interarrival and service time of params' distributions, keyed like CONTROLS."""
+    arrival_rate, _ = arrival_moments(params["arrival_distribution"], params)
+    mean_service, _ = service_moments(params["service_distribution"], params)
+    return {"mean_interarrival": 1.0 / arrival_rate, "mean_service": mean_service}
+
+def antithetic_pair(first: dict, second: dict) -> dict:
+    """One observation from the U and 1 - U runs of a pair: their average, with the runs under "runs"."""
+    pair = {key: (first[key] + second[key]) / 2 for key in first if key not in ("runs", "windows")}
+    if "windows" in first: # Window by window, over the windows both runs reached
+        pair["windows"] = {key: [(a + b) / 2 for a, b in zip(values, second["windows"][key])]
+                           for key, values in first["windows"].items()}
+    pair["runs"] = [first, second]
+    return pair
+
+class VarianceReducedPool(ReplicationPool):
+    """ReplicationPool whose observations may be antithetic pairs and whose estimates may use control variates.
+
+    An observation with a "runs" list (see antithetic_pair) counts once; its runs also feed the plain
+    per-run variance that the variance reduction factor compares against. With control_means, the
+    CONTROLLED_METRICS are estimated by regression on the CONTROLS (multiple control variates, with
+    beta estimated from the same replications); controls that never vary are left out.
+    Observations are kept, as the regression needs them all; pools hold at most a few hundred.
+    """
+    def __init__(self, control_means: dict = None):
+        super().__init__()
+        self.control_means = control_means or {}
+        self.run_stats = {key: RunningStats() for key in REPLICATION_METRICS}
+        self.runs = 0
+        self.observations = {key: [] for key in (*CONTROLLED_METRICS, *self.control_means)}
+
+    def add(self, summary: dict):
+        super().add(summary)
+        runs = summary.get("runs", [summary])
+        for run in runs:
+            for key in REPLICATION_METRICS:
+                self.run_stats[key].add(run[key])
+        self.runs += len(runs)
+        for key, values in self.observations.items():
+            values.append(summary[key])
+
+    def merge(self, other: "VarianceReducedPool"):
+        """Combines another pool of the same configuration (same control means) into this one."""
+        if not isinstance(other, VarianceReducedPool) or other.control_means != self.control_means:
+            raise ValueError("Only variance-reduced pools with the same control means can be merged.")
+        super().merge(other)
+        for key in REPLICATION_METRICS:
+            self.run_stats[key].merge(other.run_stats[key])
+        self.runs += other.runs
+        for key, values in self.observations.items():
+            values.extend(other.observations[key])
+
+    def _controlled(self, key: str):
+        """(estimate, variance of the estimate, degrees of freedom) by control variates, or None to use the plain mean."""
+        if not self.control_means or key not in CONTROLLED_METRICS:
+            return None
+        y = np.array(self.observations[key])
+        controls = [name for name in self.control_means if np.ptp(self.observations[name]) > 0]
+        n, q = len(y), len(controls)
+        if q == 0 or n < q + 3: # Too few replications to estimate beta and still have residual variance
+            return None
+        x = np.column_stack([self.observations[name] for name in controls])
+        x_centered = x - x.mean(axis=0)
+        sxx = x_centered.T @ x_centered
+        beta = np.linalg.solve(sxx, x_centered.T @ (y - y.mean()))
+        offset = x.mean(axis=0) - np.array([self.control_means[name] for name in controls])
+        residuals = (y - y.mean()) - x_centered @ beta
+        df = n - q - 1
+        variance = (residuals @ residuals / df) * (1.0 / n + offset @ np.linalg.solve(sxx, offset))
+        return float(y.mean() - beta @ offset), float(variance), df
+
+    def mean(self, key: str) -> float:
+        controlled = self._controlled(key)
+        return super().mean(key) if controlled is None else controlled[0]
+
+    def half_width(self, key: str, confidence: float = 0.95) -> float:
+        controlled = self._controlled(key)
+        if controlled is None:
+            return super().half_width(key, confidence)
+        _, variance, df = controlled
+        return student_t_quantile(0.5 + confidence / 2, df) * math.sqrt(variance)
+
+    def variance_reduction_factor(self, key: str) -> float:
+        """Variance of the plain mean of as many independent runs over the variance of this pool's estimate.
+
+        Both are estimated from this pool's runs (nan below two observations). A factor f means plain
+        replication would need about f times the runs for the same precision.
+        """
+        if self.count < 2:
+            return math.nan
+        plain = self.run_stats[key].variance / self.runs
+        controlled = self._controlled(key)
+        achieved = self.stats[key].variance / self.count if controlled is None else controlled[1]
+        return plain / achieved if achieved > 0 else math.inf
@@ -0,0 +1,67 @@
+# windows.py
+"""Per-time-window metrics of a run (e.g. one window per shift), for staffing against time-varying load."""
+import numpy as np
+from rollups import busy_area
+from simulation_core import SimulationData
+from steady_state import queue_area
+
+# Metrics reported per window, named like the whole-run metrics they break down
+WINDOW_METRICS = ("arrivals", "avg_wait_time", "avg_queue_length", "avg_server_utilization")
+
+def _windows(window_length: float, horizon: float, period: float = None) -> tuple:
+    """(starts, ends, labels) of the windows covering [0, horizon]; with a period, windows restart every
+    period and windows at the same offset into a period share a label."""
+    if window_length <= 0 or (period is not None and period <= 0):
+        raise ValueError("The window length and period must be positive.")
+    horizon = max(horizon, 1e-12)
+    if period is None:
+        starts = np.arange(0.0, horizon, window_length)
+        return starts, np.minimum(starts + window_length, horizon), np.arange(len(starts))
+    offsets = np.arange(0.0, period, window_length)
+    cycles = np.arange(0.0, horizon, period)
+    starts = (cycles[:, None] + offsets[None, :]).ravel()
+    ends = np.minimum(np.minimum(starts + window_length, np.repeat(cycles + period, len(offsets))), horizon)
+    labels = np.tile(np.arange(len(offsets)), len(cycles))
+    keep = starts < horizon
+    return starts[keep], ends[keep], labels[keep]
+
+def window_metrics(data: SimulationData, window_length: float, horizon: float, period: float = None) -> dict:
+    """{metric: list over windows} for consecutive windows of window_length over [0, horizon], plus "window_start".
+
+    With a period (e.g. the 24 hours of a daily rate profile) windows restart every period and each
+    window pools its occurrences in every cycle, so the metrics describe a time of day rather than one
+    day of the run. Customers count in the window they arrived in: "arrivals" (per occurrence of the
+    window) covers every customer that arrived before the horizon, and "avg_wait_time" their waits,
+    where a customer still queued at the horizon counts the wait so far (horizon - arrival, censored,
+    so a lower bound; nan in a window without arrivals). Queue length is time-averaged and utilization
+    is busy time over server time, both within each window. Needs full statistics.
+    """
+    if data.streaming:
+        raise ValueError("Per-window metrics need full statistics (per-customer times and the queue trajectory).")
+    starts, ends, labels = _windows(window_length, horizon, period)
+    num_windows = int(labels.max()) + 1
+    arrivals = np.asarray(data.arrival_times, dtype=np.float64)
+    service_starts = np.asarray(data.service_start_times, dtype=np.float64)
+    # FCFS: the first len(service_starts) arrivals started service, the rest were still queued
+    waits = np.concatenate([service_starts - arrivals[:len(service_starts)],
+                            np.maximum(horizon - arrivals[len(service_starts):], 0.0)])
+
+    window = np.searchsorted(starts, arrivals, side="right") - 1
+    inside = (window >= 0) & (arrivals < horizon)
+    customer_labels = labels[window[inside]]
+    counts = np.bincount(customer_labels, minlength=num_windows).astype(np.float64)
+    wait_sums = np.bincount(customer_labels, weights=waits[inside], minlength=num_windows)
+    times, area = queue_area(data)
+    queue_areas = np.bincount(labels, weights=np.interp(ends, times, area) - np.interp(starts, times, area), minlength=num_windows)
+    # busy_area pairs no starts with ends, so customers still in service simply end at the horizon
+    busy_ends = np.concatenate([np.asarray(data.departure_times, dtype=np.float64),
+                                np.full(len(service_starts) - len(data.departure_times), float(horizon))])
+    busy = np.bincount(labels, weights=busy_area(service_starts, busy_ends, ends) - busy_area(service_starts, busy_ends, starts),
+                       minlength=num_windows)
+    durations = np.bincount(labels, weights=ends - starts, minlength=num_windows)
+    occurrences = np.bincount(labels, minlength=num_windows)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_wait = wait_sums / counts
+    return {"window_start": starts[:num_windows].tolist(), "arrivals": (counts / occurrences).tolist(),
+            "avg_wait_time": avg_wait.tolist(), "avg_queue_length": (queue_areas / durations).tolist(),
+            "avg_server_utilization": (busy / (durations * data.num_servers) * 100).tolist()}